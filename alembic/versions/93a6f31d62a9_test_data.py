@@ -10,9 +10,6 @@ from typing import Sequence, Union
 from alembic import op
 import sqlalchemy as sa
 
-from barista_matic.domain import model
-from barista_matic.adapters.orm import start_mappers
-
 
 # revision identifiers, used by Alembic.
 revision: str = '93a6f31d62a9'
@@ -20,68 +17,82 @@ down_revision: Union[str, None] = '863cc33dd118'
 branch_labels: Union[str, Sequence[str], None] = None
 depends_on: Union[str, Sequence[str], None] = None
 
-bind = op.get_bind()
-session = sa.orm.Session(bind=bind)
+# Tables as they are in this revision, the ORM mappers follow the latest schema
+ingredient_table = sa.table(
+    'ingredient',
+    sa.column('id', sa.Integer),
+    sa.column('name', sa.String),
+    sa.column('available_quantity', sa.Integer),
+    sa.column('unit_cost', sa.Float),
+)
+drink_table = sa.table(
+    'drink',
+    sa.column('id', sa.Integer),
+    sa.column('name', sa.String),
+)
+drink_ingredient_table = sa.table(
+    'drink_ingredient',
+    sa.column('id', sa.Integer),
+    sa.column('ingredient_quantity', sa.Integer),
+    sa.column('ingredient_id', sa.Integer),
+)
+drink_drink_ingredient_table = sa.table(
+    'drink_drink_ingredient',
+    sa.column('id', sa.Integer),
+    sa.column('drink_ingredient_id', sa.Integer),
+    sa.column('drink_id', sa.Integer),
+)
 
+INGREDIENTS = (
+    ("Coffee", 0.75),
+    ("Decaf Coffee", 0.75),
+    ("Sugar", 0.75),
+    ("Cream", 0.25),
+    ("Steamed Milk", 0.35),
+    ("Foamed Milk", 0.35),
+    ("Espresso", 1.1),
+    ("Cocoa", 0.9),
+    ("Whipped Cream", 1),
+)
 
-def upgrade() -> None:
-    start_mappers()
+DRINKS = (
+    ("Coffee", (("Coffee", 3), ("Sugar", 1), ("Cream", 1))),
+    ("Decaf Coffee", (("Decaf Coffee", 3), ("Sugar", 1), ("Cream", 1))),
+    ("Caffe Latte", (("Espresso", 2), ("Steamed Milk", 1))),
+    ("Caffe Americano", (("Espresso", 3), )),
+    ("Caffe Mocha", (("Espresso", 1), ("Cocoa", 1), ("Steamed Milk", 1), ("Whipped Cream", 1))),
+    ("Cappuccino", (("Espresso", 2), ("Steamed Milk", 1), ("Foamed Milk", 1))),
+)
 
-    cofee = model.Ingredient("Coffee", 10, 0.75)
-    decaf_cofee = model.Ingredient("Decaf Coffee", 10, 0.75)
-    sugar = model.Ingredient("Sugar", 10, 0.75)
-    cream = model.Ingredient("Cream", 10, 0.25)
-    steamed_milk = model.Ingredient("Steamed Milk", 10, 0.35)
-    foamed_milk = model.Ingredient("Foamed Milk", 10, 0.35)
-    espresso = model.Ingredient("Espresso", 10, 1.1)
-    cocoa = model.Ingredient("Cocoa", 10, 0.9)
-    whipped_cream = model.Ingredient("Whipped Cream", 10, 1)
 
-    drink_coffee = model.Drink(
-        "Coffee", [
-            model.DrinkIngredient(cofee, 3),
-            model.DrinkIngredient(sugar, 1),
-            model.DrinkIngredient(cream, 1),
-        ]
-    )
-    drink_decaf_coffee = model.Drink(
-        "Decaf Coffee", [
-            model.DrinkIngredient(decaf_cofee, 3),
-            model.DrinkIngredient(sugar, 1),
-            model.DrinkIngredient(cream, 1),
-        ]
-    )
-    drink_caffe_late = model.Drink(
-        "Caffe Latte", [
-            model.DrinkIngredient(espresso, 2),
-            model.DrinkIngredient(steamed_milk, 1),
-        ]
-    )
-    drink_caffe_americano = model.Drink(
-        "Caffe Americano", [
-            model.DrinkIngredient(espresso, 3),
-        ]
-    )
-    drink_caffe_mocha = model.Drink(
-        "Caffe Mocha", [
-            model.DrinkIngredient(espresso, 1),
-            model.DrinkIngredient(cocoa, 1),
-            model.DrinkIngredient(steamed_milk, 1),
-            model.DrinkIngredient(whipped_cream, 1),
-        ]
-    )
-    drink_cappuccino = model.Drink(
-        "Cappuccino", [
-            model.DrinkIngredient(espresso, 2),
-            model.DrinkIngredient(steamed_milk, 1),
-            model.DrinkIngredient(foamed_milk, 1),
-        ]
-    )
+def upgrade() -> None:
+    ingredient_ids = {name: ingredient_id for ingredient_id, (name, _) in enumerate(INGREDIENTS, start=1)}
+    op.bulk_insert(ingredient_table, [
+        {"id": ingredient_ids[name], "name": name, "available_quantity": 10, "unit_cost": unit_cost}
+        for name, unit_cost in INGREDIENTS
+    ])
+
+    drinks, drink_ingredients, drink_drink_ingredients = [], [], []
+    for drink_id, (drink_name, recipe) in enumerate(DRINKS, start=1):
+        drinks.append({"id": drink_id, "name": drink_name})
+        for ingredient_name, quantity in recipe:
+            drink_ingredient_id = len(drink_ingredients) + 1
+            drink_ingredients.append({
+                "id": drink_ingredient_id,
+                "ingredient_quantity": quantity,
+                "ingredient_id": ingredient_ids[ingredient_name],
+            })
+            drink_drink_ingredients.append({
+                "id": drink_ingredient_id,
+                "drink_ingredient_id": drink_ingredient_id,
+                "drink_id": drink_id,
+            })
 
     # Add bulk
-    for drink in (drink_coffee, drink_decaf_coffee, drink_caffe_late, drink_caffe_americano, drink_caffe_mocha, drink_cappuccino):
-        session.add(drink)
-    session.commit()
+    op.bulk_insert(drink_table, drinks)
+    op.bulk_insert(drink_ingredient_table, drink_ingredients)
+    op.bulk_insert(drink_drink_ingredient_table, drink_drink_ingredients)
+
 
 def downgrade() -> None:
     pass
@@ -0,0 +1,173 @@
+import time
+from datetime import datetime
+from typing import (
+    Callable,
+    Dict,
+    Hashable,
+    Iterator,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from barista_matic.adapters.lru_cache import (
+    CacheStats,
+    LruCache,
+)
+from barista_matic.adapters.repository import AbstractRepository
+from barista_matic.domain import (
+    events,
+    model,
+)
+
+from barista_matic import settings
+
+# Reads whose result changes with the stock, besides the catalog
+STOCK_READS = ("get_stock", "get_menu_page:in_stock")
+
+
+class CachingRepository(AbstractRepository):
+    """Repository decorator that serves reads from a bounded LRU/TTL cache, in front of any backend.
+
+    Writes go through to the wrapped repository and drop the cached reads they change: catalog additions drop
+    the catalog reads, dispenses drop the sales. Cached ingredients and drinks are the backend objects,
+    so their stock is always current, only the reads computed from the stock are dropped when it changes.
+    Lots expire without a stock change, a cached stock read counts an expired lot until the TTL or the next change.
+    A rollback drops everything, the transaction changes are undone without events.
+    Transactions must be committed or rolled back through this repository, e.g. with a RepositoryUnitOfWork.
+    """
+    def __init__(
+        self,
+        repository: AbstractRepository,
+        max_entries: int = settings.REPOSITORY_CACHE_ENTRIES,
+        ttl_seconds: float = settings.REPOSITORY_CACHE_TTL_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+        bus: Optional[events.EventBus] = None,
+    ):
+        self.repository = repository
+        self.cache: LruCache = LruCache(max_entries, ttl_seconds, clock)
+        self.bus = bus or events.bus
+        self._subscription = self.bus.subscribe(events.IngredientStockChanged, self._on_stock_changed)
+
+    @property
+    def thread_safe_objects(self) -> bool:
+        return self.repository.thread_safe_objects
+
+    def get_ingredients(self) -> Set[model.Ingredient]:
+        return self._read(("get_ingredients", ), self.repository.get_ingredients)
+
+    def get_drinks(self) -> Set[model.Drink]:
+        return self._read(("get_drinks", ), self.repository.get_drinks)
+
+    def get_ingredients_page(
+        self, after: Optional[str] = None, limit: int = 50, prefix: Optional[str] = None
+    ) -> Tuple[model.Ingredient]:
+        return self._read(
+            ("get_ingredients_page", after, limit, prefix),
+            lambda: self.repository.get_ingredients_page(after, limit, prefix),
+        )
+
+    def get_menu_page(
+        self,
+        after: Optional[Tuple[str, int]] = None,
+        limit: int = 50,
+        prefix: Optional[str] = None,
+        in_stock_only: bool = False,
+    ) -> Tuple[Tuple[str, model.Drink]]:
+        return self._read(
+            ("get_menu_page:in_stock" if in_stock_only else "get_menu_page", after, limit, prefix),
+            lambda: self.repository.get_menu_page(after, limit, prefix, in_stock_only),
+        )
+
+    def get_drink_by_reference(self, reference: int) -> Optional[model.Drink]:
+        return self._read(
+            ("get_drink_by_reference", reference), lambda: self.repository.get_drink_by_reference(reference)
+        )
+
+    def get_stock(self) -> Dict[str, int]:
+        return dict(self._read(("get_stock", ), self.repository.get_stock))
+
+    def get_catalog_key(self) -> Tuple:
+        return self._read(("get_catalog_key", ), self.repository.get_catalog_key)
+
+    def get_revision(self) -> str:
+        # Read on every call, it tells the changes of other processes too
+        return self.repository.get_revision()
+
+    def get_sales(
+        self, period: str, since: Optional[datetime] = None, machine_id: Optional[str] = None
+    ) -> Tuple[model.SalesRollup]:
+        return self._read(
+            ("get_sales", period, since, machine_id),
+            lambda: self.repository.get_sales(period, since, machine_id),
+        )
+
+    def get_dispense_by_request_id(self, request_id: str) -> Optional[model.DispenseRecord]:
+        # Only found records are cached, a request id can be dispensed at any time
+        return self._read(
+            ("get_dispense_by_request_id", request_id),
+            lambda: self.repository.get_dispense_by_request_id(request_id),
+        )
+
+    def stream_inventory(self, batch_size: int = 1000) -> Iterator[Tuple]:
+        # Streams are read once, they are never cached
+        return self.repository.stream_inventory(batch_size)
+
+    def stream_recipes(self, batch_size: int = 1000) -> Iterator[Tuple]:
+        return self.repository.stream_recipes(batch_size)
+
+    def stream_ledger(
+        self, since: Optional[datetime] = None, until: Optional[datetime] = None, batch_size: int = 1000
+    ) -> Iterator[Tuple]:
+        return self.repository.stream_ledger(since, until, batch_size)
+
+    def get_oldest_dispense_time(self) -> Optional[datetime]:
+        return self.repository.get_oldest_dispense_time()
+
+    def delete_ledger(self, until: datetime, batch_size: int = 1000) -> int:
+        return self.repository.delete_ledger(until, batch_size)
+
+    def add_ingredient(self, ingredient: model.Ingredient):
+        self.repository.add_ingredient(ingredient)
+        self.cache.invalidate(_is_catalog_read)
+
+    def add_drink(self, drink: model.Drink):
+        self.repository.add_drink(drink)
+        self.cache.invalidate(_is_catalog_read)
+
+    def add_dispense(self, record: model.DispenseRecord):
+        self.repository.add_dispense(record)
+        self.cache.invalidate(lambda key: key[0] == "get_sales")
+
+    def commit(self):
+        self.repository.commit()
+
+    def rollback(self):
+        self.repository.rollback()
+        self.cache.invalidate()
+
+    def get_cache_stats(self) -> CacheStats:
+        return self.cache.get_stats()
+
+    def close(self) -> None:
+        """Stop following the stock changes, the cache is dropped and the wrapped repository closed"""
+        self.bus.unsubscribe(self._subscription)
+        self.cache.invalidate()
+        self.repository.close()
+
+    def _read(self, key: Hashable, read: Callable):
+        value = self.cache.get(key)
+        if value is None:
+            value = read()
+            if value is not None:
+                self.cache.put(key, value)
+        return value
+
+    def _on_stock_changed(self, event: events.IngredientStockChanged) -> None:
+        machine_id = getattr(self.repository, "machine_id", None)
+        if machine_id is None or machine_id == event.machine_id:
+            self.cache.invalidate(lambda key: key[0] in STOCK_READS)
+
+
+def _is_catalog_read(key: Hashable) -> bool:
+    return key[0] not in ("get_sales", "get_dispense_by_request_id")
@@ -0,0 +1,141 @@
+import logging
+import marshal
+import os
+from dataclasses import (
+    astuple,
+    dataclass,
+)
+from operator import attrgetter
+from typing import (
+    Dict,
+    Iterable,
+    Iterator,
+    Optional,
+    Tuple,
+)
+
+from barista_matic.adapters.repository import AbstractRepository
+from barista_matic.domain import model
+
+# Bumped whenever the snapshot fields change, older files are rebuilt
+SNAPSHOT_HEADER = b"BARISTA-MATIC-CATALOG\x01"
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    """Catalog compiled for the first frame: drinks in menu order, with their costs and recipes.
+
+    Recipes keep a (ingredient index, quantity) pair by drink ingredient, so the stock check is the same
+    as Drink.can_be_dispensed. Only plain tuples are kept, it's stored with marshal and loaded with a single read.
+    """
+    key: Tuple
+    ingredient_names: Tuple[str, ...]
+    drink_names: Tuple[str, ...]
+    drink_costs: Tuple[float, ...]
+    recipes: Tuple[Tuple[Tuple[int, int], ...], ...]
+
+    @classmethod
+    def from_catalog(
+        cls, key: Tuple, drinks: Iterable[model.Drink], ingredients: Iterable[model.Ingredient]
+    ) -> "CatalogSnapshot":
+        """Compile the catalog
+
+        Args:
+            key (Tuple): Catalog key, from the repository
+            drinks (Iterable[model.Drink]): Catalog drinks
+            ingredients (Iterable[model.Ingredient]): Catalog ingredients
+
+        Returns:
+            CatalogSnapshot: The compiled catalog
+        """
+        drinks = sorted(drinks, key=attrgetter("name"))
+        ingredient_names = sorted(
+            {ingredient.name for ingredient in ingredients}
+            | {line.ingredient.name for drink in drinks for line in drink.ingredients}
+        )
+        index_by_name = {name: index for index, name in enumerate(ingredient_names)}
+        return cls(
+            key=tuple(key),
+            ingredient_names=tuple(ingredient_names),
+            drink_names=tuple(drink.name for drink in drinks),
+            drink_costs=tuple(drink.get_cost() for drink in drinks),
+            recipes=tuple(
+                tuple((index_by_name[line.ingredient.name], line.ingredient_quantity) for line in drink.ingredients)
+                for drink in drinks
+            ),
+        )
+
+    def dumps(self) -> bytes:
+        return SNAPSHOT_HEADER + marshal.dumps(astuple(self))
+
+    @classmethod
+    def loads(cls, data: bytes) -> Optional["CatalogSnapshot"]:
+        """Load a snapshot dumped by the same version
+
+        Args:
+            data (bytes): Dumped snapshot
+
+        Returns:
+            Optional[CatalogSnapshot]: The snapshot, None if the data isn't a snapshot of this version
+        """
+        if not data.startswith(SNAPSHOT_HEADER):
+            return None
+        try:
+            return cls(*marshal.loads(data[len(SNAPSHOT_HEADER):]))
+        except (EOFError, ValueError, TypeError):
+            return None
+
+    def get_menu_lines(self, stock: Dict[str, int]) -> Iterator[Tuple[str, str, float, bool]]:
+        """Get the menu with the stock
+
+        Args:
+            stock (Dict[str, int]): Available quantity by ingredient name, missing ingredients have none
+
+        Yields:
+            Tuple[str, str, float, bool]: Reference, drink name, cost and whether it can be dispensed
+        """
+        available = [stock.get(name, 0) for name in self.ingredient_names]
+        for reference, (name, cost, recipe) in enumerate(zip(self.drink_names, self.drink_costs, self.recipes), 1):
+            yield str(reference), name, cost, all(available[index] >= quantity for index, quantity in recipe)
+
+
+def load_catalog_snapshot(repository: AbstractRepository, path: str) -> CatalogSnapshot:
+    """Load the snapshot of the repository catalog from the file. When it's missing or stale,
+    the catalog is loaded from the repository and the file is written again. A file that can't be written
+    is logged, the snapshot compiled from the repository is still returned.
+
+    Args:
+        repository (AbstractRepository): Repository of the catalog
+        path (str): Snapshot file
+
+    Returns:
+        CatalogSnapshot: Snapshot of the current catalog
+    """
+    key = repository.get_catalog_key()
+    try:
+        with open(path, "rb") as snapshot_file:
+            snapshot = CatalogSnapshot.loads(snapshot_file.read())
+    except OSError:
+        snapshot = None
+    if snapshot is None or snapshot.key != key:
+        snapshot = CatalogSnapshot.from_catalog(key, repository.get_drinks(), repository.get_ingredients())
+        try:
+            save_catalog_snapshot(snapshot, path)
+        except OSError:
+            logger.exception("Catalog snapshot %s can't be written, the next start loads the catalog again", path)
+    return snapshot
+
+
+def save_catalog_snapshot(snapshot: CatalogSnapshot, path: str) -> None:
+    """Write the snapshot file, readers never see it half written
+
+    Args:
+        snapshot (CatalogSnapshot): Snapshot to save
+        path (str): Snapshot file
+    """
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as snapshot_file:
+        snapshot_file.write(snapshot.dumps())
+    os.replace(temporary_path, path)
@@ -0,0 +1,111 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import (
+    Callable,
+    Generic,
+    Hashable,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class CacheStats:
+    """Counters of a cache since it was created"""
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class LruCache(Generic[T]):
+    """Values by key, bounded in size and in age.
+
+    Entries are kept in least recently used order, so lookups, inserts and evictions are O(1).
+    Entries expire a fixed time after they were stored, whatever their use. Entries dropped to make room
+    or because they expired count as evictions, invalidated ones don't.
+    """
+    def __init__(self, max_entries: int, ttl_seconds: float, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Hashable, Tuple[float, T]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[T]:
+        """Get the value of a key
+
+        Args:
+            key (Hashable): Key
+
+        Returns:
+            Optional[T]: The stored value, None if it was never stored, evicted or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.clock() - entry[0] >= self.ttl_seconds:
+                del self._entries[key]
+                self.evictions += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: Hashable, value: T) -> None:
+        """Store the value of a key, evicting the least recently used ones over the limit
+
+        Args:
+            key (Hashable): Key
+            value (T): Value, None can't be told apart from a miss
+        """
+        with self._lock:
+            now = self.clock()
+            self._entries[key] = (now, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            # Expired entries used long ago are at the front, drop them while they're there
+            while self._entries:
+                stored_at, _ = next(iter(self._entries.values()))
+                if now - stored_at < self.ttl_seconds:
+                    break
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, matches: Callable[[Hashable], bool] = lambda key: True) -> int:
+        """Drop the entries whose key matches
+
+        Args:
+            matches (Callable[[Hashable], bool]): Key predicate, every key by default
+
+        Returns:
+            int: Number of dropped entries
+        """
+        with self._lock:
+            keys = [key for key in self._entries if matches(key)]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def get_stats(self) -> CacheStats:
+        return CacheStats(self.hits, self.misses, self.evictions, len(self._entries))
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,12 +1,22 @@
 from sqlalchemy import (
+    Boolean,
     Column,
+    DateTime,
     Float,
     ForeignKey,
+    Index,
     Integer,
     String,
     Table,
+    event,
+    false,
+)
+from sqlalchemy.dialects import (
+    postgresql,
+    sqlite,
 )
 from sqlalchemy.orm import (
+    Session,
     registry,
     relationship,
 )
@@ -24,6 +34,33 @@ ingredient_table = Table(
     Column("name", String(50)),
     Column("available_quantity", Integer),
     Column("unit_cost", Float),
+    Column("machine_id", String(50), nullable=False, server_default=model.DEFAULT_MACHINE_ID),
+    Column("tracks_lots", Boolean, nullable=False, server_default=false()),
+    # Partition key, the hot path of a machine only reads its own rows
+    Index("ix_ingredient_machine_name", "machine_id", "name"),
+)
+
+
+ingredient_lot_table = Table(
+    "ingredient_lot",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("ingredient_id", Integer, ForeignKey("ingredient.id"), nullable=False),
+    Column("quantity", Integer, nullable=False),
+    Column("expires_at", DateTime, nullable=True),
+    Column("received_at", DateTime, nullable=False),
+    Index("ix_ingredient_lot_ingredient", "ingredient_id"),
+    # The lots expired by now are counted from it, without reading the others
+    Index("ix_ingredient_lot_expires_at", "expires_at"),
+)
+
+
+# Bumped in the transaction of every stock or catalog change of the machine, e.g. for the API etags
+machine_revision_table = Table(
+    "machine_revision",
+    metadata,
+    Column("machine_id", String(50), primary_key=True),
+    Column("revision", Integer, nullable=False),
 )
 
 
@@ -51,14 +88,57 @@ drink_table = Table(
     metadata,
     Column("id", Integer, primary_key=True),
     Column("name", String(50)),
+    Column("machine_id", String(50), nullable=False, server_default=model.DEFAULT_MACHINE_ID),
+    Index("ix_drink_machine_name", "machine_id", "name"),
+)
+
+
+dispense_ledger_table = Table(
+    "dispense_ledger",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("drink_name", String(model.RECORDED_DRINK_NAME_LENGTH), nullable=False),
+    Column("price", Float, nullable=False),
+    Column("dispensed_at", DateTime, nullable=False),
+    Column("machine_id", String(50), nullable=False),
+    Column("request_id", String(64), nullable=True),
+    Index("ix_dispense_ledger_request_id", "request_id", unique=True),
+    # Covering indexes, reports by machine or by drink over a time range don't read the table
+    Index("ix_dispense_ledger_machine_time", "machine_id", "dispensed_at", "drink_name", "price"),
+    Index("ix_dispense_ledger_drink_time", "drink_name", "dispensed_at", "machine_id", "price"),
+)
+
+
+sales_rollup_table = Table(
+    "sales_rollup",
+    metadata,
+    Column("period", String(10), primary_key=True),
+    Column("period_start", DateTime, primary_key=True),
+    Column("machine_id", String(50), primary_key=True),
+    Column("drink_name", String(model.RECORDED_DRINK_NAME_LENGTH), primary_key=True),
+    Column("quantity", Integer, nullable=False),
+    Column("revenue", Float, nullable=False),
 )
 
 
 def start_mappers():
+    if not event.contains(Session, "before_flush", _bump_machine_revisions):
+        event.listen(Session, "before_flush", _bump_machine_revisions)
+    lots_mapper = mapper_registry.map_imperatively(
+        model.Lot,
+        ingredient_lot_table
+    )
     mapper_registry.map_imperatively(
         model.Ingredient,
-        ingredient_table
+        ingredient_table,
+        properties={
+            # Emptied and expired lots are removed from the ingredient in batches, their rows are deleted then
+            "lots": relationship(lots_mapper, cascade="all, delete-orphan", collection_class=list)
+        }
     )
+    # The lot heap is built from the lots, once they are expired or refreshed it is built again from the new ones
+    event.listen(model.Ingredient, "expire", _forget_lot_heap, raw=True)
+    event.listen(model.Ingredient, "refresh", _forget_lot_heap, raw=True)
     drink_ingredients_mapper = mapper_registry.map_imperatively(
         model.DrinkIngredient,
         drink_ingredient_table,
@@ -77,3 +157,37 @@ def start_mappers():
             )
         }
     )
+    mapper_registry.map_imperatively(
+        model.DispenseRecord,
+        dispense_ledger_table
+    )
+
+
+def _forget_lot_heap(state, *args) -> None:
+    # Ingredients already garbage collected have no heap to forget
+    ingredient = state.obj()
+    if ingredient is not None:
+        ingredient.forget_lot_heap()
+
+
+def _bump_machine_revisions(session, *args) -> None:
+    # Every session that changes the stock or the catalog of a machine bumps its revision in the same flush,
+    # the writes of other processes sharing the database included
+    machine_ids = set()
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(instance, (model.Ingredient, model.Drink)):
+            machine_ids.add(instance.machine_id)
+        elif isinstance(instance, model.DrinkIngredient) and instance.ingredient is not None:
+            machine_ids.add(instance.ingredient.machine_id)
+    if not machine_ids:
+        return
+    connection = session.connection()
+    dialect = postgresql if connection.dialect.name == "postgresql" else sqlite
+    revisions = machine_revision_table
+    for machine_id in sorted(machine_ids):
+        statement = dialect.insert(revisions).values(machine_id=machine_id, revision=1)
+        connection.execute(
+            statement.on_conflict_do_update(
+                index_elements=[revisions.c.machine_id], set_={"revision": revisions.c.revision + 1}
+            )
+        )
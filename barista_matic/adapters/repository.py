@@ -1,13 +1,42 @@
+import hashlib
 from abc import (
     ABC,
     abstractmethod,
 )
-from typing import Set
+from datetime import datetime
+from operator import attrgetter
+from typing import (
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
+from sqlalchemy import (
+    and_,
+    delete,
+    exists,
+    func,
+    or_,
+    select,
+)
+from sqlalchemy.dialects import (
+    postgresql,
+    sqlite,
+)
+
+from barista_matic.adapters import orm
 from barista_matic.domain import model
 
 
 class AbstractRepository(ABC):
+    # The objects it returns can be changed by several threads at once, each one holding the locks of its objects.
+    # Objects bound to a session can't, any access may query the session
+    thread_safe_objects = True
+
     @abstractmethod
     def get_ingredients(self) -> Set[model.Ingredient]:
         pass
@@ -24,21 +53,183 @@ class AbstractRepository(ABC):
     def add_drink(self, drink: model.Drink):
         pass
 
+    @abstractmethod
+    def add_dispense(self, record: model.DispenseRecord):
+        """Add the record to the ledger and to its sales rollups, in the same transaction as the stock change"""
+        pass
+
+    @abstractmethod
+    def get_dispense_by_request_id(self, request_id: str) -> Optional[model.DispenseRecord]:
+        """Get the ledger record of a dispense request, without scanning the ledger"""
+        pass
+
+    @abstractmethod
+    def get_sales(
+        self, period: str, since: Optional[datetime] = None, machine_id: Optional[str] = None
+    ) -> Tuple[model.SalesRollup]:
+        """Get the sales rollups of the period, sorted by period start and drink name"""
+        pass
+
+    @abstractmethod
+    def stream_ledger(
+        self, since: Optional[datetime] = None, until: Optional[datetime] = None, batch_size: int = 1000
+    ) -> Iterator[Tuple]:
+        """Stream the ledger as (drink name, price, dispensed at, machine id, request id) rows, oldest first,
+        dispensed since the first moment and before the second one. Backends should read it in batches
+        """
+        pass
+
+    @abstractmethod
+    def delete_ledger(self, until: datetime, batch_size: int = 1000) -> int:
+        """Delete the ledger records dispensed before the moment, committing a batch of records at a time,
+        so the dispenses wait for a batch at most. Sales rollups are kept. Returns the deleted records
+        """
+        pass
+
     @abstractmethod
     def commit(self):
         pass
 
+    @abstractmethod
+    def rollback(self):
+        pass
+
+    def get_ingredients_page(
+        self, after: Optional[str] = None, limit: int = 50, prefix: Optional[str] = None
+    ) -> Tuple[model.Ingredient]:
+        """Get ingredients sorted by name, after the name and starting with the prefix (case insensitive).
+        Backends should push the filters and the limit to their storage, this default filters every ingredient.
+        """
+        ingredients = sorted(self.get_ingredients(), key=attrgetter("name"))
+        return tuple(
+            ingredient for ingredient in ingredients
+            if (after is None or ingredient.name > after) and _starts_with(ingredient.name, prefix)
+        )[:limit]
+
+    def get_menu_page(
+        self,
+        after: Optional[Tuple[str, int]] = None,
+        limit: int = 50,
+        prefix: Optional[str] = None,
+        in_stock_only: bool = False,
+    ) -> Tuple[Tuple[str, model.Drink]]:
+        """Get menu items sorted by drink name, after the (drink name, reference) cursor and starting with the prefix
+        (case insensitive). References are the positions in the whole menu, whatever the filters, drinks with the
+        same name keep the order of the whole menu. Backends should push the filters and the limit to their storage,
+        this default filters every drink.
+        """
+        drinks = sorted(self.get_drinks(), key=attrgetter("name"))
+        return tuple(
+            (str(reference), drink) for reference, drink in enumerate(drinks, start=1)
+            if (after is None or (drink.name, reference) > after)
+            and _starts_with(drink.name, prefix)
+            and (not in_stock_only or drink.can_be_dispensed())
+        )[:limit]
+
+    def get_drink_by_reference(self, reference: int) -> Optional[model.Drink]:
+        """Get the drink at a position of the whole menu, as get_menu_page numbers them. None past the last drink.
+        Backends should look it up without loading the catalog, this default sorts every drink.
+        """
+        drinks = sorted(self.get_drinks(), key=attrgetter("name"))
+        return drinks[reference - 1] if 0 < reference <= len(drinks) else None
+
+    def get_stock(self) -> Dict[str, int]:
+        """Get the available quantity by ingredient name, without loading the catalog if the backend can"""
+        return {ingredient.name: ingredient.get_available_quantity() for ingredient in self.get_ingredients()}
+
+    def stream_inventory(self, batch_size: int = 1000) -> Iterator[Tuple]:
+        """Stream the inventory as (name, available quantity, unit cost, machine id) rows, sorted by name.
+        Backends should read it in batches, this default loads every ingredient.
+        """
+        for ingredient in sorted(self.get_ingredients(), key=attrgetter("name")):
+            yield (ingredient.name, ingredient.get_available_quantity(), ingredient.unit_cost, ingredient.machine_id)
+
+    def stream_recipes(self, batch_size: int = 1000) -> Iterator[Tuple]:
+        """Stream the catalog as (drink name, ingredient name, ingredient quantity, machine id) rows,
+        a row by recipe line, sorted by drink and ingredient name.
+        Backends should read it in batches, this default loads every drink.
+        """
+        for drink in sorted(self.get_drinks(), key=attrgetter("name")):
+            for line in sorted(drink.ingredients, key=lambda line: line.ingredient.name):
+                yield (drink.name, line.ingredient.name, line.ingredient_quantity, drink.machine_id)
+
+    def get_oldest_dispense_time(self) -> Optional[datetime]:
+        """Get when the oldest record of the ledger was dispensed, None if the ledger is empty"""
+        for row in self.stream_ledger(batch_size=1):
+            return row[2]
+        return None
+
+    def get_catalog_key(self) -> Tuple:
+        """Get a key of the catalog (drinks, recipes and prices) that changes whenever the catalog changes.
+        Stock changes don't change it. Backends should compute it without loading the catalog.
+        """
+        recipes = sorted(
+            (drink.name, tuple((line.ingredient.name, line.ingredient_quantity) for line in drink.ingredients))
+            for drink in self.get_drinks()
+        )
+        prices = sorted((ingredient.name, ingredient.unit_cost) for ingredient in self.get_ingredients())
+        return tuple(recipes) + tuple(prices)
+
+    def get_revision(self) -> str:
+        """Get a token that changes whenever the stock or the catalog changes, lots that expired included.
+        Backends should read it from a revision kept with the writes, this default reads the stock and the catalog.
+        """
+        state = (sorted(self.get_stock().items()), self.get_catalog_key())
+        return hashlib.sha256(repr(state).encode("utf-8")).hexdigest()[:32]
+
+    def close(self) -> None:
+        """Release the backend resources, the repository isn't used anymore"""
+        pass
+
     def __enter__(self):
         return self
 
-    def __exit__(self, *args):
-        self.commit()  # Add rollback on error
+    def __exit__(self, exc_type, *args):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+
+
+def _starts_with(name: str, prefix: Optional[str]) -> bool:
+    return prefix is None or name.lower().startswith(prefix.lower())
+
+
+def _get_available_quantity(now: datetime):
+    """Available quantity column of the ingredient table without the expired lots, as
+    Ingredient.get_available_quantity reads it. The lots are looked up by ingredient from their index
+    """
+    lots = orm.ingredient_lot_table
+    expired_quantity = (
+        select(func.coalesce(func.sum(lots.c.quantity), 0))
+        .where(lots.c.ingredient_id == orm.ingredient_table.c.id, lots.c.expires_at <= now)
+        .correlate_except(lots)
+        .scalar_subquery()
+    )
+    return orm.ingredient_table.c.available_quantity - expired_quantity
+
+
+def filter_sales(
+    rollups, period: str, since: Optional[datetime] = None, machine_id: Optional[str] = None
+) -> Tuple[model.SalesRollup]:
+    return tuple(sorted(
+        (
+            rollup for rollup in rollups
+            if rollup.period == period
+            and (since is None or rollup.period_start >= since)
+            and (machine_id is None or rollup.machine_id == machine_id)
+        ),
+        key=lambda rollup: (rollup.period_start, rollup.machine_id, rollup.drink_name),
+    ))
 
 
 class FakeRepository(AbstractRepository):
     def __init__(self):
         self.ingredients = set()
         self.drinks = set()
+        self.ledger: List[model.DispenseRecord] = []
+        self.sales: Dict[Tuple[str, datetime, str, str], model.SalesRollup] = {}
+        self.ledger_by_request_id: Dict[str, model.DispenseRecord] = {}
 
     def add_ingredient(self, ingredient: model.Ingredient):
         self.ingredients.add(ingredient)
@@ -54,27 +245,329 @@ class FakeRepository(AbstractRepository):
     def get_drinks(self) -> Set[model.Drink]:
         return self.drinks
 
+    def add_dispense(self, record: model.DispenseRecord):
+        self.ledger.append(record)
+        if record.request_id is not None:
+            self.ledger_by_request_id[record.request_id] = record
+        for period in model.ROLLUP_PERIODS:
+            key = (period, model.truncate_to_period(record.dispensed_at, period), record.machine_id, record.drink_name)
+            rollup = self.sales.get(key)
+            quantity, revenue = (rollup.quantity, rollup.revenue) if rollup else (0, 0.0)
+            self.sales[key] = model.SalesRollup(*key, quantity=quantity + 1, revenue=revenue + record.price)
+
+    def get_dispense_by_request_id(self, request_id: str) -> Optional[model.DispenseRecord]:
+        return self.ledger_by_request_id.get(request_id)
+
+    def get_sales(
+        self, period: str, since: Optional[datetime] = None, machine_id: Optional[str] = None
+    ) -> Tuple[model.SalesRollup]:
+        return filter_sales(self.sales.values(), period, since, machine_id)
+
+    def stream_ledger(
+        self, since: Optional[datetime] = None, until: Optional[datetime] = None, batch_size: int = 1000
+    ) -> Iterator[Tuple]:
+        for record in sorted(self.ledger, key=attrgetter("dispensed_at")):
+            if (since is None or record.dispensed_at >= since) and (until is None or record.dispensed_at < until):
+                yield (record.drink_name, record.price, record.dispensed_at, record.machine_id, record.request_id)
+
+    def delete_ledger(self, until: datetime, batch_size: int = 1000) -> int:
+        kept = [record for record in self.ledger if record.dispensed_at >= until]
+        deleted = len(self.ledger) - len(kept)
+        self.ledger = kept
+        self.ledger_by_request_id = {record.request_id: record for record in kept if record.request_id is not None}
+        return deleted
+
     def commit(self):
         pass
 
+    def rollback(self):
+        pass
+
 
 class SQLAlchemyRepository(AbstractRepository):
-    def __init__(self, session):
+    """Repository over a session. With a machine id, it only reads and adds the rows of that machine"""
+    thread_safe_objects = False
+
+    def __init__(self, session, machine_id: Optional[str] = None):
         self.session = session
+        self.machine_id = machine_id
 
     def add_ingredient(self, ingredient: model.Ingredient):
+        self._assign_machine(ingredient)
         self.session.add(ingredient)
         self.session.commit()
 
     def add_drink(self, drink: model.Drink):
+        self._assign_machine(drink)
+        for drink_ingredient in drink.ingredients:
+            self._assign_machine(drink_ingredient.ingredient)
         self.session.add(drink)
         self.session.commit()
 
     def get_ingredients(self) -> Set[model.Ingredient]:
-        return self.session.query(model.Ingredient).all()
+        return self._query_machine_rows(model.Ingredient).all()
 
     def get_drinks(self) -> Set[model.Drink]:
-        return self.session.query(model.Drink).all()
+        # In id order, drinks with the same name are numbered by id in the menu
+        return self._query_machine_rows(model.Drink).order_by(model.Drink.id).all()
+
+    def get_ingredients_page(
+        self, after: Optional[str] = None, limit: int = 50, prefix: Optional[str] = None
+    ) -> Tuple[model.Ingredient]:
+        query = self._query_machine_rows(model.Ingredient)
+        if after is not None:
+            query = query.filter(model.Ingredient.name > after)
+        if prefix:
+            query = query.filter(model.Ingredient.name.istartswith(prefix, autoescape=True))
+        return tuple(query.order_by(model.Ingredient.name).limit(limit))
+
+    def get_menu_page(
+        self,
+        after: Optional[Tuple[str, int]] = None,
+        limit: int = 50,
+        prefix: Optional[str] = None,
+        in_stock_only: bool = False,
+    ) -> Tuple[Tuple[str, model.Drink]]:
+        # Keyset on (name, id) from the machine and name index. The reference of a drink is the number of drinks
+        # up to it in that order, only counted for the rows the page reads, instead of ranking the whole table
+        drinks = orm.drink_table
+        earlier_drinks = drinks.alias("earlier_drink")
+        reference_query = select(func.count()).select_from(earlier_drinks).where(
+            or_(
+                earlier_drinks.c.name < drinks.c.name,
+                and_(earlier_drinks.c.name == drinks.c.name, earlier_drinks.c.id <= drinks.c.id),
+            )
+        )
+        query = select(drinks.c.id)
+        if self.machine_id is not None:
+            reference_query = reference_query.where(earlier_drinks.c.machine_id == self.machine_id)
+            query = query.where(drinks.c.machine_id == self.machine_id)
+        reference = reference_query.scalar_subquery()
+        query = query.add_columns(reference.label("reference"))
+        if after is not None:
+            after_name, after_reference = after
+            # The reference is only counted for the drinks named as the cursor
+            query = query.where(
+                or_(drinks.c.name > after_name, and_(drinks.c.name == after_name, reference > after_reference))
+            )
+        if prefix:
+            query = query.where(drinks.c.name.istartswith(prefix, autoescape=True))
+        if in_stock_only:
+            missing_ingredient = (
+                select(orm.drink_drink_ingredient.c.drink_id)
+                .select_from(orm.drink_drink_ingredient)
+                .join(orm.drink_ingredient_table)
+                .join(orm.ingredient_table)
+                .where(
+                    orm.drink_drink_ingredient.c.drink_id == drinks.c.id,
+                    _get_available_quantity(model.utcnow()) < orm.drink_ingredient_table.c.ingredient_quantity,
+                )
+            )
+            query = query.where(~exists(missing_ingredient))
+        rows = self.session.execute(query.order_by(drinks.c.name, drinks.c.id).limit(limit)).all()
+        drinks_by_id = {
+            drink.id: drink
+            for drink in self.session.query(model.Drink).filter(model.Drink.id.in_([row.id for row in rows]))
+        }
+        return tuple((str(row.reference), drinks_by_id[row.id]) for row in rows)
+
+    def get_drink_by_reference(self, reference: int) -> Optional[model.Drink]:
+        if reference < 1:
+            return None
+        query = self._query_machine_rows(model.Drink).order_by(model.Drink.name, model.Drink.id)
+        return query.offset(reference - 1).limit(1).first()
+
+    def get_stock(self) -> Dict[str, int]:
+        ingredients = orm.ingredient_table
+        query = select(ingredients.c.name, _get_available_quantity(model.utcnow()).label("available_quantity"))
+        if self.machine_id is not None:
+            query = query.where(ingredients.c.machine_id == self.machine_id)
+        return dict(self.session.execute(query).all())
+
+    def get_revision(self) -> str:
+        # One query: the revision bumped with every write of the machine, and the lots expired by now, which
+        # change the stock without a write. Lots of every machine are counted, from the expiry index
+        revisions, lots = orm.machine_revision_table, orm.ingredient_lot_table
+        revision = select(func.coalesce(func.sum(revisions.c.revision), 0))
+        if self.machine_id is not None:
+            revision = revision.where(revisions.c.machine_id == self.machine_id)
+        expired_lots = select(func.count()).select_from(lots).where(lots.c.expires_at <= model.utcnow())
+        row = self.session.execute(select(revision.scalar_subquery(), expired_lots.scalar_subquery())).one()
+        return f"{row[0]}-{row[1]}"
+
+    def get_catalog_key(self) -> Tuple:
+        # Digest of every catalog row, read as narrow core rows without loading objects into the session:
+        # any rename, price or recipe line change changes it, not only the ones that change a count or a sum
+        drinks, ingredients, drink_ingredients = orm.drink_table, orm.ingredient_table, orm.drink_ingredient_table
+        drink_links = orm.drink_drink_ingredient
+        drink_query = select(drinks.c.id, drinks.c.name).order_by(drinks.c.id)
+        ingredient_query = select(ingredients.c.id, ingredients.c.name, ingredients.c.unit_cost).order_by(
+            ingredients.c.id
+        )
+        recipe_query = (
+            select(
+                drink_links.c.drink_id,
+                drink_ingredients.c.id,
+                drink_ingredients.c.ingredient_id,
+                drink_ingredients.c.ingredient_quantity,
+            )
+            .select_from(drink_links)
+            .join(drink_ingredients)
+            .join(drinks, drink_links.c.drink_id == drinks.c.id)
+            .order_by(drink_links.c.drink_id, drink_ingredients.c.id)
+        )
+        if self.machine_id is not None:
+            drink_query = drink_query.where(drinks.c.machine_id == self.machine_id)
+            ingredient_query = ingredient_query.where(ingredients.c.machine_id == self.machine_id)
+            recipe_query = recipe_query.where(drinks.c.machine_id == self.machine_id)
+        digest = hashlib.sha256()
+        for query in (drink_query, ingredient_query, recipe_query):
+            # Separates the tables, a row can't move from one to the next unnoticed
+            digest.update(b"\x1d")
+            for row in self.session.execute(query):
+                digest.update(repr(tuple(row)).encode("utf-8"))
+        return (digest.hexdigest(), )
+
+    def _stream(self, query, batch_size: int) -> Iterator[Tuple]:
+        # Core rows fetched by batches, from a server-side cursor where the database has them.
+        # Nothing is added to the session, the memory stays bounded by the batch size
+        result = self.session.execute(query.execution_options(yield_per=batch_size))
+        for partition in result.partitions():
+            for row in partition:
+                yield tuple(row)
+
+    def _query_machine_rows(self, entity):
+        query = self.session.query(entity)
+        if self.machine_id is not None:
+            query = query.filter(entity.machine_id == self.machine_id)
+        return query
+
+    def _assign_machine(self, instance: Union[model.Ingredient, model.Drink]):
+        if self.machine_id is not None:
+            instance.machine_id = self.machine_id
+
+    def add_dispense(self, record: model.DispenseRecord):
+        self.session.add(record)
+        rollups = orm.sales_rollup_table
+        dialect = postgresql if self.session.get_bind().dialect.name == "postgresql" else sqlite
+        for period in model.ROLLUP_PERIODS:
+            statement = dialect.insert(rollups).values(
+                period=period,
+                period_start=model.truncate_to_period(record.dispensed_at, period),
+                machine_id=record.machine_id,
+                drink_name=record.drink_name,
+                quantity=1,
+                revenue=record.price,
+            )
+            self.session.execute(
+                statement.on_conflict_do_update(
+                    index_elements=list(rollups.primary_key),
+                    set_={
+                        "quantity": rollups.c.quantity + 1,
+                        "revenue": rollups.c.revenue + statement.excluded.revenue,
+                    },
+                )
+            )
+
+    def get_dispense_by_request_id(self, request_id: str) -> Optional[model.DispenseRecord]:
+        # A core select on the unique index, the record isn't added to the session
+        ledger = orm.dispense_ledger_table
+        query = select(
+            ledger.c.drink_name,
+            ledger.c.price,
+            ledger.c.dispensed_at,
+            ledger.c.machine_id,
+            ledger.c.request_id,
+        ).where(ledger.c.request_id == request_id)
+        row = self.session.execute(query).first()
+        return model.DispenseRecord(*row) if row is not None else None
+
+    def get_sales(
+        self, period: str, since: Optional[datetime] = None, machine_id: Optional[str] = None
+    ) -> Tuple[model.SalesRollup]:
+        rollups = orm.sales_rollup_table
+        query = select(
+            rollups.c.period,
+            rollups.c.period_start,
+            rollups.c.machine_id,
+            rollups.c.drink_name,
+            rollups.c.quantity,
+            rollups.c.revenue,
+        ).where(rollups.c.period == period)
+        if since is not None:
+            query = query.where(rollups.c.period_start >= since)
+        if machine_id is not None:
+            query = query.where(rollups.c.machine_id == machine_id)
+        query = query.order_by(rollups.c.period_start, rollups.c.machine_id, rollups.c.drink_name)
+        return tuple(model.SalesRollup(*row) for row in self.session.execute(query))
+
+    def stream_inventory(self, batch_size: int = 1000) -> Iterator[Tuple]:
+        ingredients = orm.ingredient_table
+        query = select(
+            ingredients.c.name,
+            _get_available_quantity(model.utcnow()).label("available_quantity"),
+            ingredients.c.unit_cost,
+            ingredients.c.machine_id,
+        )
+        if self.machine_id is not None:
+            query = query.where(ingredients.c.machine_id == self.machine_id)
+        return self._stream(query.order_by(ingredients.c.name, ingredients.c.id), batch_size)
+
+    def stream_recipes(self, batch_size: int = 1000) -> Iterator[Tuple]:
+        drinks, ingredients, drink_ingredients = orm.drink_table, orm.ingredient_table, orm.drink_ingredient_table
+        query = (
+            select(drinks.c.name, ingredients.c.name, drink_ingredients.c.ingredient_quantity, drinks.c.machine_id)
+            .select_from(drinks)
+            .join(orm.drink_drink_ingredient, orm.drink_drink_ingredient.c.drink_id == drinks.c.id)
+            .join(drink_ingredients)
+            .join(ingredients)
+        )
+        if self.machine_id is not None:
+            query = query.where(drinks.c.machine_id == self.machine_id)
+        return self._stream(query.order_by(drinks.c.name, drinks.c.id, ingredients.c.name), batch_size)
+
+    def stream_ledger(
+        self, since: Optional[datetime] = None, until: Optional[datetime] = None, batch_size: int = 1000
+    ) -> Iterator[Tuple]:
+        ledger = orm.dispense_ledger_table
+        query = select(
+            ledger.c.drink_name, ledger.c.price, ledger.c.dispensed_at, ledger.c.machine_id, ledger.c.request_id
+        )
+        if self.machine_id is not None:
+            query = query.where(ledger.c.machine_id == self.machine_id)
+        if since is not None:
+            query = query.where(ledger.c.dispensed_at >= since)
+        if until is not None:
+            query = query.where(ledger.c.dispensed_at < until)
+        return self._stream(query.order_by(ledger.c.dispensed_at, ledger.c.id), batch_size)
+
+    def get_oldest_dispense_time(self) -> Optional[datetime]:
+        ledger = orm.dispense_ledger_table
+        query = select(func.min(ledger.c.dispensed_at))
+        if self.machine_id is not None:
+            query = query.where(ledger.c.machine_id == self.machine_id)
+        return self.session.execute(query).scalar()
+
+    def delete_ledger(self, until: datetime, batch_size: int = 1000) -> int:
+        # Oldest first by ids from the time index, a short transaction by batch
+        ledger = orm.dispense_ledger_table
+        batch = select(ledger.c.id).where(ledger.c.dispensed_at < until)
+        if self.machine_id is not None:
+            batch = batch.where(ledger.c.machine_id == self.machine_id)
+        batch = batch.order_by(ledger.c.dispensed_at).limit(batch_size)
+        deleted = 0
+        while True:
+            result = self.session.execute(delete(ledger).where(ledger.c.id.in_(batch.scalar_subquery())))
+            self.session.commit()
+            deleted += result.rowcount
+            if result.rowcount < batch_size:
+                return deleted
 
     def commit(self):
         self.session.commit()
+
+    def rollback(self):
+        self.session.rollback()
+
+    def close(self) -> None:
+        self.session.close()
@@ -0,0 +1,122 @@
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import (
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import (
+    Session,
+    selectinload,
+    sessionmaker,
+)
+
+from barista_matic.adapters.repository import SQLAlchemyRepository
+from barista_matic.domain import model
+
+T = TypeVar("T")
+
+
+class ShardRouter:
+    """Routes every machine to one of several databases.
+
+    All the rows of a machine live in its shard, so its hot path runs against a single engine.
+    Machines are placed by a stable hash of their id, unless they have an explicit assignment.
+    Fleet-wide reads fan out to every shard in parallel.
+    """
+    def __init__(self, engines: Sequence[Engine], assignments: Optional[Mapping[str, int]] = None):
+        if not engines:
+            raise ValueError("At least one shard is required")
+        self.engines = tuple(engines)
+        self.session_factories = tuple(sessionmaker(engine) for engine in self.engines)
+        self.assignments = dict(assignments or {})
+
+    def get_shard_index(self, machine_id: str) -> int:
+        """Get the shard that owns the machine rows
+
+        Args:
+            machine_id (str): Machine id
+
+        Returns:
+            int: Index of the shard engine
+        """
+        if machine_id in self.assignments:
+            return self.assignments[machine_id]
+        return zlib.crc32(machine_id.encode()) % len(self.engines)
+
+    def get_session_factory(self, machine_id: str) -> Callable[..., Session]:
+        """Get the session factory of the machine shard, e.g. for a unit of work
+
+        Args:
+            machine_id (str): Machine id
+
+        Returns:
+            Callable[..., Session]: Session factory
+        """
+        return self.session_factories[self.get_shard_index(machine_id)]
+
+    def get_repository(self, machine_id: str, session: Optional[Session] = None) -> SQLAlchemyRepository:
+        """Get a repository limited to the machine rows, in its shard
+
+        Args:
+            machine_id (str): Machine id
+            session (Optional[Session]): Session of the machine shard, a new one by default
+
+        Returns:
+            SQLAlchemyRepository: The machine repository
+        """
+        return SQLAlchemyRepository(session or self.get_session_factory(machine_id)(), machine_id=machine_id)
+
+    def get_fleet_inventory(self) -> Dict[str, Tuple[model.Ingredient]]:
+        """Get the inventory of every machine in every shard
+
+        Returns:
+            Dict[str, Tuple[model.Ingredient]]: Ingredients sorted by name, by machine id
+        """
+        inventory: Dict[str, List[model.Ingredient]] = {}
+        for ingredients in self._fan_out(self._read_inventory):
+            for ingredient in ingredients:
+                inventory.setdefault(ingredient.machine_id, []).append(ingredient)
+        return {machine_id: tuple(ingredients) for machine_id, ingredients in sorted(inventory.items())}
+
+    def get_fleet_sales(self, period: str, since: Optional[datetime] = None) -> Tuple[model.SalesRollup]:
+        """Get the sales rollups of every machine in every shard
+
+        Args:
+            period (str): One of model.ROLLUP_PERIODS
+            since (Optional[datetime]): First period start to include
+
+        Returns:
+            Tuple[model.SalesRollup]: Sales sorted by period start, machine and drink name
+        """
+        def read_sales(session: Session) -> Tuple[model.SalesRollup]:
+            return SQLAlchemyRepository(session).get_sales(period, since)
+
+        sales = [rollup for shard_sales in self._fan_out(read_sales) for rollup in shard_sales]
+        return tuple(sorted(sales, key=lambda rollup: (rollup.period_start, rollup.machine_id, rollup.drink_name)))
+
+    def _fan_out(self, read: Callable[[Session], T]) -> List[T]:
+        def read_shard(session_factory):
+            with session_factory() as session:
+                return read(session)
+
+        with ThreadPoolExecutor(max_workers=len(self.session_factories)) as executor:
+            return list(executor.map(read_shard, self.session_factories))
+
+    @staticmethod
+    def _read_inventory(session: Session) -> List[model.Ingredient]:
+        # The ingredients outlive the session, their lots are loaded with them for the stock reads
+        return (
+            session.query(model.Ingredient)
+            .options(selectinload(model.Ingredient.lots))
+            .order_by(model.Ingredient.machine_id, model.Ingredient.name)
+            .all()
+        )
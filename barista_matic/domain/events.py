@@ -0,0 +1,231 @@
+import contextlib
+import logging
+import threading
+import time
+from dataclasses import (
+    dataclass,
+    replace,
+)
+from typing import (
+    Callable,
+    Dict,
+    Hashable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Type,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Event:
+    """Something that happened in the domain"""
+
+    @property
+    def coalesce_key(self) -> Hashable:
+        """Events with the same key can be merged by coalescing subscribers"""
+        return None
+
+    def coalesce(self, later: "Event") -> "Event":
+        """Merge a later event with the same key into this one
+
+        Args:
+            later (Event): The later event
+
+        Returns:
+            Event: The merged event
+        """
+        return later
+
+
+@dataclass(frozen=True)
+class IngredientStockChanged(Event):
+    """The stock of an ingredient was updated"""
+    ingredient_name: str
+    machine_id: str
+    previous_quantity: int
+    available_quantity: int
+
+    @property
+    def coalesce_key(self) -> Hashable:
+        return (self.machine_id, self.ingredient_name)
+
+    def coalesce(self, later: "IngredientStockChanged") -> "IngredientStockChanged":
+        return replace(later, previous_quantity=self.previous_quantity)
+
+
+@dataclass(frozen=True)
+class DrinkDispensed(Event):
+    """A drink was dispensed"""
+    drink_name: str
+    machine_id: str
+
+    @property
+    def coalesce_key(self) -> Hashable:
+        return (self.machine_id, self.drink_name)
+
+
+class Subscription:
+    """Handler of an event type. With a coalescing window, the handler gets at most one event per key
+    and window: events that arrive too early are merged and delivered when the window is over.
+    """
+    def __init__(
+        self,
+        event_type: Type[Event],
+        handler: Callable[[Event], None],
+        coalesce_seconds: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.event_type = event_type
+        self.handler = handler
+        self.coalesce_seconds = coalesce_seconds
+        self.clock = clock
+        self._last_delivery: Dict[Hashable, float] = {}
+        self._pending: Dict[Hashable, Event] = {}
+        self._timers: Dict[Hashable, threading.Timer] = {}
+        self._lock = threading.Lock()
+
+    def deliver(self, event: Event) -> None:
+        """Handle the event now, or hold it until the coalescing window is over
+
+        Args:
+            event (Event): Published event
+        """
+        if self.coalesce_seconds is None:
+            self._handle(event)
+            return
+        key = event.coalesce_key
+        with self._lock:
+            now = self.clock()
+            last_delivery = self._last_delivery.get(key)
+            if key not in self._pending and (last_delivery is None or now - last_delivery >= self.coalesce_seconds):
+                self._last_delivery[key] = now
+            else:
+                pending = self._pending.get(key)
+                self._pending[key] = pending.coalesce(event) if pending is not None else event
+                if key not in self._timers:
+                    timer = threading.Timer(last_delivery + self.coalesce_seconds - now, self._deliver_pending, (key, ))
+                    timer.daemon = True
+                    self._timers[key] = timer
+                    timer.start()
+                return
+        self._handle(event)
+
+    def flush(self) -> None:
+        """Deliver every held event now, e.g. before shutting down"""
+        for key in list(self._pending):
+            self._deliver_pending(key)
+
+    def cancel(self) -> None:
+        """Drop the held events"""
+        with self._lock:
+            for timer in self._timers.values():
+                timer.cancel()
+            self._timers.clear()
+            self._pending.clear()
+
+    def _deliver_pending(self, key: Hashable) -> None:
+        with self._lock:
+            timer = self._timers.pop(key, None)
+            if timer is not None:
+                timer.cancel()
+            event = self._pending.pop(key, None)
+            if event is None:
+                return
+            self._last_delivery[key] = self.clock()
+        self._handle(event)
+
+    def _handle(self, event: Event) -> None:
+        try:
+            self.handler(event)
+        except Exception:
+            logger.exception("Handler %s failed for %s", self.handler, event)
+
+
+class EventBus:
+    """In-process publish/subscribe of domain events. Publishing without subscribers is a dict lookup"""
+    def __init__(self):
+        self._subscriptions: Dict[Type[Event], Tuple[Subscription, ...]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(
+        self,
+        event_type: Type[Event],
+        handler: Callable[[Event], None],
+        coalesce_seconds: Optional[float] = None,
+    ) -> Subscription:
+        """Handle the published events of the type
+
+        Args:
+            event_type (Type[Event]): Event type, subclasses are not included
+            handler (Callable[[Event], None]): Event handler, called in the publisher thread or a timer thread
+            coalesce_seconds (Optional[float]): Minimum time between events with the same key, None to get them all
+
+        Returns:
+            Subscription: The subscription, to unsubscribe
+        """
+        subscription = Subscription(event_type, handler, coalesce_seconds)
+        with self._lock:
+            self._subscriptions[event_type] = self._subscriptions.get(event_type, ()) + (subscription, )
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """Stop handling events, held events are dropped
+
+        Args:
+            subscription (Subscription): A subscription of this bus
+        """
+        with self._lock:
+            self._subscriptions[subscription.event_type] = tuple(
+                current for current in self._subscriptions.get(subscription.event_type, ())
+                if current is not subscription
+            )
+        subscription.cancel()
+
+    def publish(self, event: Event) -> None:
+        """Deliver the event to the subscriptions of its type
+
+        Args:
+            event (Event): Event to publish
+        """
+        for subscription in self._subscriptions.get(type(event), ()):
+            subscription.deliver(event)
+
+
+bus = EventBus()
+# Events held by the transactions in progress, by thread
+_held_events = threading.local()
+
+
+def publish(event: Event) -> None:
+    """Publish the event to the default bus. Events published while this thread holds them are held instead
+
+    Args:
+        event (Event): Event to publish
+    """
+    held_events = getattr(_held_events, "events", None)
+    if held_events is None:
+        bus.publish(event)
+    else:
+        held_events.append(event)
+
+
+@contextlib.contextmanager
+def holding_events() -> Iterator[Optional[List[Event]]]:
+    """Hold the events published by this thread, e.g. until a transaction is committed.
+    A nested scope holds them in the outermost one
+
+    Yields:
+        Optional[List[Event]]: The held events, to publish or drop on exit. None in a nested scope
+    """
+    if getattr(_held_events, "events", None) is not None:
+        yield None
+        return
+    _held_events.events = held_events = []
+    try:
+        yield held_events
+    finally:
+        _held_events.events = None
@@ -11,3 +11,11 @@ class DrinkNotExist(ValueError):
 
 class InvalidSelectedDrink(ValueError):
     """The selection is invalid"""
+
+
+class ReservationNotActive(ValueError):
+    """The reservation was already confirmed, released or expired"""
+
+
+class InvalidCustomization(ValueError):
+    """The customization is unknown or uses an ingredient that isn't available"""
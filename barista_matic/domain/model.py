@@ -1,35 +1,211 @@
-from dataclasses import dataclass
+from dataclasses import (
+    dataclass,
+    field,
+)
+from datetime import (
+    datetime,
+    timezone,
+)
+from functools import cached_property
+import heapq
+import itertools
+from types import MappingProxyType
 from typing import (
+    Any,
     Dict,
     Iterable,
     List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from . import (
+    events,
+    exceptions,
 )
 
-from . import exceptions
+ROLLUP_PERIODS = ("hour", "day")
+DEFAULT_MACHINE_ID = "default"
+# Lots without expiry date sort after every dated lot
+NEVER_EXPIRES = datetime.max
+CUSTOMIZATION_SEPARATOR = " + "
+# Longest drink name the ledger records, customized drinks included
+RECORDED_DRINK_NAME_LENGTH = 255
+# Quantities held by reservations, by ingredient name
+NO_HOLDS: Mapping[str, int] = MappingProxyType({})
+
+
+def utcnow() -> datetime:
+    """Current UTC time, without timezone as stored by the database
+
+    Returns:
+        datetime: Current time
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def truncate_to_period(moment: datetime, period: str) -> datetime:
+    """Get the start of the rollup period that contains the moment
+
+    Args:
+        moment (datetime): A moment
+        period (str): One of ROLLUP_PERIODS
+
+    Returns:
+        datetime: Period start
+    """
+    if period == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    if period == "day":
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"Unknown rollup period {period}")
+
+
+_lot_sequence = itertools.count()
+
+
+@dataclass(eq=False)
+class Lot:
+    """Stock of an ingredient received at once, usable until its expiry date"""
+    quantity: int
+    expires_at: Optional[datetime] = None
+    received_at: datetime = field(default_factory=utcnow)
+
+    def is_expired(self, now: datetime) -> bool:
+        """Check if the lot can't be used anymore
+
+        Args:
+            now (datetime): Current UTC time
+
+        Returns:
+            bool: Is expired
+        """
+        return self.expires_at is not None and self.expires_at <= now
+
+    def get_heap_entry(self) -> Tuple[datetime, datetime, int, "Lot"]:
+        """Get the entry of the lot in the consumption heap: soonest expiry first, then oldest first
+
+        Returns:
+            Tuple[datetime, datetime, int, Lot]: Heap entry
+        """
+        return (self.expires_at or NEVER_EXPIRES, self.received_at, next(_lot_sequence), self)
+
+
+# Quantities taken from the lots of an ingredient by a dispense, to give them back if it is released
+LotAllocations = Tuple[Tuple[Lot, int], ...]
 
 
 @dataclass
 class Ingredient:
-    """Represents an inventory item"""
+    """Represents an inventory item.
+
+    The stock of an ingredient can be backed by lots. Then the available quantity column is the sum of the lots,
+    expired ones included until they are discarded, and get_available_quantity leaves the expired ones out.
+    Lots are consumed soonest expiry first from a heap. Stock changes discard the expired lots at the top of
+    the heap, reads never change the stock. The plain stock an ingredient had when it received its first lot
+    becomes a lot without expiry date. Without lots, the stock is a plain quantity.
+    """
     name: str
     available_quantity: int
     unit_cost: float
+    machine_id: str = DEFAULT_MACHINE_ID
+    tracks_lots: bool = False
+    lots: List[Lot] = field(default_factory=list, compare=False, repr=False)
 
-    def deallocate_quantity(self, quantity: int) -> None:
-        """Subtract the quantity used from the stock
+    def deallocate_quantity(self, quantity: int) -> LotAllocations:
+        """Subtract the quantity used from the stock, from the lots that expire first
 
         Args:
             quantity (int): Quantity to substract
+
+        Returns:
+            LotAllocations: Quantity taken from every lot, empty without lots
+        """
+        lot_heap = self._get_lot_heap()
+        taken_from_lots = []
+        if lot_heap is not None:
+            self.discard_expired_lots()
+            remaining = quantity
+            while remaining and lot_heap:
+                lot = lot_heap[0][-1]
+                taken = min(lot.quantity, remaining)
+                lot.quantity -= taken
+                remaining -= taken
+                taken_from_lots.append((lot, taken))
+                if not lot.quantity:
+                    self._drop_top_lot()
+        self._set_available_quantity(self.available_quantity - quantity)
+        return tuple(taken_from_lots)
+
+    def allocate_quantity(self, quantity: int, taken_from_lots: LotAllocations = ()) -> None:
+        """Give back to the stock a quantity that was not used, every lot gets back what was taken from it
+
+        Args:
+            quantity (int): Quantity to give back
+            taken_from_lots (LotAllocations): Quantity taken from every lot, as deallocate_quantity returned it
+        """
+        lot_heap = self._get_lot_heap()
+        if lot_heap is not None:
+            given_back = 0
+            for lot, taken in taken_from_lots:
+                if lot.quantity:
+                    lot.quantity += taken
+                else:
+                    # The lot was emptied since, its stock comes back as a new lot with the same dates
+                    self._push_lot(Lot(taken, lot.expires_at, lot.received_at))
+                given_back += taken
+            if quantity > given_back:
+                self._push_lot(Lot(quantity - given_back))
+        self._set_available_quantity(self.available_quantity + quantity)
+
+    def receive_lot(self, lot: Lot) -> None:
+        """Add a lot to the stock
+
+        Args:
+            lot (Lot): Received lot
         """
-        self.available_quantity -= quantity
+        self._get_lot_heap(tracking=True)
+        self._push_lot(lot)
+        self._set_available_quantity(self.available_quantity + lot.quantity)
 
-    def get_available_quantity(self) -> int:
-        """Returns the available quantity
+    def discard_expired_lots(self, now: Optional[datetime] = None) -> int:
+        """Remove the expired lots from the stock. Only the top of the heap is checked, so every lot is
+        discarded once and a check without expired lots is O(1)
+
+        Args:
+            now (Optional[datetime]): Current UTC time, now by default
+
+        Returns:
+            int: Discarded quantity
+        """
+        lot_heap = self._get_lot_heap()
+        if not lot_heap:
+            return 0
+        now = now or utcnow()
+        discarded = 0
+        while lot_heap and lot_heap[0][-1].is_expired(now):
+            discarded += lot_heap[0][-1].quantity
+            self._drop_top_lot()
+        if discarded:
+            self._set_available_quantity(self.available_quantity - discarded)
+        return discarded
+
+    def get_available_quantity(self, now: Optional[datetime] = None) -> int:
+        """Returns the available quantity, without expired lots. The expired lots stay in the stock
+        until a stock change or discard_expired_lots removes them
+
+        Args:
+            now (Optional[datetime]): Current UTC time, now by default
 
         Returns:
             int: Available quantity
         """
-        return self.available_quantity
+        lot_heap = self._get_lot_heap()
+        if not lot_heap:
+            return self.available_quantity
+        return self.available_quantity - self._get_expired_quantity(now or utcnow())
 
     def can_deallocate_quantity(self, quantity: int) -> bool:
         """Check if there is sufficient stock to use the specified quantity
@@ -40,7 +216,7 @@ class Ingredient:
         Returns:
             bool: Is stock quantity enough
         """
-        return self.available_quantity >= quantity
+        return self.get_available_quantity() >= quantity
 
     def get_cost_for_quantity(self, quantity: int) -> float:
         """Compute the cost for using the specified quantity
@@ -54,12 +230,71 @@ class Ingredient:
         return self.unit_cost * quantity
 
     def restock_to_quantity(self, quantity: int) -> None:
-        """Update the stock to the specified quantity
+        """Update the stock to the specified quantity. With lots, the expired lots are discarded and
+        the missing quantity is received as a lot without expiry date
 
         Args:
             quantity (int): New quantity stock
         """
+        if self._get_lot_heap() is None:
+            self._set_available_quantity(quantity)
+            return
+        self.discard_expired_lots()
+        missing_quantity = quantity - self.available_quantity
+        if missing_quantity > 0:
+            self.receive_lot(Lot(missing_quantity))
+        elif missing_quantity < 0:
+            self.deallocate_quantity(-missing_quantity)
+
+    def forget_lot_heap(self) -> None:
+        """Build the heap again from the lots on next use, e.g. when the lots were reloaded after a rollback"""
+        self._lot_heap = None
+
+    def _get_lot_heap(self, tracking: bool = False) -> Optional[List[Tuple[datetime, datetime, int, Lot]]]:
+        # Mapped ingredients are loaded without __init__, the heap is built from the lots on first use.
+        # Ingredients that never received a lot don't load the lots
+        lot_heap = getattr(self, "_lot_heap", None)
+        if lot_heap is None and (tracking or self.tracks_lots):
+            lot_heap = [lot.get_heap_entry() for lot in self.lots if lot.quantity > 0]
+            heapq.heapify(lot_heap)
+            self._lot_heap = lot_heap
+            self._dead_lots = len(self.lots) - len(lot_heap)
+            if not self.tracks_lots:
+                self.tracks_lots = True
+                # The stock received before the first lot is kept, as a lot that never expires
+                if self.available_quantity > 0:
+                    self._push_lot(Lot(self.available_quantity))
+        return lot_heap
+
+    def _get_expired_quantity(self, now: datetime) -> int:
+        # A lot expires after its parents in the heap, only the expired lots and their children are visited
+        lot_heap = self._lot_heap
+        expired_quantity = 0
+        indexes = [0]
+        while indexes:
+            index = indexes.pop()
+            if index < len(lot_heap) and lot_heap[index][-1].is_expired(now):
+                expired_quantity += lot_heap[index][-1].quantity
+                indexes.extend((2 * index + 1, 2 * index + 2))
+        return expired_quantity
+
+    def _push_lot(self, lot: Lot) -> None:
+        self.lots.append(lot)
+        heapq.heappush(self._lot_heap, lot.get_heap_entry())
+
+    def _drop_top_lot(self) -> None:
+        # Emptied lots stay in the list until they are half of it, then they are removed at once
+        lot = heapq.heappop(self._lot_heap)[-1]
+        lot.quantity = 0
+        self._dead_lots += 1
+        if self._dead_lots * 2 > len(self.lots):
+            self.lots[:] = [live_lot for live_lot in self.lots if live_lot.quantity > 0]
+            self._dead_lots = 0
+
+    def _set_available_quantity(self, quantity: int) -> None:
+        previous_quantity = self.available_quantity
         self.available_quantity = quantity
+        events.publish(events.IngredientStockChanged(self.name, self.machine_id, previous_quantity, quantity))
 
     def __hash__(self):
         return hash(self.name)
@@ -71,17 +306,32 @@ class DrinkIngredient:
     ingredient: Ingredient
     ingredient_quantity: int
 
-    def can_be_dispensed(self) -> bool:
+    def can_be_dispensed(self, held: int = 0) -> bool:
         """Check if the stock of the ingredient is enough to dispense this ingredient
 
+        Args:
+            held (int): Quantity of the ingredient held by reservations, not available to dispense
+
         Returns:
             bool: Can be dispensed
         """
-        return self.ingredient.can_deallocate_quantity(self.ingredient_quantity)
+        return self.ingredient.can_deallocate_quantity(self.ingredient_quantity + held)
+
+    def dispense(self) -> LotAllocations:
+        """Update ingredient stock
+
+        Returns:
+            LotAllocations: Quantity taken from every lot of the ingredient
+        """
+        return self.ingredient.deallocate_quantity(self.ingredient_quantity)
+
+    def release(self, taken_from_lots: LotAllocations = ()) -> None:
+        """Give back the dispensed ingredient to the stock
 
-    def dispense(self) -> None:
-        """Update ingredient stock"""
-        self.ingredient.deallocate_quantity(self.ingredient_quantity)
+        Args:
+            taken_from_lots (LotAllocations): Quantity taken from every lot, as the dispense returned it
+        """
+        self.ingredient.allocate_quantity(self.ingredient_quantity, taken_from_lots)
 
     def get_cost(self) -> float:
         """Get cost for using this component
@@ -95,30 +345,73 @@ class DrinkIngredient:
         return hash(self.ingredient)
 
 
-@dataclass
-class Drink:
-    """Represents a drink with their ingredients"""
+class Recipe:
+    """Stock checks, dispensing and cost of anything with a name, a machine and ingredient lines"""
     name: str
-    ingredients: List[DrinkIngredient]
+    ingredients: Sequence[DrinkIngredient]
+    machine_id: str
 
-    def can_be_dispensed(self) -> bool:
+    def can_be_dispensed(self, holds: Mapping[str, int] = NO_HOLDS) -> bool:
         """Check if the stock of every ingredient to use is enough
 
+        Args:
+            holds (Mapping[str, int]): Quantities held by reservations, by ingredient name
+
         Returns:
             bool: Stock is enough
         """
-        return all(ingredient_line.can_be_dispensed() for ingredient_line in self.ingredients)
+        return all(
+            ingredient_line.can_be_dispensed(holds.get(ingredient_line.ingredient.name, 0))
+            for ingredient_line in self.ingredients
+        )
 
-    def dispense(self) -> None:
-        """Dispense the drink and update the stock for every ingredient.
+    def check_can_be_dispensed(self, holds: Mapping[str, int] = NO_HOLDS) -> None:
+        """Check the stock of every ingredient, before changing anything.
+
+        Args:
+            holds (Mapping[str, int]): Quantities held by reservations, by ingredient name
 
         Raises:
             exceptions.OutOfStock: Ingredient stock is not enough
         """
-        if not self.can_be_dispensed():
+        if not self.can_be_dispensed(holds):
             raise exceptions.OutOfStock("Drink cannot be dispensed because ingredients aren't sufficient", self)
+
+    def dispense(self) -> Tuple[LotAllocations, ...]:
+        """Dispense the drink and update the stock for every ingredient.
+
+        Raises:
+            exceptions.OutOfStock: Ingredient stock is not enough
+
+        Returns:
+            Tuple[LotAllocations, ...]: Quantity taken from every lot, by ingredient line
+        """
+        self.check_can_be_dispensed()
+        taken_from_lots = tuple(ingredient_line.dispense() for ingredient_line in self.ingredients)
+        events.publish(events.DrinkDispensed(self.name, self.machine_id))
+        return taken_from_lots
+
+    def release(self, taken_from_lots: Sequence[LotAllocations] = ()) -> None:
+        """Give back the ingredients of a dispensed drink, e.g. when its brew was cancelled
+
+        Args:
+            taken_from_lots (Sequence[LotAllocations]): Quantity taken from every lot by ingredient line,
+                as the dispense returned it
+        """
+        for index, ingredient_line in enumerate(self.ingredients):
+            ingredient_line.release(taken_from_lots[index] if index < len(taken_from_lots) else ())
+
+    def get_quantities(self) -> Dict[str, int]:
+        """Get the quantity of every ingredient used in the drink
+
+        Returns:
+            Dict[str, int]: Quantity by ingredient name
+        """
+        quantities: Dict[str, int] = {}
         for ingredient_line in self.ingredients:
-            ingredient_line.dispense()
+            name = ingredient_line.ingredient.name
+            quantities[name] = quantities.get(name, 0) + ingredient_line.ingredient_quantity
+        return quantities
 
     def get_cost(self) -> float:
         """Campute cost for every ingredient used in the drink
@@ -128,10 +421,180 @@ class Drink:
         """
         return sum(ingredient_line.get_cost() for ingredient_line in self.ingredients)
 
+
+@dataclass
+class Drink(Recipe):
+    """Represents a drink with their ingredients"""
+    name: str
+    ingredients: List[DrinkIngredient]
+    machine_id: str = DEFAULT_MACHINE_ID
+
     def __hash__(self):
         return hash(self.name)
 
 
+@dataclass(frozen=True)
+class Customization:
+    """Change of a recipe, e.g. an extra shot, as quantity deltas by ingredient name.
+    Quantities never go below zero, a delta as large as the recipe quantity removes the ingredient.
+    """
+    name: str
+    deltas: Tuple[Tuple[str, int], ...]
+
+
+def parse_customizations(spec: str) -> Tuple[Customization, ...]:
+    """Parse customizations written as ``name:Ingredient=delta,Ingredient=delta`` separated by semicolons,
+    e.g. ``extra shot:Espresso=1;no sugar:Sugar=-1``
+
+    Args:
+        spec (str): Customizations, empty for none
+
+    Raises:
+        ValueError: A customization has no name, no deltas or a delta that isn't an integer
+
+    Returns:
+        Tuple[Customization, ...]: Customizations, in the order they are written
+    """
+    customizations = []
+    for entry in filter(None, (entry.strip() for entry in spec.split(";"))):
+        name, separator, deltas_spec = (part.strip() for part in entry.partition(":"))
+        if not name or not separator or not deltas_spec:
+            raise ValueError(f"Customization {entry!r} must be written as name:Ingredient=delta")
+        deltas = []
+        for delta_spec in deltas_spec.split(","):
+            ingredient_name, separator, delta = (part.strip() for part in delta_spec.partition("="))
+            if not ingredient_name or not separator:
+                raise ValueError(f"Delta {delta_spec.strip()!r} of customization {name} must be Ingredient=delta")
+            deltas.append((ingredient_name, int(delta)))
+        customizations.append(Customization(name, tuple(deltas)))
+    return tuple(customizations)
+
+
+# Shared by the customized drinks that add no ingredients
+EMPTY_INVENTORY: Mapping[str, Ingredient] = MappingProxyType({})
+
+
+@dataclass(frozen=True, eq=False)
+class CustomizedDrink(Recipe):
+    """A drink with customizations, layered over the base drink without copying its recipe.
+
+    Only references to the base drink and to the shared customizations are kept, the ingredient lines
+    are computed the first time they are used, and kept for the next stock checks and the dispense.
+    """
+    base: Drink
+    customizations: Tuple[Customization, ...]
+    # Ingredients added by the customizations that the base drink doesn't use, by name
+    inventory: Mapping[str, Ingredient] = field(default_factory=lambda: EMPTY_INVENTORY, repr=False)
+
+    @property
+    def name(self) -> str:
+        names = [self.base.name, *(customization.name for customization in self.customizations)]
+        return CUSTOMIZATION_SEPARATOR.join(names)
+
+    @property
+    def machine_id(self) -> str:
+        return self.base.machine_id
+
+    @cached_property
+    def ingredients(self) -> Tuple[DrinkIngredient, ...]:
+        """Get the ingredient lines of the base drink with the customization deltas
+
+        Raises:
+            exceptions.InvalidCustomization: A customization adds an ingredient that isn't in the inventory
+
+        Returns:
+            Tuple[DrinkIngredient, ...]: Ingredient lines, in the base recipe order and then the added ingredients
+        """
+        quantities: Dict[str, List[Any]] = {}
+        for ingredient_line in self.base.ingredients:
+            line = quantities.setdefault(ingredient_line.ingredient.name, [ingredient_line.ingredient, 0])
+            line[1] += ingredient_line.ingredient_quantity
+        for customization in self.customizations:
+            for ingredient_name, delta in customization.deltas:
+                line = quantities.get(ingredient_name)
+                if line is None:
+                    if ingredient_name not in self.inventory:
+                        raise exceptions.InvalidCustomization(
+                            f"Customization {customization.name} uses {ingredient_name}, which is not available"
+                        )
+                    line = quantities[ingredient_name] = [self.inventory[ingredient_name], 0]
+                line[1] = max(0, line[1] + delta)
+        return tuple(DrinkIngredient(ingredient, quantity) for ingredient, quantity in quantities.values() if quantity)
+
+    def __eq__(self, other):
+        return isinstance(other, CustomizedDrink) and self.name == other.name
+
+    def __hash__(self):
+        return hash(self.name)
+
+
+@dataclass
+class Reservation:
+    """Ingredients held for a drink, until its brew is confirmed or released.
+    The held quantities stay in the stock, they are only unavailable to other drinks.
+    """
+    ticket: str
+    drink: Drink
+    expires_at: Optional[float] = None
+    # Held quantity by ingredient name
+    quantities: Mapping[str, int] = field(default_factory=lambda: NO_HOLDS)
+
+    def is_expired(self, now: float) -> bool:
+        """Check if the hold is over
+
+        Args:
+            now (float): Current time, in the clock of the expiration
+
+        Returns:
+            bool: Is expired
+        """
+        return self.expires_at is not None and self.expires_at <= now
+
+
+@dataclass
+class DispenseRecord:
+    """A dispensed drink, as recorded in the ledger"""
+    drink_name: str
+    price: float
+    dispensed_at: datetime
+    machine_id: str
+    request_id: Optional[str] = None
+
+    @classmethod
+    def for_drink(cls, drink: Drink, machine_id: str, request_id: Optional[str] = None) -> "DispenseRecord":
+        """Record a drink dispensed right now
+
+        Args:
+            drink (Drink): Dispensed drink
+            machine_id (str): Machine that dispensed the drink
+            request_id (Optional[str]): Id of the dispense request, to recognize its retries
+
+        Returns:
+            DispenseRecord: The ledger record
+        """
+        return cls(drink.name, round(drink.get_cost(), 2), utcnow(), machine_id, request_id)
+
+
+@dataclass(frozen=True)
+class SalesRollup:
+    """Sales of a drink in a machine, aggregated by period"""
+    period: str
+    period_start: datetime
+    machine_id: str
+    drink_name: str
+    quantity: int
+    revenue: float
+
+
+@dataclass(frozen=True)
+class Page:
+    """A slice of a listing sorted by name. The cursor is the position to continue after, None on the last page:
+    the name of the last item, with its reference in a menu, where names can repeat.
+    """
+    items: Tuple[Any, ...]
+    next_cursor: Optional[Any] = None
+
+
 @dataclass
 class Menu:
     """Represents the menu, it will assing a drink reference for the available drinks"""
@@ -0,0 +1,206 @@
+import argparse
+import contextlib
+import csv
+import gzip
+import json
+import sys
+from datetime import datetime
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    TextIO,
+    Tuple,
+)
+
+from barista_matic.adapters.repository import (
+    AbstractRepository,
+    SQLAlchemyRepository,
+)
+from barista_matic.run import get_session_factory
+
+from barista_matic import settings
+
+# Columns of every exported table, in the order of the repository stream rows
+EXPORT_COLUMNS: Dict[str, Tuple[str, ...]] = {
+    "inventory": ("name", "available_quantity", "unit_cost", "machine_id"),
+    "recipes": ("drink_name", "ingredient_name", "ingredient_quantity", "machine_id"),
+    "ledger": ("drink_name", "price", "dispensed_at", "machine_id", "request_id"),
+}
+
+
+def stream_table(
+    repository: AbstractRepository,
+    table: str,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    batch_size: int = settings.EXPORT_BATCH_SIZE,
+) -> Iterator[Tuple]:
+    """Stream the rows of an exported table
+
+    Args:
+        repository (AbstractRepository): Repository to read
+        table (str): One of EXPORT_COLUMNS
+        since (Optional[datetime]): First moment of the ledger to export
+        until (Optional[datetime]): Moment the ledger export stops at, excluded
+        batch_size (int): Rows read at once
+
+    Returns:
+        Iterator[Tuple]: Rows, with the EXPORT_COLUMNS of the table
+    """
+    if table == "inventory":
+        return repository.stream_inventory(batch_size)
+    if table == "recipes":
+        return repository.stream_recipes(batch_size)
+    if table == "ledger":
+        return repository.stream_ledger(since, until, batch_size)
+    raise ValueError(f"Unknown table {table}, expected one of {', '.join(EXPORT_COLUMNS)}")
+
+
+def write_csv(rows: Iterable[Tuple], columns: Sequence[str], output: TextIO) -> int:
+    """Write rows as CSV with a header, one by one
+
+    Args:
+        rows (Iterable[Tuple]): Rows to write
+        columns (Sequence[str]): Column names, for the header
+        output (TextIO): Text file, opened with newline=""
+
+    Returns:
+        int: Written rows
+    """
+    writer = csv.writer(output)
+    writer.writerow(columns)
+    written = 0
+    for row in rows:
+        writer.writerow([_to_text(value) for value in row])
+        written += 1
+    return written
+
+
+def write_jsonl(rows: Iterable[Tuple], columns: Sequence[str], output: TextIO) -> int:
+    """Write rows as JSON Lines, an object by row, one by one
+
+    Args:
+        rows (Iterable[Tuple]): Rows to write
+        columns (Sequence[str]): Column names, the keys of the objects
+        output (TextIO): Text file
+
+    Returns:
+        int: Written rows
+    """
+    written = 0
+    for row in rows:
+        output.write(json.dumps(dict(zip(columns, row)), default=_to_text, separators=(",", ":")))
+        output.write("\n")
+        written += 1
+    return written
+
+
+WRITERS: Dict[str, Callable[[Iterable[Tuple], Sequence[str], TextIO], int]] = {
+    "csv": write_csv,
+    "jsonl": write_jsonl,
+}
+
+
+def get_format(path: str, output_format: Optional[str] = None) -> str:
+    """Get the output format, the given one or else from the file extension, without the .gz suffix
+
+    Args:
+        path (str): Output file, - for the standard output
+        output_format (Optional[str]): One of WRITERS, None to use the extension
+
+    Returns:
+        str: Output format, csv by default
+    """
+    if output_format is not None:
+        return output_format
+    extension = path.removesuffix(".gz").rpartition(".")[2]
+    return extension if extension in WRITERS else "csv"
+
+
+@contextlib.contextmanager
+def open_output(path: str) -> Iterator[TextIO]:
+    """Open an output text file, gzip compressed if it ends in .gz. - is the standard output
+
+    Args:
+        path (str): Output file
+
+    Yields:
+        TextIO: The file, closed on exit except the standard output
+    """
+    if path == "-":
+        yield sys.stdout
+    elif path.endswith(".gz"):
+        with gzip.open(path, "wt", encoding="utf-8", newline="") as output:
+            yield output
+    else:
+        with open(path, "w", encoding="utf-8", newline="") as output:
+            yield output
+
+
+def export_table(
+    repository: AbstractRepository,
+    table: str,
+    path: str,
+    output_format: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    batch_size: int = settings.EXPORT_BATCH_SIZE,
+) -> int:
+    """Stream a table to a file. Rows are written as they are read, the memory doesn't grow with the table
+
+    Args:
+        repository (AbstractRepository): Repository to read
+        table (str): One of EXPORT_COLUMNS
+        path (str): Output file, .gz to compress it, - for the standard output
+        output_format (Optional[str]): One of WRITERS, None to use the file extension
+        since (Optional[datetime]): First moment of the ledger to export
+        until (Optional[datetime]): Moment the ledger export stops at, excluded
+        batch_size (int): Rows read at once
+
+    Returns:
+        int: Exported rows
+    """
+    writer = WRITERS[get_format(path, output_format)]
+    rows = stream_table(repository, table, since, until, batch_size)
+    with open_output(path) as output:
+        return writer(rows, EXPORT_COLUMNS[table], output)
+
+
+def _to_text(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def main(argv: Optional[List[str]] = None):
+    """Export a table of the database to a CSV or JSON Lines file, optionally gzip compressed"""
+    parser = argparse.ArgumentParser(description="Export the Barista-matic inventory, recipes or ledger")
+    parser.add_argument("table", choices=tuple(EXPORT_COLUMNS))
+    parser.add_argument("--output", default="-", help="Output file, .gz to compress it, - for the standard output")
+    parser.add_argument("--format", choices=tuple(WRITERS), help="Output format, from the file extension by default")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="First ledger moment, UTC")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="Ledger moment to stop at, UTC")
+    parser.add_argument("--batch-size", type=int, default=settings.EXPORT_BATCH_SIZE)
+    parser.add_argument("--all-machines", action="store_true", help="Export every machine, not only MACHINE_ID")
+    arguments = parser.parse_args(argv)
+    with get_session_factory()() as session:
+        repository = SQLAlchemyRepository(session, None if arguments.all_machines else settings.MACHINE_ID)
+        exported = export_table(
+            repository,
+            arguments.table,
+            arguments.output,
+            arguments.format,
+            arguments.since,
+            arguments.until,
+            arguments.batch_size,
+        )
+    print(f"Exported {exported} rows", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,319 @@
+import contextlib
+import json
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from http.server import (
+    BaseHTTPRequestHandler,
+    HTTPServer,
+)
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    Optional,
+    Tuple,
+)
+
+from barista_matic.adapters.orm import start_mappers
+from barista_matic.adapters.repository import AbstractRepository
+from barista_matic.domain import (
+    exceptions,
+    model,
+)
+from barista_matic.run import get_session_factory
+from barista_matic.service_layer.dedupe import DedupeCache
+from barista_matic.service_layer.services import BaristaMatic
+from barista_matic.service_layer.unit_of_work import SqlAlchemyUnitOfWork
+
+from barista_matic import settings
+
+CONTENT_TYPE = "application/json"
+
+
+class InvalidRequest(ValueError):
+    """The request body is not what the endpoint expects"""
+
+
+@dataclass(frozen=True)
+class ApiResponse:
+    status: int
+    body: Optional[Dict[str, Any]] = None
+    etag: Optional[str] = None
+
+
+def get_read_etag(repository: AbstractRepository) -> str:
+    """Get the etag of the reads from the revision of the machine, kept by the database with every stock and
+    catalog write, so the writes of other processes sharing it change it too, e.g. the cli or a price change
+
+    Args:
+        repository (AbstractRepository): Repository of the read
+
+    Returns:
+        str: Quoted etag
+    """
+    return f'"{repository.get_revision()}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Check an If-None-Match header against the current etag, weak comparison as HTTP requires for it
+
+    Args:
+        if_none_match (str): Header value, a list of etags or *
+        etag (str): Current etag
+
+    Returns:
+        bool: The client has the current version
+    """
+    candidates = (candidate.strip() for candidate in if_none_match.split(","))
+    return any(candidate == "*" or candidate.removeprefix("W/") == etag for candidate in candidates)
+
+
+class BaristaApi:
+    """JSON API of a machine: inventory, menu, dispense and restock.
+
+    Every call uses a session of its own, from the connection pool of the session factory, so reads run in
+    parallel. Sessions read the stock before changing it, so stock changes run one at a time under a write lock.
+    Reads take their etag from the machine revision, a matching If-None-Match gets a 304 after that one query.
+    """
+    def __init__(
+        self,
+        session_factory,
+        machine_id: str = settings.MACHINE_ID,
+        customizations: Iterable[model.Customization] = (),
+    ):
+        self.session_factory = session_factory
+        self.machine_id = machine_id
+        self.customizations = tuple(customizations)
+        # Shared by the calls, retries of a request are found without querying the ledger
+        self.dispense_requests: DedupeCache[model.Recipe] = DedupeCache()
+        self.write_lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def barista_service(self) -> Iterator[BaristaMatic]:
+        """Service over a new session, closed on exit"""
+        unit_of_work = SqlAlchemyUnitOfWork(self.session_factory, machine_id=self.machine_id)
+        try:
+            yield BaristaMatic(
+                unit_of_work.repository,
+                machine_id=self.machine_id,
+                unit_of_work=unit_of_work,
+                dispense_requests=self.dispense_requests,
+                customizations=self.customizations,
+            )
+        finally:
+            unit_of_work.close()
+
+    def get_inventory(self, if_none_match: Optional[str] = None) -> ApiResponse:
+        return self._read(_render_inventory, if_none_match)
+
+    def get_menu(self, if_none_match: Optional[str] = None) -> ApiResponse:
+        return self._read(_render_menu, if_none_match)
+
+    def dispense(self, payload: Dict[str, Any]) -> ApiResponse:
+        """Dispense a drink by menu reference. Retries of a request id return the drink without dispensing again
+
+        Args:
+            payload (Dict[str, Any]): reference, and optionally request_id and customizations
+
+        Raises:
+            InvalidRequest: A field is missing or has the wrong type
+
+        Returns:
+            ApiResponse: dispensed, 404 for an invalid reference, 409 when out of stock
+        """
+        reference = _get_field(payload, "reference", str)
+        request_id = _get_field(payload, "request_id", str, required=False)
+        customizations = _get_field(payload, "customizations", list, required=False) or []
+        if not all(isinstance(name, str) for name in customizations):
+            raise InvalidRequest("Field customizations must be a list of names")
+        try:
+            with self.write_lock, self.barista_service() as barista_service:
+                drink = barista_service.dispense_drink_by_menu_reference(reference, request_id, customizations)
+                return ApiResponse(200, {"result": "dispensed", "drink": drink.name})
+        except exceptions.OutOfStock as error:
+            return ApiResponse(409, {"result": "out_of_stock", "drink": error.drink.name})
+        except (exceptions.InvalidSelectedDrink, exceptions.DrinkNotExist):
+            return ApiResponse(404, {"result": "invalid", "reference": reference})
+        except exceptions.InvalidCustomization as error:
+            return ApiResponse(400, {"result": "invalid_customization", "error": str(error)})
+
+    def restock(self, payload: Dict[str, Any]) -> ApiResponse:
+        """Restock every ingredient to a quantity
+
+        Args:
+            payload (Dict[str, Any]): Optionally the quantity, the machine restock quantity by default
+
+        Raises:
+            InvalidRequest: The quantity is not a non-negative integer
+
+        Returns:
+            ApiResponse: restocked
+        """
+        quantity = _get_field(payload, "quantity", int, required=False)
+        if quantity is None:
+            quantity = settings.RESTOCK_QUANTITY
+        if isinstance(quantity, bool) or quantity < 0:
+            raise InvalidRequest("Field quantity must be a non-negative integer")
+        with self.write_lock, self.barista_service() as barista_service:
+            barista_service.restock_all_ingredients_to_quantity(quantity)
+        return ApiResponse(200, {"result": "restocked", "quantity": quantity})
+
+    def _read(self, render, if_none_match: Optional[str]) -> ApiResponse:
+        # The etag is read first, in the session of the body: a change between them makes the etag older
+        # than the body, never newer. A matching etag costs that one query
+        with self.barista_service() as barista_service:
+            etag = get_read_etag(barista_service.repository)
+            if if_none_match is not None and etag_matches(if_none_match, etag):
+                return ApiResponse(304, etag=etag)
+            return ApiResponse(200, render(barista_service), etag)
+
+
+def _render_inventory(barista_service: BaristaMatic) -> Dict[str, Any]:
+    return {
+        "inventory": [
+            {"name": ingredient.name, "available_quantity": ingredient.get_available_quantity()}
+            for ingredient in barista_service.get_inventory()
+        ]
+    }
+
+
+def _render_menu(barista_service: BaristaMatic) -> Dict[str, Any]:
+    return {
+        "menu": [
+            {
+                "reference": reference,
+                "name": drink.name,
+                "cost": round(drink.get_cost(), 2),
+                "in_stock": drink.can_be_dispensed(),
+            }
+            for reference, drink in barista_service.get_menu()
+        ]
+    }
+
+
+def _get_field(payload: Dict[str, Any], name: str, field_type: type, required: bool = True) -> Any:
+    value = payload.get(name)
+    if value is None:
+        if required:
+            raise InvalidRequest(f"Field {name} is required")
+        return None
+    if not isinstance(value, field_type):
+        raise InvalidRequest(f"Field {name} must be a {field_type.__name__}")
+    return value
+
+
+class ApiServer(HTTPServer):
+    """HTTP server of the JSON API, with a bounded pool of workers.
+
+    While every worker is busy, the accept loop waits for one, new connections queue in the listen backlog
+    instead of spawning threads. The connection pool should have a connection by worker.
+    """
+    def __init__(self, api: BaristaApi, address: Tuple[str, int], workers: int = settings.API_WORKERS):
+        super().__init__(address, ApiRequestHandler)
+        self.api = api
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="api-worker")
+        self._free_workers = threading.BoundedSemaphore(workers)
+        self._thread = threading.Thread(target=self.serve_forever, name="api-server", daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def process_request(self, request, client_address):
+        self._free_workers.acquire()
+        self._executor.submit(self._process_request, request, client_address)
+
+    def start(self) -> "ApiServer":
+        """Serve in a background thread"""
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
+
+    def server_close(self):
+        super().server_close()
+        self._executor.shutdown(wait=True)
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._free_workers.release()
+
+
+class ApiRequestHandler(BaseHTTPRequestHandler):
+    server: ApiServer
+
+    def do_GET(self):
+        readers = {"/inventory": self.server.api.get_inventory, "/menu": self.server.api.get_menu}
+        reader = readers.get(self.path.split("?", 1)[0])
+        if reader is None:
+            self.send_api_response(ApiResponse(404, {"error": "Not found"}))
+            return
+        self.send_api_response(reader(self.headers.get("If-None-Match")))
+
+    def do_POST(self):
+        writers = {"/dispense": self.server.api.dispense, "/restock": self.server.api.restock}
+        writer = writers.get(self.path.split("?", 1)[0])
+        if writer is None:
+            self.send_api_response(ApiResponse(404, {"error": "Not found"}))
+            return
+        try:
+            self.send_api_response(writer(self.read_json()))
+        except InvalidRequest as error:
+            self.send_api_response(ApiResponse(400, {"error": str(error)}))
+
+    def read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        if length == 0:
+            return {}
+        try:
+            payload = json.loads(self.rfile.read(length))
+        except ValueError as error:
+            raise InvalidRequest(f"Invalid JSON: {error}") from error
+        if not isinstance(payload, dict):
+            raise InvalidRequest("The body must be a JSON object")
+        return payload
+
+    def send_api_response(self, response: ApiResponse):
+        body = b"" if response.body is None else json.dumps(response.body, separators=(",", ":")).encode("utf-8")
+        self.send_response(response.status)
+        if response.etag is not None:
+            self.send_header("ETag", response.etag)
+            # Clients keep the body, but revalidate it on every poll
+            self.send_header("Cache-Control", "no-cache")
+        if response.status != 304:
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main():
+    """Serve the JSON API until interrupted"""
+    start_mappers()
+    # A connection by worker, requests never wait for a connection
+    session_factory = get_session_factory(pool_size=settings.API_WORKERS)
+    barista_api = BaristaApi(session_factory, customizations=model.parse_customizations(settings.CUSTOMIZATIONS))
+    server = ApiServer(barista_api, (settings.API_HOST, settings.API_PORT))
+    print(f"Serving the Barista-matic API at {server.url}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
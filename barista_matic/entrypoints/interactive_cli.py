@@ -1,10 +1,17 @@
 import contextlib
+import time
 from abc import (
     ABC,
     abstractmethod,
 )
 from collections import defaultdict
+from dataclasses import dataclass
+from typing import (
+    Dict,
+    Optional,
+)
 
+from barista_matic.adapters.catalog_snapshot import CatalogSnapshot
 from barista_matic.domain import exceptions
 from barista_matic import settings
 
@@ -13,6 +20,21 @@ class UserExited(Exception):
     pass
 
 
+def format_inventory_line(name: str, quantity: int) -> str:
+    return f"{name},{quantity}"
+
+
+def format_menu_line(reference: str, name: str, cost: float, in_stock: bool) -> str:
+    return f"{reference},{name},${cost:.2f},{str(in_stock).lower()}"
+
+
+@dataclass(frozen=True)
+class CommandResult:
+    """Outcome of a user command, e.g. dispensed, and what it applies to"""
+    result: str
+    subject: Optional[str] = None
+
+
 class Command(ABC):
     """Command to be executed"""
     @abstractmethod
@@ -20,37 +42,71 @@ class Command(ABC):
         pass
 
 
-class ReStock(Command):
+class UserCommand(Command):
+    """Command selected by the user input. Its result is printed as text by dispatch"""
+    @abstractmethod
+    def execute(self, barista_service, user_input) -> CommandResult:
+        pass
+
+    @abstractmethod
+    def format_result(self, result: CommandResult) -> str:
+        pass
+
+    def dispatch(self, barista_service, user_input) -> CommandResult:
+        result = self.execute(barista_service, user_input)
+        print(self.format_result(result))
+        return result
+
+
+class ReStock(UserCommand):
     COMMAND_MSG = "Inventory re-stocked"
     TO_QUANTITY = settings.RESTOCK_QUANTITY
 
-    def dispatch(self, barista_service, *args):
+    def execute(self, barista_service, *args) -> CommandResult:
         barista_service.restock_all_ingredients_to_quantity(self.TO_QUANTITY)
-        print(self.COMMAND_MSG)
+        return CommandResult("restocked")
+
+    def format_result(self, result: CommandResult) -> str:
+        return self.COMMAND_MSG
 
 
-class ExitCli(Command):
-    def dispatch(self, *args):
+class ExitCli(UserCommand):
+    def execute(self, *args) -> CommandResult:
         raise UserExited()
 
+    def format_result(self, result: CommandResult) -> str:
+        return ""
 
-class InvalidCommand(Command):
+
+class InvalidCommand(UserCommand):
     COMMAND_MSG = "Invalid selection:"
 
-    def dispatch(self, _, user_input):
-        print(f"{self.COMMAND_MSG} {user_input}")
+    def execute(self, _, user_input) -> CommandResult:
+        return CommandResult("invalid", user_input)
+
+    def format_result(self, result: CommandResult) -> str:
+        return f"{self.COMMAND_MSG} {result.subject}"
 
 
-class Dispense(Command):
+class Dispense(UserCommand):
     COMMAND_MSG = "Dispensing:"
     COMMAND_ERROR = "Out of stock:"
 
-    def dispatch(self, barista_service, user_input):
+    def execute(self, barista_service, user_input) -> CommandResult:
         try:
             dispensed_drink = barista_service.dispense_drink_by_menu_reference(user_input)
-            print(f"{self.COMMAND_MSG} {dispensed_drink.name}")
+            return CommandResult("dispensed", dispensed_drink.name)
         except exceptions.OutOfStock as err:
-            print(f"{self.COMMAND_ERROR} {err.drink.name}")
+            return CommandResult("out_of_stock", err.drink.name)
+        except exceptions.InvalidSelectedDrink:
+            return InvalidCommand().execute(barista_service, user_input)
+
+    def format_result(self, result: CommandResult) -> str:
+        if result.result == "out_of_stock":
+            return f"{self.COMMAND_ERROR} {result.subject}"
+        if result.result == "invalid":
+            return InvalidCommand().format_result(result)
+        return f"{self.COMMAND_MSG} {result.subject}"
 
 
 class PrintInventory(Command):
@@ -59,7 +115,11 @@ class PrintInventory(Command):
     def dispatch(self, barista_service, *args):
         print(self.COMMAND_MDG)
         for item in barista_service.get_inventory():
-            print(f"{item.name},{item.get_available_quantity()}")
+            print(self.format_line(item))
+
+    @staticmethod
+    def format_line(item) -> str:
+        return format_inventory_line(item.name, item.get_available_quantity())
 
 
 class PrintMenu(Command):
@@ -68,7 +128,11 @@ class PrintMenu(Command):
     def dispatch(self, barista_service, *args):
         print(self.COMMAND_MSG)
         for reference, drink in barista_service.get_menu():
-            print(f"{reference},{drink.name},${drink.get_cost():.2f},{str(drink.can_be_dispensed()).lower()}")
+            print(self.format_line(reference, drink))
+
+    @staticmethod
+    def format_line(reference, drink) -> str:
+        return format_menu_line(reference, drink.name, drink.get_cost(), drink.can_be_dispensed())
 
 
 command_mapping = defaultdict(
@@ -86,8 +150,10 @@ class InteractiveCli:
 
     def __init__(self, barista_service):
         self.barista_service = barista_service
+        # Swaps in a reloaded catalog before every frame, so commands refer to the catalog they were shown
+        self.catalog_reloader = None
 
-    def get_command_for_user_input(self, user_input, menu) -> Command:
+    def get_command_for_user_input(self, user_input, menu) -> UserCommand:
         if menu.has_reference(user_input):
             return command_mapping["DISPENSE"]
         return command_mapping[user_input]
@@ -98,6 +164,47 @@ class InteractiveCli:
     def print_menu(self):
         PrintMenu().dispatch(self.barista_service)
 
+    def render_frame(self):
+        """Print the inventory and the menu, shown at startup and after every command"""
+        self.print_inventory()
+        self.print_menu()
+
+    def catalog_swapped(self):
+        """Called when a reloaded catalog was swapped in, before the next frame"""
+        pass
+
+    def close(self):
+        """Release what the cli holds besides the service, once it exited"""
+        pass
+
+    def render_snapshot_frame(self, snapshot: CatalogSnapshot, stock: Dict[str, int]):
+        """Print the first frame from a catalog snapshot and the stock, the catalog is loaded by the first command
+
+        Args:
+            snapshot (CatalogSnapshot): Snapshot of the current catalog
+            stock (Dict[str, int]): Available quantity by ingredient name
+        """
+        print(PrintInventory.COMMAND_MDG)
+        for name in sorted(stock):
+            print(format_inventory_line(name, stock[name]))
+        print(PrintMenu.COMMAND_MSG)
+        for menu_line in snapshot.get_menu_lines(stock):
+            print(format_menu_line(*menu_line))
+
+    def get_command(self, user_input: str) -> UserCommand:
+        return self.get_command_for_user_input(user_input, self.barista_service.get_menu())
+
+    def run_command(self, command: UserCommand, user_input: str):
+        """Run the command, timed for the service metrics"""
+        started_at = time.perf_counter()
+        result = self.dispatch_command(command, user_input)
+        metrics = self.barista_service.metrics
+        if metrics is not None:
+            metrics.record_command(type(command).__name__, time.perf_counter() - started_at, result and result.result)
+
+    def dispatch_command(self, command: UserCommand, user_input: str) -> Optional[CommandResult]:
+        return command.dispatch(self.barista_service, user_input)
+
     def get_valid_user_input(self) -> str:
         """Get user input, ignore if it's empty.
 
@@ -109,17 +216,21 @@ class InteractiveCli:
             user_input = input("").strip().lower()
         return user_input
 
-    def execute(self):
+    def execute(self, render_first_frame: bool = True):
         """Run the interactive cli.
         Prints inventory and menu, wait for user input and run it, until user exited.
+
+        Args:
+            render_first_frame (bool): Print the first frame, False when it was already printed from a snapshot
         """
+        render_frame = render_first_frame
         with contextlib.suppress(UserExited):  # On UserExited, loop will break
             while True:
-                self.print_inventory()
-                self.print_menu()
+                if self.catalog_reloader is not None and self.catalog_reloader.swap():
+                    self.catalog_swapped()
+                if render_frame:
+                    self.render_frame()
+                render_frame = True
                 user_input = self.get_valid_user_input()
-                command = self.get_command_for_user_input(
-                    user_input,
-                    self.barista_service.get_menu()
-                )
-                command.dispatch(self.barista_service, user_input)
+                command = self.get_command(user_input)
+                self.run_command(command, user_input)
@@ -0,0 +1,203 @@
+import argparse
+import os
+import sys
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import (
+    List,
+    Optional,
+)
+
+from barista_matic.adapters.repository import (
+    AbstractRepository,
+    SQLAlchemyRepository,
+)
+from barista_matic.domain import model
+from barista_matic.entrypoints.export import (
+    EXPORT_COLUMNS,
+    open_output,
+    write_jsonl,
+)
+from barista_matic.run import get_session_factory
+
+from barista_matic import settings
+
+
+@dataclass(frozen=True)
+class ArchivedMonth:
+    """A month of ledger moved from the database to its archive"""
+    month_start: datetime
+    path: Path
+    # Records written to the archive, None if it was written by a previous run
+    archived: Optional[int]
+    deleted: int
+
+
+def get_month_start(moment: datetime) -> datetime:
+    """Get the start of the month that contains the moment
+
+    Args:
+        moment (datetime): A moment
+
+    Returns:
+        datetime: Month start
+    """
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month_start: datetime, months: int) -> datetime:
+    """Move a month start by a number of months
+
+    Args:
+        month_start (datetime): Month start
+        months (int): Months to add, negative to go back
+
+    Returns:
+        datetime: Month start
+    """
+    month_index = month_start.year * 12 + month_start.month - 1 + months
+    return month_start.replace(year=month_index // 12, month=month_index % 12 + 1)
+
+
+def get_retention_cutoff(now: datetime, retention_months: int) -> datetime:
+    """Get the moment the kept ledger starts at: the current month and the previous retention months are kept
+
+    Args:
+        now (datetime): Current time
+        retention_months (int): Full months kept besides the current one
+
+    Returns:
+        datetime: Start of the oldest kept month
+    """
+    return add_months(get_month_start(now), -retention_months)
+
+
+def get_archive_path(archive_dir: Path, month_start: datetime, machine_id: Optional[str] = None) -> Path:
+    """Get the archive file of a month of ledger
+
+    Args:
+        archive_dir (Path): Archives directory
+        month_start (datetime): Month start
+        machine_id (Optional[str]): Machine of the ledger, None for every machine
+
+    Returns:
+        Path: Gzip compressed JSON Lines file
+    """
+    return archive_dir / f"ledger-{machine_id or 'all'}-{month_start:%Y-%m}.jsonl.gz"
+
+
+def archive_month(
+    repository: AbstractRepository,
+    month_start: datetime,
+    path: Path,
+    batch_size: int = settings.EXPORT_BATCH_SIZE,
+) -> int:
+    """Write a month of ledger to its archive, as the JSON Lines export of the ledger.
+    The archive is written to a hidden file and renamed once complete, an archive is never partial.
+
+    Args:
+        repository (AbstractRepository): Repository of the ledger
+        month_start (datetime): Month start
+        path (Path): Archive file, it must end with .gz
+        batch_size (int): Records read at once
+
+    Returns:
+        int: Archived records
+    """
+    partial_path = path.with_name(f".{path.name}")
+    rows = repository.stream_ledger(month_start, add_months(month_start, 1), batch_size)
+    with open_output(str(partial_path)) as output:
+        archived = write_jsonl(rows, EXPORT_COLUMNS["ledger"], output)
+    os.replace(partial_path, path)
+    return archived
+
+
+def compact_ledger(
+    repository: AbstractRepository,
+    archive_dir: Path,
+    cutoff: datetime,
+    machine_id: Optional[str] = None,
+    batch_size: int = settings.EXPORT_BATCH_SIZE,
+) -> List[ArchivedMonth]:
+    """Move the ledger months before the cutoff to their archives, oldest first, then delete them from the database.
+
+    Only the months with records are archived. A month is deleted once its archive is complete, a month whose
+    archive already exists was archived by an interrupted run and is only deleted. The sales rollups are kept,
+    the sales reports of the archived months don't change.
+
+    Args:
+        repository (AbstractRepository): Repository of the ledger
+        archive_dir (Path): Archives directory, created if missing
+        cutoff (datetime): Start of the oldest kept month
+        machine_id (Optional[str]): Machine of the repository, None if it reads every machine
+        batch_size (int): Records read and deleted at once
+
+    Returns:
+        List[ArchivedMonth]: Archived months
+    """
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    archived_months = []
+    oldest = repository.get_oldest_dispense_time()
+    while oldest is not None and oldest < cutoff:
+        month_start = get_month_start(oldest)
+        path = get_archive_path(archive_dir, month_start, machine_id)
+        archived = None if path.exists() else archive_month(repository, month_start, path, batch_size)
+        deleted = repository.delete_ledger(add_months(month_start, 1), batch_size)
+        archived_months.append(ArchivedMonth(month_start, path, archived, deleted))
+        oldest = repository.get_oldest_dispense_time()
+    return archived_months
+
+
+def apply_retention_policy(
+    session_factory,
+    retention_months: int = settings.LEDGER_RETENTION_MONTHS,
+    archive_dir: str = settings.LEDGER_ARCHIVE_DIR,
+    machine_id: Optional[str] = settings.MACHINE_ID,
+) -> List[ArchivedMonth]:
+    """Archive the ledger months older than the retention, from a session of its own
+
+    Args:
+        session_factory: Session factory of the database
+        retention_months (int): Full months kept besides the current one, 0 keeps every month
+        archive_dir (str): Archives directory
+        machine_id (Optional[str]): Machine of the ledger, None for every machine
+
+    Returns:
+        List[ArchivedMonth]: Archived months
+    """
+    if retention_months <= 0:
+        return []
+    cutoff = get_retention_cutoff(model.utcnow(), retention_months)
+    with session_factory() as session:
+        return compact_ledger(SQLAlchemyRepository(session, machine_id), Path(archive_dir), cutoff, machine_id)
+
+
+def main(argv: Optional[List[str]] = None):
+    """Archive the old months of the ledger to gzip compressed JSON Lines files and delete them from the database.
+    Meant to run on a schedule, e.g. daily from cron
+    """
+    parser = argparse.ArgumentParser(description="Apply the Barista-matic ledger retention policy")
+    parser.add_argument(
+        "--retention-months",
+        type=int,
+        default=settings.LEDGER_RETENTION_MONTHS,
+        help="Full months kept besides the current one",
+    )
+    parser.add_argument("--archive-dir", default=settings.LEDGER_ARCHIVE_DIR)
+    parser.add_argument("--all-machines", action="store_true", help="Archive every machine, not only MACHINE_ID")
+    arguments = parser.parse_args(argv)
+    if arguments.retention_months <= 0:
+        parser.error("--retention-months must be positive, or set LEDGER_RETENTION_MONTHS")
+    archived_months = apply_retention_policy(
+        get_session_factory(),
+        arguments.retention_months,
+        arguments.archive_dir,
+        None if arguments.all_machines else settings.MACHINE_ID,
+    )
+    for archived_month in archived_months:
+        print(f"{archived_month.month_start:%Y-%m}: {archived_month.deleted} records -> {archived_month.path}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,234 @@
+import argparse
+import contextlib
+import gc
+import os
+import sys
+import tracemalloc
+from dataclasses import (
+    asdict,
+    dataclass,
+)
+from typing import (
+    Callable,
+    Iterable,
+    List,
+    Optional,
+)
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from barista_matic.adapters import orm
+from barista_matic.adapters.repository import FakeRepository
+from barista_matic.entrypoints.interactive_cli import (
+    InteractiveCli,
+    UserExited,
+)
+from barista_matic.entrypoints.workload import (
+    WorkloadConfig,
+    generate_catalog,
+    generate_commands,
+)
+from barista_matic.service_layer.services import BaristaMatic
+from barista_matic.service_layer.unit_of_work import SqlAlchemyUnitOfWork
+
+# Builds a service over a generated catalog, from the number of drinks and of ingredients
+ServiceBuilder = Callable[[int, int], BaristaMatic]
+
+
+class MemoryBudgetExceeded(AssertionError):
+    """A memory measure is over its budget"""
+    def __init__(self, exceeded: List[str]):
+        super().__init__(f"Memory budget exceeded: {', '.join(exceeded)}")
+        self.exceeded = exceeded
+
+
+@dataclass(frozen=True)
+class MemoryReport:
+    """Memory used by the service, measured with tracemalloc.
+
+    Per drink and per ingredient bytes are marginal costs, from the difference between two catalog sizes,
+    so the fixed costs (engine, mappers, empty collections) are left out. The menu render peak is measured
+    once the catalog is loaded by the first frame, and the session growth after running a workload.
+    """
+    catalog_size: int
+    ingredient_count: int
+    bytes_per_drink: float
+    bytes_per_ingredient: float
+    menu_render_peak_bytes: int
+    session_commands: int
+    session_growth_bytes: int
+
+
+@dataclass(frozen=True)
+class MemoryBudget:
+    """Upper limits of a memory report, per unit so they hold for any catalog size"""
+    bytes_per_drink: float = 8192
+    bytes_per_ingredient: float = 2048
+    menu_render_peak_bytes_per_drink: float = 1024
+    session_growth_bytes_per_command: float = 256
+
+    def check(self, report: MemoryReport) -> None:
+        """Check the report is within the budget
+
+        Args:
+            report (MemoryReport): Measured report
+
+        Raises:
+            MemoryBudgetExceeded: Some measures are over the budget
+        """
+        measures = (
+            ("bytes_per_drink", report.bytes_per_drink, self.bytes_per_drink),
+            ("bytes_per_ingredient", report.bytes_per_ingredient, self.bytes_per_ingredient),
+            (
+                "menu_render_peak_bytes_per_drink",
+                report.menu_render_peak_bytes / max(report.catalog_size, 1),
+                self.menu_render_peak_bytes_per_drink,
+            ),
+            (
+                "session_growth_bytes_per_command",
+                report.session_growth_bytes / max(report.session_commands, 1),
+                self.session_growth_bytes_per_command,
+            ),
+        )
+        exceeded = [f"{name} {value:.0f} > {limit:.0f}" for name, value, limit in measures if value > limit]
+        if exceeded:
+            raise MemoryBudgetExceeded(exceeded)
+
+
+def build_fake_service(catalog_size: int, ingredient_count: int) -> BaristaMatic:
+    repository = FakeRepository()
+    for drink in generate_catalog(catalog_size, ingredient_count=ingredient_count):
+        repository.add_drink(drink)
+    return BaristaMatic(repository)
+
+
+def build_sqlite_service(catalog_size: int, ingredient_count: int) -> BaristaMatic:
+    """Build a service over an in-memory database, as run by the cli. The mappers must be started"""
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    orm.metadata.create_all(engine)
+    with sessionmaker(engine)() as session:
+        session.add_all(generate_catalog(catalog_size, ingredient_count=ingredient_count))
+        session.commit()
+    unit_of_work = SqlAlchemyUnitOfWork(sessionmaker(engine))
+    return BaristaMatic(unit_of_work.repository, unit_of_work=unit_of_work)
+
+
+def measure_memory(
+    build_service: ServiceBuilder,
+    catalog_size: int = 200,
+    ingredient_count: int = 20,
+    session_commands: int = 1000,
+    seed: int = 0,
+) -> MemoryReport:
+    """Measure the memory used by the catalog, by rendering a frame and by a long session
+
+    Args:
+        build_service (ServiceBuilder): Builds the service to measure
+        catalog_size (int): Drinks of the measured catalog
+        ingredient_count (int): Ingredients of the measured catalog
+        session_commands (int): Commands of the session, from a workload of the catalog size
+        seed (int): Seed of the session workload
+
+    Returns:
+        MemoryReport: The report
+    """
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    try:
+        # Warm up: one-time allocations, like statement caches, are not part of the catalog
+        _load_catalog(build_service, catalog_size, ingredient_count)
+        catalog_bytes = _measure_catalog(build_service, catalog_size, ingredient_count)
+        double_drinks_bytes = _measure_catalog(build_service, 2 * catalog_size, ingredient_count)
+        double_ingredients_bytes = _measure_catalog(build_service, catalog_size, 2 * ingredient_count)
+        service = _load_catalog(build_service, catalog_size, ingredient_count)
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            cli = InteractiveCli(service)
+            menu_render_peak_bytes = _measure_peak(cli.render_frame)
+            # Warm up as well, so the growth is what a long session keeps adding
+            warm_up = WorkloadConfig(commands=min(session_commands, 100), catalog_size=catalog_size, seed=seed + 1)
+            _run_commands(cli, generate_commands(warm_up))
+            workload = WorkloadConfig(commands=session_commands, catalog_size=catalog_size, seed=seed)
+            session_growth_bytes = _measure_growth(lambda: _run_commands(cli, generate_commands(workload)))
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+    return MemoryReport(
+        catalog_size=catalog_size,
+        ingredient_count=ingredient_count,
+        bytes_per_drink=(double_drinks_bytes - catalog_bytes) / catalog_size,
+        bytes_per_ingredient=(double_ingredients_bytes - catalog_bytes) / ingredient_count,
+        menu_render_peak_bytes=menu_render_peak_bytes,
+        session_commands=session_commands,
+        session_growth_bytes=session_growth_bytes,
+    )
+
+
+def _load_catalog(build_service: ServiceBuilder, catalog_size: int, ingredient_count: int) -> BaristaMatic:
+    # The catalog, recipes included, is loaded by rendering the first frame
+    service = build_service(catalog_size, ingredient_count)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        InteractiveCli(service).render_frame()
+    return service
+
+
+def _measure_catalog(build_service: ServiceBuilder, catalog_size: int, ingredient_count: int) -> int:
+    gc.collect()
+    before = tracemalloc.get_traced_memory()[0]
+    service = _load_catalog(build_service, catalog_size, ingredient_count)  # noqa: F841, kept alive until measured
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0] - before
+
+
+def _measure_peak(render: Callable[[], None]) -> int:
+    gc.collect()
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    render()
+    return tracemalloc.get_traced_memory()[1] - before
+
+
+def _measure_growth(run: Callable[[], None]) -> int:
+    gc.collect()
+    before = tracemalloc.get_traced_memory()[0]
+    run()
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0] - before
+
+
+def _run_commands(cli: InteractiveCli, user_inputs: Iterable[str]) -> None:
+    with contextlib.suppress(UserExited):
+        for user_input in user_inputs:
+            cli.run_command(cli.get_command(user_input), user_input)
+            cli.render_frame()
+
+
+def main(argv: Optional[List[str]] = None):
+    """Print the memory report, and exit with an error when it's over the default budget"""
+    parser = argparse.ArgumentParser(description="Measure the Barista-matic memory usage")
+    parser.add_argument("--backend", choices=("fake", "sqlite"), default="sqlite")
+    parser.add_argument("--catalog-size", type=int, default=200)
+    parser.add_argument("--ingredient-count", type=int, default=20)
+    parser.add_argument("--session-commands", type=int, default=1000)
+    arguments = parser.parse_args(argv)
+    if arguments.backend == "sqlite":
+        orm.start_mappers()
+    report = measure_memory(
+        build_sqlite_service if arguments.backend == "sqlite" else build_fake_service,
+        arguments.catalog_size,
+        arguments.ingredient_count,
+        arguments.session_commands,
+    )
+    for name, value in asdict(report).items():
+        print(f"{name},{value:.0f}")
+    try:
+        MemoryBudget().check(report)
+    except MemoryBudgetExceeded as err:
+        print(err, file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+import threading
+from http.server import (
+    BaseHTTPRequestHandler,
+    ThreadingHTTPServer,
+)
+from typing import Tuple
+
+from barista_matic.service_layer.metrics import BaristaMetrics
+
+from barista_matic import settings
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class MetricsServer(ThreadingHTTPServer):
+    """HTTP server of the metrics in the Prometheus text format, at /metrics.
+
+    It runs in a daemon thread besides the cli. Scrapes only read the metrics, so they never query the database
+    nor wait for a command.
+    """
+    daemon_threads = True
+
+    def __init__(self, metrics: BaristaMetrics, address: Tuple[str, int]):
+        super().__init__(address, MetricsRequestHandler)
+        self.metrics = metrics
+        self._thread = threading.Thread(target=self.serve_forever, name="metrics-server", daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self) -> "MetricsServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    server: MetricsServer
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # The cli owns the terminal, scrapes are not logged
+        pass
+
+
+def start_metrics_server(
+    metrics: BaristaMetrics, host: str = settings.METRICS_HOST, port: int = settings.METRICS_PORT
+) -> MetricsServer:
+    """Serve the metrics in a background thread
+
+    Args:
+        metrics (BaristaMetrics): Metrics to serve
+        host (str): Address to listen on
+        port (int): Port to listen on, 0 for any free port
+
+    Returns:
+        MetricsServer: The running server
+    """
+    return MetricsServer(metrics, (host, port)).start()
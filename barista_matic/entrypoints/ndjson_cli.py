@@ -0,0 +1,78 @@
+import json
+from typing import (
+    Any,
+    Dict,
+    Optional,
+)
+
+from barista_matic.entrypoints.interactive_cli import (
+    CommandResult,
+    InteractiveCli,
+    UserCommand,
+)
+
+
+def diff_fields(previous: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Any]:
+    """Get the fields that changed from previous to current. Removed fields are None
+
+    Args:
+        previous (Dict[str, Any]): Previous fields
+        current (Dict[str, Any]): Current fields
+
+    Returns:
+        Dict[str, Any]: Changed fields, nested dicts only keep their changed fields
+    """
+    changes = {}
+    for key, value in current.items():
+        previous_value = previous.get(key)
+        if isinstance(value, dict) and isinstance(previous_value, dict):
+            nested_changes = diff_fields(previous_value, value)
+            if nested_changes:
+                changes[key] = nested_changes
+        elif key not in previous or previous_value != value:
+            changes[key] = value
+    for key in previous.keys() - current.keys():
+        changes[key] = None
+    return changes
+
+
+class NdjsonCli(InteractiveCli):
+    """Interactive cli for controller software. Every frame is one compact JSON line with the command result,
+    and only the inventory and menu fields that changed since the previous frame.
+    """
+    def __init__(self, barista_service):
+        super().__init__(barista_service)
+        self.last_result: Optional[CommandResult] = None
+        self.last_inventory: Dict[str, int] = {}
+        self.last_menu: Dict[str, Dict[str, Any]] = {}
+
+    def dispatch_command(self, command: UserCommand, user_input: str) -> Optional[CommandResult]:
+        self.last_result = command.execute(self.barista_service, user_input)
+        return self.last_result
+
+    def render_frame(self):
+        inventory = {
+            item.name: item.get_available_quantity()
+            for item in self.barista_service.get_inventory()
+        }
+        menu = {
+            reference: {
+                "name": drink.name,
+                "cost": round(drink.get_cost(), 2),
+                "in_stock": drink.can_be_dispensed(),
+            }
+            for reference, drink in self.barista_service.get_menu()
+        }
+        frame = {}
+        if self.last_result is not None:
+            frame["result"] = self.last_result.result
+            if self.last_result.subject is not None:
+                frame["subject"] = self.last_result.subject
+        inventory_changes = diff_fields(self.last_inventory, inventory)
+        if inventory_changes:
+            frame["inventory"] = inventory_changes
+        menu_changes = diff_fields(self.last_menu, menu)
+        if menu_changes:
+            frame["menu"] = menu_changes
+        print(json.dumps(frame, separators=(",", ":")))
+        self.last_result, self.last_inventory, self.last_menu = None, inventory, menu
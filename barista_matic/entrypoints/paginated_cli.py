@@ -0,0 +1,109 @@
+from typing import (
+    Callable,
+    List,
+    Optional,
+)
+
+from barista_matic.domain import model
+from barista_matic.entrypoints.interactive_cli import (
+    CommandResult,
+    Dispense,
+    InteractiveCli,
+    PrintInventory,
+    PrintMenu,
+    UserCommand,
+    command_mapping,
+)
+
+from barista_matic import settings
+
+
+class Navigate(UserCommand):
+    """Move through the pages or change the menu filter. Nothing is printed, the next frame shows the change"""
+    def __init__(self, move: Callable[[str], None]):
+        self.move = move
+
+    def execute(self, barista_service, user_input) -> CommandResult:
+        self.move(user_input)
+        return CommandResult("navigated", user_input)
+
+    def format_result(self, result: CommandResult) -> str:
+        return ""
+
+    def dispatch(self, barista_service, user_input) -> CommandResult:
+        return self.execute(barista_service, user_input)
+
+
+class PaginatedInteractiveCli(InteractiveCli):
+    """Interactive cli for large catalogs: frames only show a page of the inventory and of the menu.
+
+    Besides the drink references and the regular commands:
+        '>' and '<' go to the next and previous menu page,
+        ']' and '[' go to the next and previous inventory page,
+        '/<prefix>' only shows the drinks whose name starts with the prefix, '/' shows them all again,
+        '+' toggles showing only the drinks in stock.
+    """
+    MENU_FILTER_PREFIX = "/"
+
+    def __init__(self, barista_service, page_size: int = settings.PAGE_SIZE):
+        super().__init__(barista_service)
+        self.page_size = page_size
+        # Cursors of the pages visited so far, the last one is the current page
+        self.menu_cursors: List[Optional[str]] = [None]
+        self.inventory_cursors: List[Optional[str]] = [None]
+        self.menu_prefix: Optional[str] = None
+        self.in_stock_only = False
+        self.menu_page = model.Page(())
+        self.inventory_page = model.Page(())
+        self.navigation = {
+            ">": lambda _: self._next_page(self.menu_cursors, self.menu_page),
+            "<": lambda _: self._previous_page(self.menu_cursors),
+            "]": lambda _: self._next_page(self.inventory_cursors, self.inventory_page),
+            "[": lambda _: self._previous_page(self.inventory_cursors),
+            "+": self._toggle_in_stock_only,
+        }
+
+    def get_command(self, user_input: str) -> UserCommand:
+        # The whole menu isn't loaded to validate the reference, an unknown one is reported by Dispense
+        if user_input in self.navigation:
+            return Navigate(self.navigation[user_input])
+        if user_input.startswith(self.MENU_FILTER_PREFIX):
+            return Navigate(self._filter_menu)
+        if user_input.isdigit():
+            return Dispense()
+        return command_mapping[user_input]
+
+    def print_inventory(self):
+        self.inventory_page = self.barista_service.get_inventory_page(self.inventory_cursors[-1], self.page_size)
+        print(PrintInventory.COMMAND_MDG)
+        for item in self.inventory_page.items:
+            print(PrintInventory.format_line(item))
+
+    def print_menu(self):
+        self.menu_page = self.barista_service.get_menu_page(
+            self.menu_cursors[-1],
+            self.page_size,
+            prefix=self.menu_prefix,
+            in_stock_only=self.in_stock_only,
+        )
+        print(PrintMenu.COMMAND_MSG)
+        for reference, drink in self.menu_page.items:
+            print(PrintMenu.format_line(reference, drink))
+
+    @staticmethod
+    def _next_page(cursors: List[Optional[str]], page: model.Page) -> None:
+        if page.next_cursor is not None:
+            cursors.append(page.next_cursor)
+
+    @staticmethod
+    def _previous_page(cursors: List[Optional[str]]) -> None:
+        if len(cursors) > 1:
+            cursors.pop()
+
+    def _filter_menu(self, user_input: str) -> None:
+        self.menu_prefix = user_input[len(self.MENU_FILTER_PREFIX):] or None
+        self.menu_cursors = [None]
+
+    def _toggle_in_stock_only(self, _) -> None:
+        self.in_stock_only = not self.in_stock_only
+        self.menu_cursors = [None]
@@ -0,0 +1,198 @@
+from concurrent.futures import (
+    Future,
+    ThreadPoolExecutor,
+)
+from dataclasses import dataclass
+from typing import (
+    Dict,
+    FrozenSet,
+    Mapping,
+    Optional,
+    Tuple,
+)
+
+from barista_matic.adapters.catalog_snapshot import CatalogSnapshot
+from barista_matic.domain import exceptions
+from barista_matic.entrypoints.interactive_cli import (
+    CommandResult,
+    Dispense,
+    InteractiveCli,
+    PrintInventory,
+    PrintMenu,
+    UserCommand,
+    command_mapping,
+    format_inventory_line,
+    format_menu_line,
+)
+
+
+@dataclass(frozen=True)
+class FrameLayout:
+    """Lookup structures of a catalog snapshot, to render a frame again from the stock changes only"""
+    snapshot: CatalogSnapshot
+    references: FrozenSet[str]
+    # Menu rows of the drinks that use the ingredient
+    drink_rows_by_ingredient: Mapping[str, Tuple[int, ...]]
+
+    @classmethod
+    def from_snapshot(cls, snapshot: CatalogSnapshot) -> "FrameLayout":
+        drink_rows_by_ingredient: Dict[str, Tuple[int, ...]] = {}
+        for row, recipe in enumerate(snapshot.recipes):
+            for index, _ in recipe:
+                name = snapshot.ingredient_names[index]
+                drink_rows_by_ingredient[name] = drink_rows_by_ingredient.get(name, ()) + (row, )
+        return cls(
+            snapshot=snapshot,
+            references=frozenset(str(reference) for reference in range(1, len(snapshot.drink_names) + 1)),
+            drink_rows_by_ingredient=drink_rows_by_ingredient,
+        )
+
+    def get_menu_line(self, row: int, stock: Mapping[str, int]) -> str:
+        """Format a menu line with the stock, as the menu frame does"""
+        snapshot = self.snapshot
+        in_stock = all(
+            stock.get(snapshot.ingredient_names[index], 0) >= quantity for index, quantity in snapshot.recipes[row]
+        )
+        return format_menu_line(str(row + 1), snapshot.drink_names[row], snapshot.drink_costs[row], in_stock)
+
+
+class FrameRenderer:
+    """Lines of the frame of a catalog snapshot. Stock changes only format again the lines they change:
+    the inventory line of the ingredient and the menu lines of the drinks that use it.
+    """
+    def __init__(self, layout: FrameLayout, stock: Dict[str, int]):
+        self.layout = layout
+        self.stock = dict(stock)
+        names = sorted(self.stock)
+        self._inventory_rows = {name: row for row, name in enumerate(names)}
+        self._inventory_lines = [format_inventory_line(name, self.stock[name]) for name in names]
+        self._menu_lines = [layout.get_menu_line(row, self.stock) for row in range(len(layout.snapshot.drink_names))]
+        self.text = self._join_lines()
+
+    def apply(self, stock_changes: Dict[str, int]) -> str:
+        """Apply stock changes of known ingredients
+
+        Args:
+            stock_changes (Dict[str, int]): Available quantity by changed ingredient name
+
+        Returns:
+            str: The frame text
+        """
+        changed_rows = set()
+        for name, quantity in stock_changes.items():
+            self.stock[name] = quantity
+            self._inventory_lines[self._inventory_rows[name]] = format_inventory_line(name, quantity)
+            changed_rows.update(self.layout.drink_rows_by_ingredient.get(name, ()))
+        for row in changed_rows:
+            self._menu_lines[row] = self.layout.get_menu_line(row, self.stock)
+        self.text = self._join_lines()
+        return self.text
+
+    def _join_lines(self) -> str:
+        return "\n".join((PrintInventory.COMMAND_MDG, *self._inventory_lines, PrintMenu.COMMAND_MSG, *self._menu_lines))
+
+
+class FrameDispense(Dispense):
+    """Dispense of a reference of a prepared frame. The frame menu isn't read again from the repository,
+    when the reference now points to another drink or price, the frame is stale and nothing is dispensed
+    """
+    COMMAND_STALE = "Menu changed, select again:"
+
+    def __init__(self, drink_name: str, drink_cost: float):
+        self.drink_name = drink_name
+        self.drink_cost = drink_cost
+
+    def execute(self, barista_service, user_input) -> CommandResult:
+        try:
+            drink = barista_service.get_drink_by_reference(user_input)
+        except exceptions.InvalidSelectedDrink:
+            drink = None
+        if drink is None or drink.name != self.drink_name or round(drink.get_cost(), 2) != round(self.drink_cost, 2):
+            return CommandResult("stale", user_input)
+        try:
+            barista_service.dispense_drink(drink)
+            return CommandResult("dispensed", drink.name)
+        except exceptions.OutOfStock as err:
+            return CommandResult("out_of_stock", err.drink.name)
+
+    def format_result(self, result: CommandResult) -> str:
+        if result.result == "stale":
+            return f"{self.COMMAND_STALE} {result.subject}"
+        return super().format_result(result)
+
+
+def build_frame_renderer(snapshot: CatalogSnapshot, stock: Dict[str, int]) -> FrameRenderer:
+    return FrameRenderer(FrameLayout.from_snapshot(snapshot), stock)
+
+
+class SpeculativeInteractiveCli(InteractiveCli):
+    """Interactive cli that prepares the next frame while it waits for the user.
+
+    When the catalog is loaded or swapped, the frame is printed as usual and an immutable snapshot of the catalog
+    and the stock is handed to a background thread. While the user types, it builds the menu lookups and the
+    frame as it is, the frame printed when a command changes nothing. After a command, the stock is read with
+    one narrow query and only the lines of the changed ingredients are formatted again. The read also sees the
+    changes made by other processes sharing the database, and the lots that expired.
+    The catalog isn't read to print the frame. A menu reference is dispensed only if it still points to the drink
+    the frame shows, otherwise the frame is built again from the repository, e.g. after another process added a
+    drink. Catalog changes are otherwise seen after a catalog reload.
+    """
+    def __init__(self, barista_service):
+        super().__init__(barista_service)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="frame-precompute")
+        self._renderer: Optional[Future] = None
+
+    def render_frame(self):
+        renderer = self._get_renderer()
+        if renderer is None:
+            self._prepare_next_frame()
+            super().render_frame()
+            return
+        stock = self.barista_service.repository.get_stock()
+        if stock.keys() != renderer.stock.keys():
+            self._renderer = None
+            self.render_frame()
+            return
+        stock_changes = {name: quantity for name, quantity in stock.items() if renderer.stock[name] != quantity}
+        print(renderer.apply(stock_changes) if stock_changes else renderer.text)
+
+    def get_command(self, user_input: str) -> UserCommand:
+        renderer = self._get_renderer()
+        if renderer is None:
+            return super().get_command(user_input)
+        if user_input in renderer.layout.references:
+            snapshot = renderer.layout.snapshot
+            row = int(user_input) - 1
+            return FrameDispense(snapshot.drink_names[row], snapshot.drink_costs[row])
+        return command_mapping[user_input]
+
+    def dispatch_command(self, command: UserCommand, user_input: str) -> Optional[CommandResult]:
+        result = super().dispatch_command(command, user_input)
+        if result is not None and result.result == "stale":
+            self._renderer = None
+        return result
+
+    def catalog_swapped(self):
+        self._renderer = None
+
+    def close(self):
+        """Stop the background thread, once the frame in progress is built"""
+        self._executor.shutdown(wait=True)
+
+    def _get_renderer(self) -> Optional[FrameRenderer]:
+        if self._renderer is None:
+            return None
+        try:
+            return self._renderer.result()
+        except Exception:
+            # A failed precompute is built again with the next frame
+            self._renderer = None
+            return None
+
+    def _prepare_next_frame(self) -> None:
+        inventory = self.barista_service.get_inventory()
+        drinks = [drink for _, drink in self.barista_service.get_menu()]
+        # The snapshot and the stock are read here, the background thread never touches the repository
+        snapshot = CatalogSnapshot.from_catalog((), drinks, inventory)
+        stock = {ingredient.name: ingredient.get_available_quantity() for ingredient in inventory}
+        self._renderer = self._executor.submit(build_frame_renderer, snapshot, stock)
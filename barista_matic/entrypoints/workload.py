@@ -0,0 +1,172 @@
+import argparse
+import itertools
+import random
+import sys
+from dataclasses import (
+    dataclass,
+    fields,
+)
+from typing import (
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    TextIO,
+)
+
+from barista_matic.domain import model
+
+INVALID_INPUTS = ("x", "restock", "0", "-1", "1.5", "dispense", "?")
+
+
+@dataclass(frozen=True)
+class WorkloadConfig:
+    """Shape of a synthetic command stream.
+
+    Drink references are picked with a Zipf distribution: the drink of rank k is picked with a weight of 1 / k^s.
+    Arrivals alternate between calm and burst periods, with exponential times between commands in each of them.
+    """
+    commands: int = 1000
+    catalog_size: int = 6
+    zipf_exponent: float = 1.1
+    # Popularity ranks are shuffled with the seed, otherwise the first references are the most popular
+    shuffle_popularity: bool = False
+    # A restock every this number of commands, 0 to never restock
+    restock_every: int = 50
+    invalid_ratio: float = 0.01
+    mean_seconds_between_commands: float = 5.0
+    burst_mean_seconds_between_commands: float = 0.5
+    # Chance of a burst starting after a command, and mean number of commands in a burst
+    burst_probability: float = 0.02
+    burst_mean_commands: float = 10.0
+    seed: int = 0
+
+
+@dataclass(frozen=True)
+class WorkloadCommand:
+    """User input and when it arrives, in seconds since the start of the stream"""
+    at: float
+    user_input: str
+
+
+def generate_workload(config: WorkloadConfig) -> Iterator[WorkloadCommand]:
+    """Generate a reproducible command stream in the InteractiveCli grammar, it ends with the exit command
+
+    Args:
+        config (WorkloadConfig): Shape of the stream, the same config always generates the same stream
+
+    Yields:
+        WorkloadCommand: Commands, in arrival order
+    """
+    generator = random.Random(config.seed)
+    references = [str(reference) for reference in range(1, config.catalog_size + 1)]
+    if config.shuffle_popularity:
+        generator.shuffle(references)
+    cumulative_weights = list(itertools.accumulate(
+        1 / rank ** config.zipf_exponent for rank in range(1, config.catalog_size + 1)
+    ))
+    at, burst_commands_left = 0.0, 0
+    for position in range(1, config.commands + 1):
+        if burst_commands_left:
+            burst_commands_left -= 1
+            at += generator.expovariate(1 / config.burst_mean_seconds_between_commands)
+        else:
+            at += generator.expovariate(1 / config.mean_seconds_between_commands)
+            if generator.random() < config.burst_probability:
+                burst_commands_left = max(1, round(generator.expovariate(1 / config.burst_mean_commands)))
+        if config.restock_every and position % config.restock_every == 0:
+            user_input = "r"
+        elif not references or generator.random() < config.invalid_ratio:
+            user_input = generator.choice(INVALID_INPUTS + (str(config.catalog_size + 1), ))
+        else:
+            user_input = generator.choices(references, cum_weights=cumulative_weights)[0]
+        yield WorkloadCommand(round(at, 3), user_input)
+    yield WorkloadCommand(round(at, 3), "q")
+
+
+def generate_commands(config: WorkloadConfig) -> Iterator[str]:
+    """Generate the user inputs of the stream, e.g. to feed an InteractiveCli in-process
+
+    Args:
+        config (WorkloadConfig): Shape of the stream
+
+    Yields:
+        str: User inputs
+    """
+    return (command.user_input for command in generate_workload(config))
+
+
+def generate_catalog(
+    catalog_size: int, ingredients_by_drink: int = 3, ingredient_count: int = 9, seed: int = 0
+) -> List[model.Drink]:
+    """Generate drinks for a stream of the same catalog size. Names are numbered,
+    so the drink at menu reference n is "drink n"
+
+    Args:
+        catalog_size (int): Number of drinks
+        ingredients_by_drink (int): Ingredients in every recipe, up to ingredient_count
+        ingredient_count (int): Ingredients shared by the drinks
+        seed (int): Seed of the recipes
+
+    Returns:
+        List[model.Drink]: The drinks, their ingredients have the default restock quantity
+    """
+    generator = random.Random(seed)
+    width = len(str(catalog_size))
+    ingredient_width = len(str(ingredient_count))
+    ingredients = [
+        model.Ingredient(f"ingredient {index:0{ingredient_width}}", 10, round(generator.uniform(0.25, 1.5), 2))
+        for index in range(1, ingredient_count + 1)
+    ]
+    return [
+        model.Drink(f"drink {index:0{width}}", [
+            model.DrinkIngredient(ingredient, generator.randint(1, 3))
+            for ingredient in generator.sample(ingredients, min(ingredients_by_drink, ingredient_count))
+        ])
+        for index in range(1, catalog_size + 1)
+    ]
+
+
+def write_workload(commands: Iterable[WorkloadCommand], output: TextIO, timed: bool = False) -> None:
+    """Write the stream one command by line. Without times, the file can be the cli standard input
+
+    Args:
+        commands (Iterable[WorkloadCommand]): Stream to write
+        output (TextIO): Text file
+        timed (bool): Prefix every command with its arrival time and a tab
+    """
+    for command in commands:
+        output.write(f"{command.at}\t{command.user_input}\n" if timed else f"{command.user_input}\n")
+
+
+def read_workload(workload_file: TextIO) -> Iterator[WorkloadCommand]:
+    """Read a stream written by write_workload, with or without times
+
+    Args:
+        workload_file (TextIO): Text file
+
+    Yields:
+        WorkloadCommand: Commands, untimed ones arrive at 0
+    """
+    for line in workload_file:
+        at, separator, user_input = line.rstrip("\n").rpartition("\t")
+        yield WorkloadCommand(float(at) if separator else 0.0, user_input)
+
+
+def main(argv: Optional[List[str]] = None):
+    """Write a command stream to the standard output, options are the WorkloadConfig fields"""
+    parser = argparse.ArgumentParser(description="Generate a Barista-matic command stream")
+    for config_field in fields(WorkloadConfig):
+        option = f"--{config_field.name.replace('_', '-')}"
+        if config_field.type is bool:
+            parser.add_argument(option, action="store_true")
+        else:
+            parser.add_argument(option, type=config_field.type, default=config_field.default)
+    parser.add_argument("--timed", action="store_true", help="Prefix every command with its arrival time")
+    arguments = vars(parser.parse_args(argv))
+    timed = arguments.pop("timed")
+    write_workload(generate_workload(WorkloadConfig(**arguments)), sys.stdout, timed)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,26 +7,99 @@ from sqlalchemy_utils import (
     database_exists,
 )
 
+from barista_matic.adapters.caching_repository import CachingRepository
+from barista_matic.adapters.catalog_snapshot import load_catalog_snapshot
 from barista_matic.adapters.orm import start_mappers
 from barista_matic.adapters.repository import SQLAlchemyRepository
+from barista_matic.adapters.sharding import ShardRouter
 from barista_matic.entrypoints.interactive_cli import InteractiveCli
+from barista_matic.entrypoints.metrics_http import start_metrics_server
+from barista_matic.entrypoints.ndjson_cli import NdjsonCli
+from barista_matic.entrypoints.paginated_cli import PaginatedInteractiveCli
+from barista_matic.entrypoints.speculative_cli import SpeculativeInteractiveCli
+from barista_matic.service_layer.catalog_reload import CatalogReloader
+from barista_matic.service_layer.metrics import BaristaMetrics
 from barista_matic.service_layer.services import BaristaMatic
+from barista_matic.service_layer.unit_of_work import (
+    RepositoryUnitOfWork,
+    SqlAlchemyUnitOfWork,
+)
 
 from barista_matic import settings
 
+CLI_BY_OUTPUT_FORMAT = {
+    "text": InteractiveCli,
+    "ndjson": NdjsonCli,
+}
+
+
+def get_cli_class():
+    if settings.OUTPUT_FORMAT == "text" and settings.PAGE_SIZE > 0:
+        return PaginatedInteractiveCli
+    if settings.OUTPUT_FORMAT == "text" and settings.PRECOMPUTE_FRAMES:
+        return SpeculativeInteractiveCli
+    return CLI_BY_OUTPUT_FORMAT[settings.OUTPUT_FORMAT]
+
+
+def get_engine(**engine_options):
+    return create_engine(settings.DB, **engine_options)
+
 
-def get_engine():
-    return create_engine(settings.DB)
+def get_session_factory(**engine_options):
+    # Engine options, like the connection pool size, apply to every shard
+    if settings.SHARD_DBS:
+        router = ShardRouter([create_engine(url, **engine_options) for url in settings.SHARD_DBS])
+        return router.get_session_factory(settings.MACHINE_ID)
+    return sessionmaker(get_engine(**engine_options))
+
+
+def build_unit_of_work(session_factory):
+    unit_of_work = SqlAlchemyUnitOfWork(session_factory, machine_id=settings.MACHINE_ID)
+    if settings.REPOSITORY_CACHE_ENTRIES > 0:
+        # Transactions go through the cache, the session still only expires the rows changed on commit
+        unit_of_work = RepositoryUnitOfWork(CachingRepository(unit_of_work.repository))
+    return unit_of_work
+
+
+def get_catalog_key(session_factory):
+    # A short session of its own, the cli session isn't shared with the reloader thread
+    with session_factory() as session:
+        return SQLAlchemyRepository(session, machine_id=settings.MACHINE_ID).get_catalog_key()
 
 
 def run_interactive_cli():
-    engine = get_engine()
     start_mappers()
-    session = sessionmaker(engine)()
-    repository = SQLAlchemyRepository(session)
-    barista_matic = BaristaMatic(repository)
-    cli = InteractiveCli(barista_matic)
-    cli.execute()
+    session_factory = get_session_factory()
+    unit_of_work = build_unit_of_work(session_factory)
+    repository = unit_of_work.repository
+    metrics = None
+    if settings.METRICS_PORT > 0:
+        # Stock levels start from the database, then follow the stock events
+        metrics = BaristaMetrics(machine_id=settings.MACHINE_ID)
+        metrics.set_stock(repository.get_stock())
+        start_metrics_server(metrics)
+    barista_matic = BaristaMatic(repository, unit_of_work=unit_of_work, metrics=metrics)
+    cli_class = get_cli_class()
+    cli = cli_class(barista_matic)
+    try:
+        if settings.CATALOG_POLL_SECONDS > 0:
+            cli.catalog_reloader = CatalogReloader(
+                barista_matic,
+                lambda: get_catalog_key(session_factory),
+                lambda: build_unit_of_work(session_factory),
+            ).start()
+        if settings.CATALOG_SNAPSHOT and cli_class in (InteractiveCli, SpeculativeInteractiveCli):
+            snapshot = load_catalog_snapshot(repository, settings.CATALOG_SNAPSHOT)
+            cli.render_snapshot_frame(snapshot, repository.get_stock())
+            cli.execute(render_first_frame=False)
+        else:
+            cli.execute()
+    finally:
+        if cli.catalog_reloader is not None:
+            cli.catalog_reloader.stop()
+        cli.close()
+        # The unit of work served last, the swapped ones were closed by the reloader
+        barista_matic.unit_of_work.close()
 
 
 def create_db_file_if_not_exists():
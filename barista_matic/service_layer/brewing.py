@@ -0,0 +1,83 @@
+import contextlib
+from concurrent.futures import (
+    Future,
+    ThreadPoolExecutor,
+)
+from typing import (
+    Callable,
+    Optional,
+)
+
+from barista_matic.domain import (
+    exceptions,
+    model,
+)
+from barista_matic.service_layer.services import BaristaMatic
+
+from barista_matic import settings
+
+
+def no_brew(drink: model.Drink) -> None:
+    """Brew that finishes immediately, for machines without brewing hardware"""
+
+
+class BrewWorkerPool:
+    """Accept orders by reserving their ingredients, and brew them in background workers.
+
+    A brewed order confirms its reservation, a failed brew releases it. The caller only waits for the reservation.
+    The hold only expires while the order waits for a worker, a worker holds the ingredients until the brew is over.
+    Use a ThreadSafeBaristaMatic, orders are accepted while workers change the stock.
+    """
+    def __init__(
+        self,
+        barista_service: BaristaMatic,
+        brew: Callable[[model.Drink], None] = no_brew,
+        workers: int = settings.BREW_WORKERS,
+        hold_seconds: Optional[float] = settings.RESERVATION_HOLD_SECONDS,
+    ):
+        self.barista_service = barista_service
+        self.brew = brew
+        self.hold_seconds = hold_seconds
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="brew")
+
+    def submit(self, reference: str) -> "Future[model.Drink]":
+        """Reserve the drink by reference and queue its brew
+
+        Args:
+            reference (str): Drink reference
+
+        Raises:
+            exceptions.OutOfStock: Ingredient stock is not enough
+            exceptions.InvalidSelectedDrink: If the reference is not valid for the menu
+
+        Returns:
+            Future[model.Drink]: Resolved with the dispensed drink when the brew is confirmed
+        """
+        reservation = self.barista_service.reserve(reference, self.hold_seconds)
+        return self.executor.submit(self._brew, reservation)
+
+    def _brew(self, reservation: model.Reservation) -> model.Drink:
+        try:
+            self.barista_service.extend(reservation, hold_seconds=None)
+            self.brew(reservation.drink)
+        except Exception:
+            with contextlib.suppress(exceptions.ReservationNotActive):
+                self.barista_service.release(reservation)
+            raise
+        finally:
+            self.barista_service.reclaim_expired_reservations()
+        return self.barista_service.confirm(reservation)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop accepting brews
+
+        Args:
+            wait (bool): Wait for the queued brews
+        """
+        self.executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
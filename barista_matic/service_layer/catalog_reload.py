@@ -0,0 +1,119 @@
+import logging
+import threading
+from typing import (
+    Callable,
+    Hashable,
+    Optional,
+    Tuple,
+)
+
+from barista_matic.service_layer.services import BaristaMatic
+from barista_matic.service_layer.unit_of_work import AbstractUnitOfWork
+
+from barista_matic import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogReloader:
+    """Reloads the catalog of a service when it changes, without restarting it.
+
+    A background thread polls the catalog key. When it changed, the thread builds a new unit of work and loads
+    the catalog into it, while the service keeps serving the current one. The cli swaps the new one in between
+    commands, read-copy-update style: commands never wait for a reload, a command only ever sees one catalog.
+    The previous unit of work is closed once swapped. While the service has active reservations, whose drinks
+    belong to the current unit of work, the swap waits for them to be confirmed or released.
+    """
+    def __init__(
+        self,
+        barista_service: BaristaMatic,
+        get_catalog_key: Callable[[], Hashable],
+        build_unit_of_work: Callable[[], AbstractUnitOfWork],
+        poll_seconds: float = settings.CATALOG_POLL_SECONDS,
+    ):
+        self.barista_service = barista_service
+        self.get_catalog_key = get_catalog_key
+        self.build_unit_of_work = build_unit_of_work
+        self.poll_seconds = poll_seconds
+        self.catalog_key = get_catalog_key()
+        self.reloads = 0
+        self._pending: Optional[Tuple[Hashable, AbstractUnitOfWork]] = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "CatalogReloader":
+        """Poll the catalog in a daemon thread
+
+        Raises:
+            ValueError: The poll interval isn't positive, the reload is disabled
+        """
+        if self.poll_seconds <= 0:
+            raise ValueError(f"Catalog poll interval must be positive to reload it, got {self.poll_seconds}")
+        self._thread = threading.Thread(target=self._poll, name="catalog-reloader", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop polling, a catalog loaded and not swapped is dropped"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        with self._lock:
+            pending, self._pending = self._pending, None
+        if pending is not None:
+            pending[1].close()
+
+    def check(self) -> bool:
+        """Load the catalog into a new unit of work if it changed since the current or the loaded one
+
+        Returns:
+            bool: A new catalog was loaded, ready to be swapped
+        """
+        catalog_key = self.get_catalog_key()
+        with self._lock:
+            known_keys = (self.catalog_key, self._pending and self._pending[0])
+        if catalog_key in known_keys:
+            return False
+        unit_of_work = self.build_unit_of_work()
+        try:
+            _load_catalog(unit_of_work)
+        except BaseException:
+            unit_of_work.close()
+            raise
+        with self._lock:
+            replaced, self._pending = self._pending, (catalog_key, unit_of_work)
+        if replaced is not None:
+            replaced[1].close()
+        return True
+
+    def swap(self) -> bool:
+        """Serve the loaded catalog from now on. Call it between commands
+
+        Returns:
+            bool: The catalog was swapped
+        """
+        if self._pending is None or self.barista_service.get_active_reservations():
+            return False
+        with self._lock:
+            pending, self._pending = self._pending, None
+            if pending is None:
+                return False
+            self.catalog_key = pending[0]
+        self.barista_service.swap_unit_of_work(pending[1]).close()
+        self.reloads += 1
+        return True
+
+    def _poll(self) -> None:
+        while not self._stopped.wait(self.poll_seconds):
+            try:
+                self.check()
+            except Exception:
+                logger.exception("Catalog reload failed, the current catalog is kept")
+
+
+def _load_catalog(unit_of_work: AbstractUnitOfWork) -> None:
+    # Recipes and prices are loaded here, so the first frame of the new catalog doesn't query them
+    unit_of_work.repository.get_ingredients()
+    for drink in unit_of_work.repository.get_drinks():
+        drink.get_cost()
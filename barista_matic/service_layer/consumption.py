@@ -0,0 +1,113 @@
+import math
+import threading
+import time
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
+
+from barista_matic.domain import model
+
+from barista_matic import settings
+
+
+class ConsumptionTracker:
+    """Streaming consumption rate per ingredient, using exponentially decayed counters.
+
+    Every ingredient keeps only its decayed quantity and the time it was last updated,
+    so memory is constant whatever the number of dispenses.
+    """
+    def __init__(
+        self,
+        half_life_seconds: float = settings.CONSUMPTION_HALF_LIFE_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.time_constant = half_life_seconds / math.log(2)
+        self.clock = clock
+        self.started_at = clock()
+        self._counters: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, ingredient_name: str, quantity: int) -> None:
+        """Add a used quantity of the ingredient
+
+        Args:
+            ingredient_name (str): Ingredient name
+            quantity (int): Used quantity
+        """
+        now = self.clock()
+        with self._lock:
+            counter = self._counters.setdefault(ingredient_name, [0.0, now])
+            counter[0] = self._decay(counter, now) + quantity
+            counter[1] = now
+
+    def record_drink(self, drink: model.Drink) -> None:
+        """Add the quantities used by a dispensed drink
+
+        Args:
+            drink (model.Drink): Dispensed drink
+        """
+        for ingredient_line in drink.ingredients:
+            self.record(ingredient_line.ingredient.name, ingredient_line.ingredient_quantity)
+
+    def get_rate(self, ingredient_name: str) -> float:
+        """Get the estimated consumption rate of the ingredient
+
+        Args:
+            ingredient_name (str): Ingredient name
+
+        Returns:
+            float: Units used per second
+        """
+        now = self.clock()
+        with self._lock:
+            counter = self._counters.get(ingredient_name)
+            if counter is None:
+                return 0.0
+            decayed_quantity = self._decay(counter, now)
+        # While the tracker is younger than the decay window, the counter only saw part of it
+        observed_window = self.time_constant * -math.expm1(-(now - self.started_at) / self.time_constant)
+        return decayed_quantity / observed_window if observed_window > 0 else 0.0
+
+    def get_time_to_stockout(self, inventory: Iterable[model.Ingredient]) -> Dict[str, Optional[float]]:
+        """Estimate when every ingredient runs out at the current consumption rate
+
+        Args:
+            inventory (Iterable[model.Ingredient]): Ingredients with their current stock
+
+        Returns:
+            Dict[str, Optional[float]]: Seconds until stockout by ingredient name, None if it isn't being used
+        """
+        estimates = {}
+        for ingredient in inventory:
+            rate = self.get_rate(ingredient.name)
+            estimates[ingredient.name] = ingredient.get_available_quantity() / rate if rate > 0 else None
+        return estimates
+
+    def get_restock_soon(
+        self, inventory: Iterable[model.Ingredient], horizon_seconds: float = settings.RESTOCK_HORIZON_SECONDS
+    ) -> Tuple[str]:
+        """Get the ingredients that will run out within the horizon, the most urgent first
+
+        Args:
+            inventory (Iterable[model.Ingredient]): Ingredients with their current stock
+            horizon_seconds (float): Time until the next restock
+
+        Returns:
+            Tuple[str]: Ingredient names
+        """
+        estimates = self.get_time_to_stockout(inventory)
+        soon = [
+            (seconds, name)
+            for name, seconds in estimates.items()
+            if seconds is not None and seconds <= horizon_seconds
+        ]
+        return tuple(name for _, name in sorted(soon))
+
+    def _decay(self, counter: List[float], now: float) -> float:
+        decayed_quantity, updated_at = counter
+        return decayed_quantity * math.exp(-(now - updated_at) / self.time_constant)
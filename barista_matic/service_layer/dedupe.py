@@ -0,0 +1,22 @@
+import time
+from typing import (
+    Callable,
+    TypeVar,
+)
+
+from barista_matic.adapters.lru_cache import LruCache
+
+from barista_matic import settings
+
+T = TypeVar("T")
+
+
+class DedupeCache(LruCache[T]):
+    """Results of recent requests by request id, bounded in size and in age"""
+    def __init__(
+        self,
+        max_entries: int = settings.DEDUPE_MAX_REQUESTS,
+        ttl_seconds: float = settings.DEDUPE_TTL_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        super().__init__(max_entries, ttl_seconds, clock)
@@ -0,0 +1,68 @@
+import contextlib
+import threading
+from typing import (
+    Dict,
+    Iterable,
+    Iterator,
+)
+
+from barista_matic.domain import model
+
+
+class IngredientLocks:
+    """Registry of one lock per ingredient name.
+
+    Locks are always acquired in the global order given by the ingredient name, so two dispenses
+    that share ingredients can't deadlock, and dispenses without shared ingredients never wait for each other.
+    """
+    def __init__(self):
+        self._locks: Dict[str, threading.Lock] = {}
+        self._registry_lock = threading.Lock()
+
+    def get_lock(self, ingredient_name: str) -> threading.Lock:
+        """Get the lock for an ingredient, creating it on first use
+
+        Args:
+            ingredient_name (str): Ingredient name
+
+        Returns:
+            threading.Lock: The ingredient lock
+        """
+        lock = self._locks.get(ingredient_name)
+        if lock is None:
+            with self._registry_lock:
+                lock = self._locks.setdefault(ingredient_name, threading.Lock())
+        return lock
+
+    @contextlib.contextmanager
+    def holding(self, ingredients: Iterable[model.Ingredient]) -> Iterator[None]:
+        """Hold the locks of every ingredient, acquired in global order
+
+        Args:
+            ingredients (Iterable[model.Ingredient]): Ingredients to lock, duplicates are allowed
+        """
+        ordered_names = sorted({ingredient.name for ingredient in ingredients})
+        with contextlib.ExitStack() as stack:
+            for name in ordered_names:
+                stack.enter_context(self.get_lock(name))
+            yield
+
+
+class RequestLocks:
+    """Fixed set of locks shared by request ids, so the memory used doesn't grow with the requests.
+
+    Requests that share a lock wait for each other, more stripes make it less likely.
+    """
+    def __init__(self, stripes: int = 64):
+        self._locks = tuple(threading.Lock() for _ in range(stripes))
+
+    def get_lock(self, request_id: str) -> threading.Lock:
+        """Get the lock of a request id
+
+        Args:
+            request_id (str): Request id
+
+        Returns:
+            threading.Lock: The lock of its stripe
+        """
+        return self._locks[hash(request_id) % len(self._locks)]
@@ -0,0 +1,262 @@
+from abc import (
+    ABC,
+    abstractmethod,
+)
+import bisect
+import threading
+from typing import (
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from barista_matic.domain import (
+    events,
+    model,
+)
+
+Labels = Tuple[str, ...]
+Sample = Tuple[str, Dict[str, str], float]
+
+# Command latencies, from a fast read to a slow database write
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class Metric(ABC):
+    """Metric with labels, exposed in the Prometheus text format"""
+    TYPE = "untyped"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+
+    @abstractmethod
+    def get_samples(self) -> Iterator[Sample]:
+        """Get the name, labels and value of every sample of the metric"""
+        pass
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.TYPE}"]
+        for name, labels, value in self.get_samples():
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def _get_labels(self, label_values: Labels) -> Dict[str, str]:
+        return dict(zip(self.label_names, label_values))
+
+
+class ThreadShards:
+    """Values written by a single thread each, so writes take no lock. Readers merge the shards.
+
+    A thread only creates its shard once, under a lock. Shards of finished threads are kept, their counts still count.
+    """
+    def __init__(self):
+        self._local = threading.local()
+        self._shards: List[dict] = []
+        self._lock = threading.Lock()
+
+    def get(self) -> dict:
+        """Get the shard of the current thread"""
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def snapshot(self) -> List[dict]:
+        """Copy every shard. A dict copy is atomic, writers are never blocked"""
+        with self._lock:
+            shards = list(self._shards)
+        return [shard.copy() for shard in shards]
+
+
+class Counter(Metric):
+    """Value that only goes up, e.g. dispensed drinks"""
+    TYPE = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._shards = ThreadShards()
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        shard = self._shards.get()
+        shard[label_values] = shard.get(label_values, 0) + amount
+
+    def get_values(self) -> Dict[Labels, float]:
+        values: Dict[Labels, float] = {}
+        for shard in self._shards.snapshot():
+            for label_values, value in shard.items():
+                values[label_values] = values.get(label_values, 0) + value
+        return values
+
+    def get_samples(self) -> Iterator[Sample]:
+        for label_values, value in sorted(self.get_values().items()):
+            yield self.name, self._get_labels(label_values), value
+
+
+class Gauge(Metric):
+    """Value that goes up and down, e.g. the stock of an ingredient. The last value set wins"""
+    TYPE = "gauge"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[Labels, float] = {}
+
+    def set(self, value: float, *label_values: str) -> None:
+        self._values[label_values] = value
+
+    def get_values(self) -> Dict[Labels, float]:
+        return self._values.copy()
+
+    def get_samples(self) -> Iterator[Sample]:
+        for label_values, value in sorted(self.get_values().items()):
+            yield self.name, self._get_labels(label_values), value
+
+
+class Histogram(Metric):
+    """Distribution of observations in buckets, e.g. command latencies"""
+    TYPE = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._shards = ThreadShards()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        shard = self._shards.get()
+        # Count by bucket, the +Inf bucket last, then the sum of the observations
+        counts = shard.get(label_values)
+        if counts is None:
+            counts = shard[label_values] = [0] * (len(self.buckets) + 2)
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def get_values(self) -> Dict[Labels, List[float]]:
+        values: Dict[Labels, List[float]] = {}
+        for shard in self._shards.snapshot():
+            for label_values, counts in shard.items():
+                # The writer keeps changing its list: it is copied at once, an observation in progress may be
+                # copied with its bucket and without its sum, the next scrape has both
+                counts = list(counts)
+                total = values.setdefault(label_values, [0] * (len(self.buckets) + 2))
+                for index, count in enumerate(counts):
+                    total[index] += count
+        return values
+
+    def get_samples(self) -> Iterator[Sample]:
+        for label_values, counts in sorted(self.get_values().items()):
+            labels = self._get_labels(label_values)
+            cumulative = 0
+            for bound, count in zip((*map(_format_value, self.buckets), "+Inf"), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", {**labels, "le": bound}, cumulative
+            yield f"{self.name}_sum", labels, counts[-1]
+            yield f"{self.name}_count", labels, cumulative
+
+
+class BaristaMetrics:
+    """Operational metrics of a machine.
+
+    Dispenses and stock levels follow the domain events, the service and the cli record the rest.
+    Rendering only reads the metrics, it never touches the repository nor waits for a command.
+    """
+    def __init__(self, machine_id: Optional[str] = None, bus: Optional[events.EventBus] = None):
+        self.machine_id = machine_id
+        self.dispenses = Counter("baristamatic_dispenses_total", "Dispensed drinks.", ("drink", ))
+        self.out_of_stock = Counter(
+            "baristamatic_out_of_stock_total", "Drinks refused because the ingredient was short.", ("ingredient", )
+        )
+        self.invalid_selections = Counter("baristamatic_invalid_selections_total", "Invalid user selections.")
+        self.command_seconds = Histogram("baristamatic_command_seconds", "Command latency in seconds.", ("command", ))
+        self.stock = Gauge("baristamatic_ingredient_stock", "Available quantity of the ingredient.", ("ingredient", ))
+        self.bus = bus or events.bus
+        self._subscriptions = [
+            self.bus.subscribe(events.DrinkDispensed, self._on_drink_dispensed),
+            self.bus.subscribe(events.IngredientStockChanged, self._on_stock_changed),
+        ]
+
+    def get_metrics(self) -> Tuple[Metric, ...]:
+        return (self.dispenses, self.out_of_stock, self.invalid_selections, self.command_seconds, self.stock)
+
+    def set_stock(self, stock: Dict[str, int]) -> None:
+        """Start the stock levels from the stock read at startup
+
+        Args:
+            stock (Dict[str, int]): Available quantity by ingredient name
+        """
+        for ingredient_name, quantity in stock.items():
+            self.stock.set(quantity, ingredient_name)
+
+    def record_out_of_stock(self, drink: model.Recipe, holds: Mapping[str, int] = model.NO_HOLDS) -> None:
+        """Count the short ingredients of a drink that can't be dispensed
+
+        Args:
+            drink (model.Recipe): Refused drink
+            holds (Mapping[str, int]): Quantities held by reservations, by ingredient name
+        """
+        for ingredient_line in drink.ingredients:
+            if not ingredient_line.can_be_dispensed(holds.get(ingredient_line.ingredient.name, 0)):
+                self.out_of_stock.inc(ingredient_line.ingredient.name)
+
+    def record_command(self, command_name: str, seconds: float, result: Optional[str] = None) -> None:
+        """Record a command run by the cli
+
+        Args:
+            command_name (str): Command name
+            seconds (float): Time taken by the command
+            result (Optional[str]): Command result, e.g. invalid
+        """
+        self.command_seconds.observe(seconds, command_name)
+        if result == "invalid":
+            self.invalid_selections.inc()
+
+    def render(self) -> str:
+        """Get the metrics in the Prometheus text format
+
+        Returns:
+            str: Metrics exposition
+        """
+        return "".join(metric.render() for metric in self.get_metrics())
+
+    def close(self) -> None:
+        """Stop following the domain events"""
+        for subscription in self._subscriptions:
+            self.bus.unsubscribe(subscription)
+
+    def _is_followed(self, machine_id: str) -> bool:
+        return self.machine_id is None or self.machine_id == machine_id
+
+    def _on_drink_dispensed(self, event: events.DrinkDispensed) -> None:
+        if self._is_followed(event.machine_id):
+            self.dispenses.inc(event.drink_name)
+
+    def _on_stock_changed(self, event: events.IngredientStockChanged) -> None:
+        if self._is_followed(event.machine_id):
+            self.stock.set(event.available_quantity, event.ingredient_name)
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = (f'{name}="{_escape_label_value(value)}"' for name, value in labels.items())
+    return "{" + ",".join(pairs) + "}"
+
+
+def _escape_label_value(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) and not float(value).is_integer() else str(int(value))
@@ -0,0 +1,109 @@
+import math
+from dataclasses import dataclass
+from typing import (
+    Dict,
+    List,
+    Sequence,
+)
+
+from barista_matic.service_layer import recipe_matrix
+from barista_matic.service_layer.recipe_matrix import RecipeMatrix
+
+
+@dataclass(frozen=True)
+class SalesPlan:
+    """Mix of drinks to sell with the current stock"""
+    servings: Dict[str, int]
+    revenue: float
+    upper_bound: float
+
+
+def plan_sales(matrix: RecipeMatrix) -> SalesPlan:
+    """Find the mix of drinks that maximizes revenue until the next restock.
+
+    Greedy over the recipe matrix: the drink with the best revenue per share of the remaining stock
+    takes half of the servings it can still make, until no drink fits.
+    The upper bound comes from a feasible solution of the dual of the linear relaxation,
+    so the plan is at most upper_bound - revenue away from the optimum.
+
+    Args:
+        matrix (RecipeMatrix): Compiled catalog
+
+    Returns:
+        SalesPlan: Servings by drink name, only for drinks to be sold
+    """
+    prices = matrix.get_prices()
+    if recipe_matrix.numpy is not None and matrix.rows:
+        servings = _plan_with_numpy(matrix, prices)
+    else:
+        servings = _plan_with_python(matrix, prices)
+    return SalesPlan(
+        servings={name: count for name, count in zip(matrix.drink_names, servings) if count},
+        revenue=round(sum(count * price for count, price in zip(servings, prices)), 2),
+        upper_bound=round(_get_upper_bound(matrix, prices), 2),
+    )
+
+
+def _get_max_servings(row, remaining) -> int:
+    if not row:
+        return 0
+    return min(remaining[column] // quantity for column, quantity in row)
+
+
+def _get_upper_bound(matrix: RecipeMatrix, prices: Sequence[float]) -> float:
+    # Dual solution: every ingredient is priced at the best share of a drink price it can take,
+    # i.e. the drink price split evenly between its ingredients. Drinks that can't be made are left out.
+    ingredient_prices = [0.0] * len(matrix.ingredient_names)
+    cap_bound = 0.0
+    for row, price in zip(matrix.rows, prices):
+        max_servings = _get_max_servings(row, matrix.stock)
+        if max_servings <= 0:
+            continue
+        cap_bound += price * max_servings
+        for column, quantity in row:
+            ingredient_prices[column] = max(ingredient_prices[column], price / (quantity * len(row)))
+    dual_bound = sum(ingredient_price * stock for ingredient_price, stock in zip(ingredient_prices, matrix.stock))
+    return min(dual_bound, cap_bound)
+
+
+def _plan_with_python(matrix: RecipeMatrix, prices: Sequence[float]) -> List[int]:
+    remaining = list(matrix.stock)
+    servings = [0] * len(matrix.rows)
+    while True:
+        best_score, best_drink, best_max_servings = 0.0, None, 0
+        for drink_index, row in enumerate(matrix.rows):
+            max_servings = _get_max_servings(row, remaining)
+            if max_servings <= 0:
+                continue
+            score = prices[drink_index] / sum(quantity / remaining[column] for column, quantity in row)
+            if best_drink is None or score > best_score:
+                best_score, best_drink, best_max_servings = score, drink_index, max_servings
+        if best_drink is None:
+            return servings
+        taken = math.ceil(best_max_servings / 2)
+        servings[best_drink] += taken
+        for column, quantity in matrix.rows[best_drink]:
+            remaining[column] -= quantity * taken
+
+
+def _plan_with_numpy(matrix: RecipeMatrix, prices: Sequence[float]) -> List[int]:
+    numpy = recipe_matrix.numpy
+    quantities = matrix.dense()
+    used = quantities > 0
+    has_ingredients = used.any(axis=1)
+    price_vector = numpy.array(prices)
+    remaining = numpy.array(matrix.stock, dtype=float)
+    servings = numpy.zeros(len(matrix.rows), dtype=int)
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        while True:
+            ratios = numpy.where(used, remaining / quantities, numpy.inf)
+            max_servings = numpy.where(has_ingredients, numpy.floor(ratios.min(axis=1)), 0)
+            candidates = max_servings >= 1
+            if not candidates.any():
+                return servings.tolist()
+            shares = numpy.where(used, quantities / remaining, 0).sum(axis=1)
+            scores = numpy.where(candidates, price_vector / shares, -numpy.inf)
+            best_drink = int(scores.argmax())
+            taken = math.ceil(max_servings[best_drink] / 2)
+            servings[best_drink] += taken
+            remaining -= quantities[best_drink] * taken
@@ -0,0 +1,80 @@
+from dataclasses import dataclass
+from typing import (
+    Iterable,
+    Tuple,
+)
+
+from barista_matic.domain import model
+
+try:
+    import numpy
+except ImportError:  # NumPy is optional, batch computations fall back to plain Python
+    numpy = None
+
+
+@dataclass(frozen=True)
+class RecipeMatrix:
+    """Catalog compiled to arrays: a row of ingredient quantities per drink, and the current stock.
+
+    Rows are kept sparse as (ingredient index, quantity) pairs, the dense matrix is only built for NumPy.
+    """
+    drink_names: Tuple[str, ...]
+    ingredient_names: Tuple[str, ...]
+    rows: Tuple[Tuple[Tuple[int, int], ...], ...]
+    unit_costs: Tuple[float, ...]
+    stock: Tuple[int, ...]
+
+    @classmethod
+    def from_catalog(cls, drinks: Iterable[model.Drink], inventory: Iterable[model.Ingredient]) -> "RecipeMatrix":
+        """Compile the drinks recipes against the inventory
+
+        Args:
+            drinks (Iterable[model.Drink]): Drinks, in the order of the rows
+            inventory (Iterable[model.Ingredient]): Ingredients, in the order of the columns.
+                Ingredients used by the drinks and missing in the inventory are appended.
+
+        Returns:
+            RecipeMatrix: The compiled catalog
+        """
+        ingredients = {ingredient.name: ingredient for ingredient in inventory}
+        drinks = tuple(drinks)
+        for drink in drinks:
+            for ingredient_line in drink.ingredients:
+                ingredients.setdefault(ingredient_line.ingredient.name, ingredient_line.ingredient)
+        column_by_name = {name: column for column, name in enumerate(ingredients)}
+        rows = []
+        for drink in drinks:
+            quantities = {}
+            for ingredient_line in drink.ingredients:
+                column = column_by_name[ingredient_line.ingredient.name]
+                quantities[column] = quantities.get(column, 0) + ingredient_line.ingredient_quantity
+            rows.append(tuple(sorted(quantities.items())))
+        return cls(
+            drink_names=tuple(drink.name for drink in drinks),
+            ingredient_names=tuple(ingredients),
+            rows=tuple(rows),
+            unit_costs=tuple(ingredient.unit_cost for ingredient in ingredients.values()),
+            stock=tuple(ingredient.get_available_quantity() for ingredient in ingredients.values()),
+        )
+
+    def dense(self) -> "numpy.ndarray":
+        """Get the drinks by ingredients quantity matrix. Requires NumPy
+
+        Returns:
+            numpy.ndarray: Quantities matrix
+        """
+        matrix = numpy.zeros((len(self.rows), len(self.ingredient_names)))
+        for drink_index, row in enumerate(self.rows):
+            for column, quantity in row:
+                matrix[drink_index, column] = quantity
+        return matrix
+
+    def get_prices(self) -> Tuple[float, ...]:
+        """Get the cost of every drink, as the product of the recipes by the unit costs
+
+        Returns:
+            Tuple[float, ...]: Drink prices, by row
+        """
+        if numpy is not None and self.rows:
+            return tuple((self.dense() @ numpy.array(self.unit_costs)).tolist())
+        return tuple(sum(self.unit_costs[column] * quantity for column, quantity in row) for row in self.rows)
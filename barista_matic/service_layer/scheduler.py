@@ -0,0 +1,221 @@
+import heapq
+import itertools
+import math
+from dataclasses import (
+    dataclass,
+    field,
+)
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
+
+from barista_matic.domain import (
+    exceptions,
+    model,
+)
+from barista_matic.service_layer.services import BaristaMatic
+
+from barista_matic import settings
+
+
+class SimulationClock:
+    """Discrete-event clock: time only moves to the next scheduled event, so hours of brewing run in milliseconds.
+
+    It's also a clock callable, e.g. for the service reservations.
+    """
+    def __init__(self, now: float = 0.0):
+        self.now = now
+        self._events: List[Tuple[float, int, Callable[[], None]]] = []
+        self._sequence = itertools.count()
+
+    def __call__(self) -> float:
+        return self.now
+
+    def schedule(self, at: float, callback: Callable[[], None]) -> None:
+        """Run the callback at a time. Events at the same time run in the order they were scheduled
+
+        Args:
+            at (float): Event time, not before now
+            callback (Callable[[], None]): Event handler, it can schedule more events
+        """
+        heapq.heappush(self._events, (max(at, self.now), next(self._sequence), callback))
+
+    def run(self, until: Optional[float] = None) -> None:
+        """Run the events in time order
+
+        Args:
+            until (Optional[float]): Last time to run, None to run until there are no events left
+        """
+        while self._events and (until is None or self._events[0][0] <= until):
+            at, _, callback = heapq.heappop(self._events)
+            self.now = at
+            callback()
+        if until is not None:
+            self.now = max(self.now, until)
+
+
+def get_brew_seconds(drink: model.Drink) -> float:
+    """Default brew time: proportional to the units of ingredients in the drink"""
+    return settings.BREW_SECONDS_PER_UNIT * sum(line.ingredient_quantity for line in drink.ingredients)
+
+
+@dataclass
+class Order:
+    """Drink ordered to the scheduler, with its ingredients reserved"""
+    sequence: int
+    reservation: model.Reservation
+    brew_seconds: float
+    priority: int = 0
+    enqueued_at: float = 0.0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    head: Optional[int] = None
+
+    @property
+    def drink(self) -> model.Drink:
+        return self.reservation.drink
+
+
+# Queue order of every policy, ties are broken by arrival
+POLICIES: Dict[str, Callable[[Order], tuple]] = {
+    "fifo": lambda order: (order.sequence, ),
+    "sjf": lambda order: (order.brew_seconds, order.sequence),
+    "priority": lambda order: (order.priority, order.sequence),
+}
+
+
+@dataclass(frozen=True)
+class SchedulerStats:
+    """Queueing latency and throughput of the finished orders"""
+    finished: int
+    rejected: int
+    mean_wait_seconds: float
+    p95_wait_seconds: float
+    mean_latency_seconds: float
+    throughput_per_hour: float
+    head_utilization: Tuple[float, ...] = field(default_factory=tuple)
+
+
+class BrewScheduler:
+    """Queue of orders brewed by several heads.
+
+    Orders reserve their ingredients when they are enqueued, so the queue never holds a drink that can't be made.
+    A free head takes the next order of the policy: first in first out, shortest brew first, or lowest priority
+    number first. A finished brew confirms the reservation.
+    """
+    def __init__(
+        self,
+        barista_service: BaristaMatic,
+        clock: SimulationClock,
+        heads: int = settings.BREW_HEADS,
+        policy: str = settings.BREW_POLICY,
+        brew_seconds: Callable[[model.Drink], float] = get_brew_seconds,
+    ):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy {policy}, expected one of {', '.join(POLICIES)}")
+        self.barista_service = barista_service
+        self.clock = clock
+        self.heads = heads
+        self.policy = policy
+        self.brew_seconds = brew_seconds
+        self.finished: List[Order] = []
+        self.rejected = 0
+        self._queue: List[Tuple[tuple, Order]] = []
+        self._free_heads = list(range(heads))
+        self._busy_seconds = [0.0] * heads
+        self._sequence = itertools.count()
+
+    def submit(self, reference: str, priority: int = 0) -> Order:
+        """Reserve the drink by reference and queue it
+
+        Args:
+            reference (str): Drink reference
+            priority (int): Order priority for the priority policy, lower goes first
+
+        Raises:
+            exceptions.OutOfStock: Ingredient stock is not enough, the order is rejected
+            exceptions.InvalidSelectedDrink: If the reference is not valid for the menu
+
+        Returns:
+            Order: The queued order
+        """
+        try:
+            reservation = self.barista_service.reserve(reference, hold_seconds=None)
+        except exceptions.OutOfStock:
+            self.rejected += 1
+            raise
+        order = Order(
+            sequence=next(self._sequence),
+            reservation=reservation,
+            brew_seconds=self.brew_seconds(reservation.drink),
+            priority=priority,
+            enqueued_at=self.clock(),
+        )
+        heapq.heappush(self._queue, (POLICIES[self.policy](order), order))
+        self._start_brews()
+        return order
+
+    def get_queue_length(self) -> int:
+        return len(self._queue)
+
+    def get_stats(self) -> SchedulerStats:
+        """Get the stats of the orders finished so far
+
+        Returns:
+            SchedulerStats: The stats
+        """
+        waits = sorted(order.started_at - order.enqueued_at for order in self.finished)
+        latencies = [order.finished_at - order.enqueued_at for order in self.finished]
+        elapsed = self.clock()
+        return SchedulerStats(
+            finished=len(self.finished),
+            rejected=self.rejected,
+            mean_wait_seconds=sum(waits) / len(waits) if waits else 0.0,
+            p95_wait_seconds=waits[math.ceil(0.95 * len(waits)) - 1] if waits else 0.0,
+            mean_latency_seconds=sum(latencies) / len(latencies) if latencies else 0.0,
+            throughput_per_hour=3600 * len(self.finished) / elapsed if elapsed else 0.0,
+            head_utilization=tuple(busy / elapsed if elapsed else 0.0 for busy in self._busy_seconds),
+        )
+
+    def _start_brews(self) -> None:
+        while self._free_heads and self._queue:
+            _, order = heapq.heappop(self._queue)
+            order.head = self._free_heads.pop()
+            order.started_at = self.clock()
+            self.clock.schedule(order.started_at + order.brew_seconds, lambda order=order: self._finish_brew(order))
+
+    def _finish_brew(self, order: Order) -> None:
+        self.barista_service.confirm(order.reservation)
+        order.finished_at = self.clock()
+        self._busy_seconds[order.head] += order.brew_seconds
+        self.finished.append(order)
+        self._free_heads.append(order.head)
+        self._start_brews()
+
+
+def simulate(scheduler: BrewScheduler, arrivals: Iterable[Tuple[float, str]]) -> SchedulerStats:
+    """Submit the orders at their arrival times and brew them all
+
+    Args:
+        scheduler (BrewScheduler): Scheduler over a SimulationClock
+        arrivals (Iterable[Tuple[float, str]]): Arrival time and drink reference, or arrival time, reference
+            and priority. Orders out of stock are rejected.
+
+    Returns:
+        SchedulerStats: The stats once every order is brewed
+    """
+    def arrive(reference: str, priority: int = 0):
+        try:
+            scheduler.submit(reference, priority)
+        except exceptions.OutOfStock:
+            pass
+
+    for at, *order in arrivals:
+        scheduler.clock.schedule(at, lambda order=order: arrive(*order))
+    scheduler.clock.run()
+    return scheduler.get_stats()
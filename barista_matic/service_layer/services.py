@@ -1,12 +1,52 @@
+import contextlib
+import heapq
+import threading
+import time
+import uuid
+from datetime import datetime
 from operator import attrgetter
 from typing import (
+    Callable,
+    ContextManager,
+    Dict,
     Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
     Tuple,
     Union,
 )
 
 from barista_matic.adapters import repository
-from barista_matic.domain import model
+from barista_matic.domain import (
+    exceptions,
+    model,
+)
+from barista_matic.service_layer.consumption import ConsumptionTracker
+from barista_matic.service_layer.dedupe import DedupeCache
+from barista_matic.service_layer.locking import (
+    IngredientLocks,
+    RequestLocks,
+)
+from barista_matic.service_layer.metrics import BaristaMetrics
+from barista_matic.service_layer.planner import (
+    SalesPlan,
+    plan_sales,
+)
+from barista_matic.service_layer.recipe_matrix import RecipeMatrix
+from barista_matic.service_layer.unit_of_work import (
+    AbstractUnitOfWork,
+    RepositoryUnitOfWork,
+)
+from barista_matic.service_layer.what_if import (
+    WhatIfResult,
+    get_drink_indexes,
+    simulate_orders,
+)
+
+from barista_matic import settings
 
 
 def sort_by_attribute(
@@ -29,8 +69,44 @@ def sort_by_attribute(
 
 class BaristaMatic:
     """Barista Matic service. Depends on a repository, to get ingredients and drinks"""
-    def __init__(self, repository: repository.AbstractRepository):
+    def __init__(
+        self,
+        repository: repository.AbstractRepository,
+        clock: Callable[[], float] = time.monotonic,
+        consumption_tracker: Optional[ConsumptionTracker] = None,
+        machine_id: str = settings.MACHINE_ID,
+        unit_of_work: Optional[AbstractUnitOfWork] = None,
+        dispense_requests: Optional[DedupeCache[model.Recipe]] = None,
+        customizations: Iterable[model.Customization] = (),
+        metrics: Optional[BaristaMetrics] = None,
+    ):
         self.repository = repository
+        self.unit_of_work = unit_of_work or RepositoryUnitOfWork(repository)
+        self.clock = clock
+        self.consumption_tracker = consumption_tracker
+        self.machine_id = machine_id
+        self._reservations: Dict[str, model.Reservation] = {}
+        self._reservation_expirations: List[Tuple[float, str]] = []
+        # Quantities held by the active reservations, by ingredient name
+        self._holds: Dict[str, int] = {}
+        self._reservations_lock = threading.Lock()
+        self.dispense_requests = dispense_requests if dispense_requests is not None else DedupeCache()
+        self.customizations = {customization.name: customization for customization in customizations}
+        self.metrics = metrics
+
+    def swap_unit_of_work(self, unit_of_work: AbstractUnitOfWork) -> AbstractUnitOfWork:
+        """Serve the next calls from another unit of work and its repository, e.g. with a reloaded catalog.
+        Call it between commands, without reservations or transactions in progress.
+
+        Args:
+            unit_of_work (AbstractUnitOfWork): New unit of work
+
+        Returns:
+            AbstractUnitOfWork: The previous unit of work, to be closed by the caller
+        """
+        previous_unit_of_work = self.unit_of_work
+        self.repository, self.unit_of_work = unit_of_work.repository, unit_of_work
+        return previous_unit_of_work
 
     def get_inventory(self) -> Tuple[model.Ingredient]:
         """Get the list of ingredients, sorted by name
@@ -57,30 +133,179 @@ class BaristaMatic:
         )
         return model.Menu.from_iterable(sorted_drinks)
 
-    def dispense_drink_by_menu_reference(self, reference: str) -> model.Drink:
+    def get_inventory_page(
+        self, after: Optional[str] = None, limit: int = 50, prefix: Optional[str] = None
+    ) -> model.Page:
+        """Get a page of the inventory, sorted by name
+
+        Args:
+            after (Optional[str]): Cursor of the previous page, None for the first page
+            limit (int): Ingredients by page
+            prefix (Optional[str]): Only ingredients whose name starts with it, case insensitive
+
+        Returns:
+            model.Page: Ingredients page
+        """
+        return self._to_page(self.repository.get_ingredients_page(after, limit + 1, prefix), limit, attrgetter("name"))
+
+    def get_menu_page(
+        self,
+        after: Optional[Tuple[str, int]] = None,
+        limit: int = 50,
+        prefix: Optional[str] = None,
+        in_stock_only: bool = False,
+    ) -> model.Page:
+        """Get a page of the menu, sorted by drink name. References are the same as in the whole menu
+
+        Args:
+            after (Optional[Tuple[str, int]]): Cursor of the previous page, None for the first page
+            limit (int): Drinks by page
+            prefix (Optional[str]): Only drinks whose name starts with it, case insensitive
+            in_stock_only (bool): Only drinks that can be dispensed
+
+        Returns:
+            model.Page: Page of (reference, drink) items
+        """
+        menu_items = self.repository.get_menu_page(after, limit + 1, prefix, in_stock_only)
+        return self._to_page(menu_items, limit, lambda menu_item: (menu_item[1].name, int(menu_item[0])))
+
+    def get_drink_by_reference(self, reference: str) -> model.Drink:
+        """Get the drink by menu reference, without loading the whole menu
+
+        Args:
+            reference (str): Drink reference
+
+        Raises:
+            exceptions.InvalidSelectedDrink: If the reference is not valid for the menu
+
+        Returns:
+            model.Drink: The drink with the reference
+        """
+        drink = self.repository.get_drink_by_reference(int(reference)) if reference.isdecimal() else None
+        if drink is None:
+            raise exceptions.InvalidSelectedDrink(f"Drink with reference {reference} doesn't exist")
+        return drink
+
+    @staticmethod
+    def _to_page(items: Tuple, limit: int, get_cursor: Callable) -> model.Page:
+        if len(items) > limit:
+            return model.Page(items[:limit], get_cursor(items[limit - 1]))
+        return model.Page(items)
+
+    def dispense_drink_by_menu_reference(
+        self, reference: str, request_id: Optional[str] = None, customizations: Sequence[str] = ()
+    ) -> model.Recipe:
         """Dispense the drink by reference. Use the repository for atomicity.
+        With a request id, retries of a dispensed request return the original drink without dispensing it again.
 
         Args:
             reference (str): Drink reference
+            request_id (Optional[str]): Id of the request, unique for every drink the client wants
+            customizations (Sequence[str]): Names of the customizations to apply, in order
+
+        Raises:
+            exceptions.InvalidCustomization: A customization is unknown or uses an unavailable ingredient
 
         Returns:
-            model.Drink: Dispensed drink
+            model.Recipe: Dispensed drink, customized if there are customizations
+        """
+        if request_id is None:
+            drink_to_dispense = self._get_drink_to_dispense(reference, customizations)
+            self.dispense_drink(drink_to_dispense)
+            return drink_to_dispense
+        with self.holding_request(request_id):
+            dispensed_drink = self.get_dispensed_drink(request_id)
+            if dispensed_drink is not None:
+                return dispensed_drink
+            drink_to_dispense = self._get_drink_to_dispense(reference, customizations)
+            self.dispense_drink(drink_to_dispense, request_id)
+            self.dispense_requests.put(request_id, drink_to_dispense)
+            return drink_to_dispense
+
+    def customize_drink(self, drink: model.Drink, customization_names: Sequence[str]) -> model.CustomizedDrink:
+        """Layer customizations over a drink. The drink recipe is shared, not copied
+
+        Args:
+            drink (model.Drink): Base drink
+            customization_names (Sequence[str]): Names of the customizations to apply, in order
+
+        Raises:
+            exceptions.InvalidCustomization: A customization is unknown or uses an unavailable ingredient,
+                or the customized name is too long to be recorded
+
+        Returns:
+            model.CustomizedDrink: The customized drink
+        """
+        unknown = [name for name in customization_names if name not in self.customizations]
+        if unknown:
+            raise exceptions.InvalidCustomization(f"Unknown customizations: {', '.join(unknown)}")
+        customizations = tuple(self.customizations[name] for name in customization_names)
+        base_ingredients = {line.ingredient.name for line in drink.ingredients}
+        inventory = model.EMPTY_INVENTORY
+        if any(name not in base_ingredients for customization in customizations for name, _ in customization.deltas):
+            inventory = {ingredient.name: ingredient for ingredient in self.get_inventory()}
+        customized_drink = model.CustomizedDrink(drink, customizations, inventory)
+        if len(customized_drink.name) > model.RECORDED_DRINK_NAME_LENGTH:
+            raise exceptions.InvalidCustomization(f"Too many customizations for the ledger: {customized_drink.name}")
+        # Resolve the lines once, so an unavailable ingredient fails here and not halfway through a dispense
+        customized_drink.ingredients
+        return customized_drink
+
+    def get_dispensed_drink(self, request_id: str) -> Optional[model.Recipe]:
+        """Get the drink dispensed by a request, from the recent requests or else from the ledger
+
+        Args:
+            request_id (str): Request id
+
+        Raises:
+            exceptions.DrinkNotExist: The request was dispensed, but its drink was removed since
+
+        Returns:
+            Optional[model.Recipe]: The dispensed drink, None if the request wasn't dispensed
         """
-        menu = self.get_menu()
-        drink_to_dispense = menu.get_drink_by_reference(reference)
-        with self.repository:
-            drink_to_dispense.dispense()
-        return drink_to_dispense
+        dispensed_drink = self.dispense_requests.get(request_id)
+        if dispensed_drink is not None:
+            return dispensed_drink
+        record = self.repository.get_dispense_by_request_id(request_id)
+        if record is None:
+            return None
+        # Customized drinks are recorded as "Base + customization + ..."
+        drink_name, *customization_names = record.drink_name.split(model.CUSTOMIZATION_SEPARATOR)
+        for drink in self.repository.get_drinks():
+            if drink.name == drink_name:
+                if customization_names:
+                    try:
+                        drink = self.customize_drink(drink, customization_names)
+                    except exceptions.InvalidCustomization:
+                        break
+                self.dispense_requests.put(request_id, drink)
+                return drink
+        raise exceptions.DrinkNotExist(f"Drink {record.drink_name} of request {request_id} doesn't exist")
+
+    def dispense_drink(self, drink: model.Recipe, request_id: Optional[str] = None) -> None:
+        """Dispense the drink inside a transaction, holding its ingredients
+
+        Args:
+            drink (model.Recipe): Drink to dispense, customized or not
+            request_id (Optional[str]): Id of the request, recorded in the ledger with the stock change
+        """
+        with self.holding_ingredients(line.ingredient for line in drink.ingredients):
+            self._check_can_be_dispensed(drink)
+            with self.transaction():
+                drink.dispense()
+                self.add_to_ledger(drink, request_id)
+        self._record_consumption(drink)
 
     def restock_ingredient_to_quantity(self, ingredient: model.Ingredient, quantity: int) -> None:
-        """Update the stock for specific ingredient.
+        """Update the stock for specific ingredient. The stock includes the quantity held by reservations,
+        it is never restocked below it, so the reservations can still be confirmed.
 
         Args:
             ingredient (model.Ingredient): Ingredient to be updated
             quantity (int): New stock quantity
         """
-        with self.repository:
-            ingredient.restock_to_quantity(quantity)
+        with self.holding_ingredients((ingredient, )), self.transaction():
+            ingredient.restock_to_quantity(max(quantity, self._holds.get(ingredient.name, 0)))
 
     def restock_all_ingredients_to_quantity(self, quantity: int) -> None:
         """Update the stock for all ingredients in the inventory
@@ -90,3 +315,372 @@ class BaristaMatic:
         """
         for ingredient in self.repository.get_ingredients():
             self.restock_ingredient_to_quantity(ingredient, quantity)
+
+    def receive_lot(
+        self, ingredient: model.Ingredient, quantity: int, expires_at: Optional[datetime] = None
+    ) -> model.Lot:
+        """Add a lot to the stock of an ingredient, its stock is backed by lots from then on
+
+        Args:
+            ingredient (model.Ingredient): Received ingredient
+            quantity (int): Received quantity
+            expires_at (Optional[datetime]): Expiry date in UTC, None if it doesn't expire
+
+        Returns:
+            model.Lot: The received lot
+        """
+        lot = model.Lot(quantity, expires_at)
+        with self.holding_ingredients((ingredient, )), self.transaction():
+            ingredient.receive_lot(lot)
+        return lot
+
+    def discard_expired_lots(self, now: Optional[datetime] = None) -> int:
+        """Remove the expired lots of every ingredient. Only ingredients backed by lots are changed
+
+        Args:
+            now (Optional[datetime]): Current UTC time, now by default
+
+        Returns:
+            int: Discarded quantity
+        """
+        discarded = 0
+        for ingredient in self.get_inventory():
+            with self.holding_ingredients((ingredient, )):
+                if ingredient.tracks_lots:
+                    with self.transaction():
+                        discarded += ingredient.discard_expired_lots(now)
+        return discarded
+
+    def reserve(
+        self, reference: str, hold_seconds: Optional[float] = settings.RESERVATION_HOLD_SECONDS
+    ) -> model.Reservation:
+        """Hold the ingredients of the drink by reference, without waiting for the repository.
+        Held quantities stay in the stock until the reservation is confirmed, other drinks can't use them.
+        The reservation must be confirmed or released, otherwise the ingredients are reclaimed when it expires.
+
+        Args:
+            reference (str): Drink reference
+            hold_seconds (Optional[float]): Seconds to hold the ingredients, None to hold them until released
+
+        Raises:
+            exceptions.OutOfStock: Ingredient stock is not enough
+
+        Returns:
+            model.Reservation: The reservation ticket
+        """
+        self.reclaim_expired_reservations()
+        drink = self.get_drink_by_reference(reference)
+        with self.holding_ingredients(line.ingredient for line in drink.ingredients):
+            self._check_can_be_dispensed(drink, self._holds)
+            expires_at = None if hold_seconds is None else self.clock() + hold_seconds
+            reservation = model.Reservation(uuid.uuid4().hex, drink, expires_at, drink.get_quantities())
+            with self._reservations_lock:
+                self._reservations[reservation.ticket] = reservation
+                for name, quantity in reservation.quantities.items():
+                    self._holds[name] = self._holds.get(name, 0) + quantity
+                if expires_at is not None:
+                    heapq.heappush(self._reservation_expirations, (expires_at, reservation.ticket))
+        return reservation
+
+    def extend(
+        self, reservation: model.Reservation, hold_seconds: Optional[float] = settings.RESERVATION_HOLD_SECONDS
+    ) -> None:
+        """Hold the ingredients of a reservation for longer, e.g. while its drink is brewed
+
+        Args:
+            reservation (model.Reservation): An active reservation
+            hold_seconds (Optional[float]): Seconds to hold the ingredients from now, None to hold them until released
+
+        Raises:
+            exceptions.ReservationNotActive: The reservation was already confirmed, released or expired
+        """
+        now = self.clock()
+        with self._reservations_lock:
+            active_reservation = self._reservations.get(reservation.ticket)
+            if active_reservation is None or active_reservation.is_expired(now):
+                raise exceptions.ReservationNotActive(f"Reservation {reservation.ticket} is not active")
+            active_reservation.expires_at = None if hold_seconds is None else now + hold_seconds
+            if active_reservation.expires_at is not None:
+                heapq.heappush(self._reservation_expirations, (active_reservation.expires_at, reservation.ticket))
+
+    def confirm(self, reservation: model.Reservation) -> model.Drink:
+        """Dispense the drink of a reservation, from the quantities it held
+
+        Args:
+            reservation (model.Reservation): An active reservation
+
+        Raises:
+            exceptions.ReservationNotActive: The reservation was already confirmed, released or expired
+            exceptions.OutOfStock: The held quantities aren't in the stock anymore, e.g. their lots expired
+
+        Returns:
+            model.Drink: Dispensed drink
+        """
+        drink = reservation.drink
+        with self.holding_ingredients(line.ingredient for line in drink.ingredients):
+            self._pop_reservation(reservation.ticket)
+            with self.transaction():
+                drink.dispense()
+                self.add_to_ledger(drink)
+        self._record_consumption(drink)
+        return drink
+
+    def release(self, reservation: model.Reservation) -> None:
+        """Give back the ingredients held by a reservation
+
+        Args:
+            reservation (model.Reservation): An active reservation
+
+        Raises:
+            exceptions.ReservationNotActive: The reservation was already confirmed, released or expired
+        """
+        self._pop_reservation(reservation.ticket)
+
+    def reclaim_expired_reservations(self) -> int:
+        """Release the reservations whose hold is over. Only expired entries are visited,
+        entries of reservations extended since are skipped.
+
+        Returns:
+            int: Number of reclaimed reservations
+        """
+        now = self.clock()
+        reclaimed = 0
+        with self._reservations_lock:
+            while self._reservation_expirations and self._reservation_expirations[0][0] <= now:
+                _, ticket = heapq.heappop(self._reservation_expirations)
+                reservation = self._reservations.get(ticket)
+                if reservation is not None and reservation.is_expired(now):
+                    self._drop_reservation(reservation)
+                    reclaimed += 1
+        return reclaimed
+
+    def get_active_reservations(self) -> Tuple[model.Reservation]:
+        """Get the reservations that are still holding ingredients
+
+        Returns:
+            Tuple[model.Reservation]: Active reservations
+        """
+        with self._reservations_lock:
+            return tuple(self._reservations.values())
+
+    def get_holds(self) -> Dict[str, int]:
+        """Get the quantities held by the active reservations, they are in the stock but can't be dispensed
+
+        Returns:
+            Dict[str, int]: Held quantity by ingredient name
+        """
+        with self._reservations_lock:
+            return dict(self._holds)
+
+    def add_to_ledger(self, drink: model.Drink, request_id: Optional[str] = None) -> None:
+        """Record the dispensed drink in the ledger, as part of the current transaction
+
+        Args:
+            drink (model.Drink): Dispensed drink
+            request_id (Optional[str]): Id of the dispense request
+        """
+        self.repository.add_dispense(model.DispenseRecord.for_drink(drink, self.machine_id, request_id))
+
+    def get_sales(self, period: str = "day", since: Optional[datetime] = None) -> Tuple[model.SalesRollup]:
+        """Get the sales of this machine by drink, from the incrementally maintained rollups
+
+        Args:
+            period (str): One of model.ROLLUP_PERIODS
+            since (Optional[datetime]): First period start to include
+
+        Returns:
+            Tuple[model.SalesRollup]: Sales sorted by period start and drink name
+        """
+        return self.repository.get_sales(period, since, self.machine_id)
+
+    def get_sales_plan(self) -> SalesPlan:
+        """Get the mix of drinks that maximizes revenue with the current stock, e.g. to promote them
+
+        Returns:
+            SalesPlan: Servings by drink name
+        """
+        drinks = (drink for _, drink in self.get_menu())
+        return plan_sales(RecipeMatrix.from_catalog(drinks, self.get_inventory()))
+
+    def simulate_orders(self, drink_names: Iterable[str]) -> WhatIfResult:
+        """Find the first order of a forecast that would be Out of stock with the current stock, and when every
+        ingredient runs out. Nothing is dispensed
+
+        Args:
+            drink_names (Iterable[str]): Ordered drink names
+
+        Raises:
+            exceptions.DrinkNotExist: A drink is not in the menu
+
+        Returns:
+            WhatIfResult: First failure and depletion points
+        """
+        drinks = (drink for _, drink in self.get_menu())
+        matrix = RecipeMatrix.from_catalog(drinks, self.get_inventory())
+        return simulate_orders(matrix, get_drink_indexes(matrix, drink_names))
+
+    def get_restock_soon(self, horizon_seconds: float = settings.RESTOCK_HORIZON_SECONDS) -> Tuple[str]:
+        """Get the ingredients that will run out before the horizon at the current consumption rate
+
+        Args:
+            horizon_seconds (float): Time until the next restock
+
+        Returns:
+            Tuple[str]: Ingredient names, the most urgent first. Empty if consumption isn't tracked
+        """
+        if self.consumption_tracker is None:
+            return tuple()
+        return self.consumption_tracker.get_restock_soon(self.get_inventory(), horizon_seconds)
+
+    def _get_drink_to_dispense(self, reference: str, customization_names: Sequence[str]) -> model.Recipe:
+        drink = self.get_drink_by_reference(reference)
+        return self.customize_drink(drink, customization_names) if customization_names else drink
+
+    def _check_can_be_dispensed(self, drink: model.Recipe, holds: Mapping[str, int] = model.NO_HOLDS) -> None:
+        try:
+            drink.check_can_be_dispensed(holds)
+        except exceptions.OutOfStock:
+            if self.metrics is not None:
+                self.metrics.record_out_of_stock(drink, holds)
+            raise
+
+    def _record_consumption(self, drink: model.Drink) -> None:
+        if self.consumption_tracker is not None:
+            self.consumption_tracker.record_drink(drink)
+
+    def _pop_reservation(self, ticket: str) -> model.Reservation:
+        with self._reservations_lock:
+            reservation = self._reservations.get(ticket)
+            if reservation is None:
+                raise exceptions.ReservationNotActive(f"Reservation {ticket} is not active")
+            self._drop_reservation(reservation)
+        return reservation
+
+    def _drop_reservation(self, reservation: model.Reservation) -> None:
+        # Called holding the reservations lock
+        del self._reservations[reservation.ticket]
+        for name, quantity in reservation.quantities.items():
+            held = self._holds[name] - quantity
+            if held:
+                self._holds[name] = held
+            else:
+                del self._holds[name]
+
+    def holding_ingredients(self, ingredients: Iterable[model.Ingredient]) -> ContextManager:
+        """Guard the ingredients against concurrent changes. A single caller doesn't need it.
+
+        Args:
+            ingredients (Iterable[model.Ingredient]): Ingredients to be changed
+        """
+        return contextlib.nullcontext()
+
+    def holding_request(self, request_id: str) -> ContextManager:
+        """Guard a request id against concurrent retries. A single caller doesn't need it.
+
+        Args:
+            request_id (str): Request id
+        """
+        return contextlib.nullcontext()
+
+    def transaction(self) -> ContextManager:
+        """Scope of a stock change, committed on exit or rolled back if an exception escaped.
+        Its stock events are published once committed
+        """
+        return self.unit_of_work.transaction()
+
+
+class ThreadSafeBaristaMatic(BaristaMatic):
+    """Barista Matic service that can be shared between threads.
+
+    Stock changes hold a lock per ingredient, so drinks that share no ingredients are dispensed in parallel.
+    The repository isn't assumed to be thread-safe, every call to it and every read of its objects outside
+    a stock change is serialized by the repository lock. When its objects aren't thread-safe either, like the rows
+    of a session, which may query it on any access, stock changes also hold the repository lock: they are
+    serialized, only the work done outside the service, like brewing, runs in parallel.
+    """
+    def __init__(
+        self,
+        repository: repository.AbstractRepository,
+        ingredient_locks: IngredientLocks = None,
+        **kwargs,
+    ):
+        super().__init__(repository, **kwargs)
+        self.ingredient_locks = ingredient_locks or IngredientLocks()
+        self.request_locks = RequestLocks()
+        self.repository_lock = threading.RLock()
+
+    def get_inventory(self) -> Tuple[model.Ingredient]:
+        with self.repository_lock:
+            return super().get_inventory()
+
+    def get_menu(self) -> model.Menu:
+        with self.repository_lock:
+            return super().get_menu()
+
+    def swap_unit_of_work(self, unit_of_work: AbstractUnitOfWork) -> AbstractUnitOfWork:
+        with self.repository_lock:
+            return super().swap_unit_of_work(unit_of_work)
+
+    def restock_all_ingredients_to_quantity(self, quantity: int) -> None:
+        for ingredient in self.get_inventory():
+            self.restock_ingredient_to_quantity(ingredient, quantity)
+
+    def add_to_ledger(self, drink: model.Drink, request_id: Optional[str] = None) -> None:
+        with self.repository_lock:
+            super().add_to_ledger(drink, request_id)
+
+    def get_dispensed_drink(self, request_id: str) -> Optional[model.Recipe]:
+        with self.repository_lock:
+            return super().get_dispensed_drink(request_id)
+
+    def get_inventory_page(self, *args, **kwargs) -> model.Page:
+        with self.repository_lock:
+            return super().get_inventory_page(*args, **kwargs)
+
+    def get_menu_page(self, *args, **kwargs) -> model.Page:
+        with self.repository_lock:
+            return super().get_menu_page(*args, **kwargs)
+
+    def get_drink_by_reference(self, reference: str) -> model.Drink:
+        with self.repository_lock:
+            return super().get_drink_by_reference(reference)
+
+    def get_sales(self, period: str = "day", since: Optional[datetime] = None) -> Tuple[model.SalesRollup]:
+        with self.repository_lock:
+            return super().get_sales(period, since)
+
+    def customize_drink(self, drink: model.Drink, customization_names: Sequence[str]) -> model.CustomizedDrink:
+        with self.repository_lock:
+            return super().customize_drink(drink, customization_names)
+
+    def get_sales_plan(self) -> SalesPlan:
+        with self.repository_lock:
+            return super().get_sales_plan()
+
+    def simulate_orders(self, drink_names: Iterable[str]) -> WhatIfResult:
+        with self.repository_lock:
+            return super().simulate_orders(drink_names)
+
+    def get_restock_soon(self, horizon_seconds: float = settings.RESTOCK_HORIZON_SECONDS) -> Tuple[str]:
+        with self.repository_lock:
+            return super().get_restock_soon(horizon_seconds)
+
+    def _record_consumption(self, drink: model.Drink) -> None:
+        with self.repository_lock:
+            super()._record_consumption(drink)
+
+    @contextlib.contextmanager
+    def holding_ingredients(self, ingredients: Iterable[model.Ingredient]) -> Iterator[None]:
+        with contextlib.ExitStack() as stack:
+            if not self.repository.thread_safe_objects:
+                # Taken first, the ingredient names are read under it too
+                stack.enter_context(self.repository_lock)
+            stack.enter_context(self.ingredient_locks.holding(ingredients))
+            yield
+
+    def holding_request(self, request_id: str) -> ContextManager:
+        # Taken before the ingredient locks, never while holding them
+        return self.request_locks.get_lock(request_id)
+
+    def transaction(self) -> ContextManager:
+        return self.unit_of_work.transaction(self.repository_lock)
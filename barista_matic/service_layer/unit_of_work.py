@@ -0,0 +1,136 @@
+import contextlib
+from abc import (
+    ABC,
+    abstractmethod,
+)
+from typing import (
+    Callable,
+    ContextManager,
+    Dict,
+    Iterator,
+    Optional,
+)
+
+from sqlalchemy import (
+    event,
+    inspect,
+)
+from sqlalchemy.orm import Session
+
+from barista_matic.adapters import repository
+from barista_matic.domain import (
+    events,
+    model,
+)
+
+# Rows every command reads again, kept loaded between commands
+CATALOG_ROWS = (model.Ingredient, model.Drink, model.DrinkIngredient)
+
+
+class AbstractUnitOfWork(ABC):
+    """Scope of a stock change: commits on success, rolls back when an exception escaped.
+    The domain events raised in it are published once it's committed, and dropped if it's rolled back.
+    """
+    repository: repository.AbstractRepository
+
+    def __enter__(self):
+        self._entered_transaction = self.transaction()
+        return self._entered_transaction.__enter__()
+
+    def __exit__(self, *exc_info):
+        return self._entered_transaction.__exit__(*exc_info)
+
+    @contextlib.contextmanager
+    def transaction(self, lock: ContextManager = contextlib.nullcontext()) -> Iterator["AbstractUnitOfWork"]:
+        """Scope of a stock change, as entering the unit of work, that can be nested or run by several threads
+
+        Args:
+            lock (ContextManager): Held to commit or roll back, e.g. the lock of a repository shared by threads
+        """
+        with events.holding_events() as held_events:
+            try:
+                yield self
+            except BaseException:
+                with lock:
+                    self.rollback()
+                raise
+            with lock:
+                self.commit()
+        for held_event in held_events or ():
+            events.publish(held_event)
+
+    @abstractmethod
+    def commit(self):
+        pass
+
+    @abstractmethod
+    def rollback(self):
+        pass
+
+    def close(self) -> None:
+        """Release the repository, the unit of work isn't used anymore"""
+        self.repository.close()
+
+
+class RepositoryUnitOfWork(AbstractUnitOfWork):
+    """Unit of work of a repository that handles its own transaction"""
+    def __init__(self, repository: repository.AbstractRepository):
+        self.repository = repository
+
+    def commit(self):
+        self.repository.commit()
+
+    def rollback(self):
+        self.repository.rollback()
+
+
+class SqlAlchemyUnitOfWork(AbstractUnitOfWork):
+    """Unit of work over a session that doesn't expire everything on commit.
+
+    Only the rows changed since the previous commit are expired, so they are refreshed the next time they are read,
+    while the rest of the catalog is served from the identity map without new queries.
+    The session identity map only holds weak references, the catalog rows loaded by queries are kept here,
+    otherwise relationships would be lazy loaded again on every command. Other rows, like ledger records or lots,
+    aren't kept, and deleted rows are forgotten, so the rows held are bounded by the current catalog size.
+    A rollback expires everything, as the session state can't be trusted anymore.
+    """
+    def __init__(self, session_factory: Callable[..., Session], machine_id: Optional[str] = None):
+        self.session = session_factory(expire_on_commit=False)
+        self.repository = repository.SQLAlchemyRepository(self.session, machine_id=machine_id)
+        self._changed_rows: Dict[int, object] = {}
+        self._loaded_rows: Dict[tuple, object] = {}
+        event.listen(self.session, "before_flush", self._collect_changed_rows)
+        event.listen(self.session, "after_commit", self._expire_changed_rows)
+        event.listen(self.session, "after_rollback", self._forget_changed_rows)
+        event.listen(self.session, "loaded_as_persistent", self._keep_loaded_row)
+        event.listen(self.session, "persistent_to_deleted", self._forget_deleted_row)
+
+    def commit(self):
+        self.session.commit()
+
+    def rollback(self):
+        self.session.rollback()
+
+    def close(self) -> None:
+        super().close()
+        self._loaded_rows.clear()
+
+    def _collect_changed_rows(self, session, *args):
+        self._changed_rows.update((id(instance), instance) for instance in session.dirty)
+
+    def _expire_changed_rows(self, session):
+        for instance in self._changed_rows.values():
+            # Rows deleted by the flush, e.g. orphaned lots, aren't in the session anymore
+            if inspect(instance).persistent:
+                session.expire(instance)
+        self._changed_rows.clear()
+
+    def _forget_changed_rows(self, session):
+        self._changed_rows.clear()
+
+    def _keep_loaded_row(self, session, instance):
+        if isinstance(instance, CATALOG_ROWS):
+            self._loaded_rows[inspect(instance).identity_key] = instance
+
+    def _forget_deleted_row(self, session, instance):
+        self._loaded_rows.pop(inspect(instance).identity_key, None)
@@ -0,0 +1,114 @@
+from dataclasses import dataclass
+from typing import (
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from barista_matic.domain import exceptions
+from barista_matic.service_layer import recipe_matrix
+from barista_matic.service_layer.recipe_matrix import RecipeMatrix
+
+# Orders summed at once with NumPy, bounds the memory of the cumulative demand to a chunk
+CHUNK_ORDERS = 65536
+
+
+@dataclass(frozen=True)
+class WhatIfResult:
+    """Outcome of a forecast order stream against the stock"""
+    orders: int
+    # Index of the first order that would be Out of stock, None if every order can be served
+    first_failure: Optional[int]
+    # Ingredients short at the first failure
+    failing_ingredients: Tuple[str, ...]
+    # Index of the order that first needs more than the stock, by ingredient. Only depleted ingredients
+    depletion_points: Dict[str, int]
+
+    @property
+    def served(self) -> int:
+        return self.orders if self.first_failure is None else self.first_failure
+
+
+def get_drink_indexes(matrix: RecipeMatrix, drink_names: Iterable[str]) -> List[int]:
+    """Get the rows of the drinks, in the order of the stream
+
+    Args:
+        matrix (RecipeMatrix): Compiled catalog
+        drink_names (Iterable[str]): Ordered drink names
+
+    Raises:
+        exceptions.DrinkNotExist: A drink is not in the catalog
+
+    Returns:
+        List[int]: Row of every order
+    """
+    row_by_name = {name: row for row, name in enumerate(matrix.drink_names)}
+    try:
+        return [row_by_name[name] for name in drink_names]
+    except KeyError as error:
+        raise exceptions.DrinkNotExist(f"Drink {error.args[0]} doesn't exist") from error
+
+
+def simulate_orders(matrix: RecipeMatrix, drink_indexes: Sequence[int]) -> WhatIfResult:
+    """Replay an order stream against the stock of the matrix, in one pass and without touching the inventory.
+
+    The cumulative demand of every ingredient is the running sum of the recipe rows of the orders.
+    An ingredient is depleted at the first order where its cumulative demand goes over the stock,
+    and the first failure is the earliest depletion. Every order before it is served, so up to the
+    first failure this is the same as dispensing the orders one by one. Depletion points after it
+    assume the refused orders still count as demand, which is what a forecast needs to know.
+
+    Args:
+        matrix (RecipeMatrix): Compiled catalog, with the stock to simulate
+        drink_indexes (Sequence[int]): Row of every order, e.g. from get_drink_indexes
+
+    Returns:
+        WhatIfResult: First failure and depletion points
+    """
+    if recipe_matrix.numpy is not None and matrix.rows:
+        depletion_columns = _simulate_with_numpy(matrix, drink_indexes)
+    else:
+        depletion_columns = _simulate_with_python(matrix, drink_indexes)
+    depletion_points = {matrix.ingredient_names[column]: order for column, order in depletion_columns.items()}
+    first_failure = min(depletion_points.values(), default=None)
+    return WhatIfResult(
+        orders=len(drink_indexes),
+        first_failure=first_failure,
+        failing_ingredients=tuple(sorted(
+            name for name, order in depletion_points.items() if order == first_failure
+        )),
+        depletion_points=depletion_points,
+    )
+
+
+def _simulate_with_python(matrix: RecipeMatrix, drink_indexes: Sequence[int]) -> Dict[int, int]:
+    demand = [0] * len(matrix.ingredient_names)
+    depletion_columns: Dict[int, int] = {}
+    for order, drink_index in enumerate(drink_indexes):
+        for column, quantity in matrix.rows[drink_index]:
+            demand[column] += quantity
+            if demand[column] > matrix.stock[column] and column not in depletion_columns:
+                depletion_columns[column] = order
+    return depletion_columns
+
+
+def _simulate_with_numpy(matrix: RecipeMatrix, drink_indexes: Sequence[int]) -> Dict[int, int]:
+    numpy = recipe_matrix.numpy
+    recipes = matrix.dense().astype(numpy.int64)
+    stock = numpy.array(matrix.stock, dtype=numpy.int64)
+    orders = numpy.asarray(drink_indexes, dtype=numpy.intp)
+    demand = numpy.zeros(len(matrix.ingredient_names), dtype=numpy.int64)
+    depletion_columns: Dict[int, int] = {}
+    for start in range(0, len(orders), CHUNK_ORDERS):
+        cumulative = numpy.cumsum(recipes[orders[start:start + CHUNK_ORDERS]], axis=0) + demand
+        over_stock = cumulative > stock
+        for column in numpy.flatnonzero(over_stock.any(axis=0)).tolist():
+            if column not in depletion_columns:
+                depletion_columns[column] = start + int(over_stock[:, column].argmax())
+        demand = cumulative[-1]
+        if len(depletion_columns) == len(demand):
+            break
+    return depletion_columns
@@ -3,3 +3,48 @@ import os
 
 RESTOCK_QUANTITY = int(os.getenv("RESTOCK_QUANTITY", 10))
 DB = os.getenv("DB", "sqlite://")
+MACHINE_ID = os.getenv("MACHINE_ID", "default")
+# Comma separated database urls, machines are routed to one of them by their id
+SHARD_DBS = [url for url in os.getenv("SHARD_DBS", "").split(",") if url]
+RESERVATION_HOLD_SECONDS = float(os.getenv("RESERVATION_HOLD_SECONDS", 60))
+BREW_WORKERS = int(os.getenv("BREW_WORKERS", 2))
+CONSUMPTION_HALF_LIFE_SECONDS = float(os.getenv("CONSUMPTION_HALF_LIFE_SECONDS", 3600))
+RESTOCK_HORIZON_SECONDS = float(os.getenv("RESTOCK_HORIZON_SECONDS", 1800))
+OUTPUT_FORMAT = os.getenv("OUTPUT_FORMAT", "text")
+# Rows by page of the menu and the inventory, 0 prints them whole as the spec requires
+PAGE_SIZE = int(os.getenv("PAGE_SIZE", 0))
+# File of the catalog snapshot, to print the first frame without loading the catalog. Empty to disable
+CATALOG_SNAPSHOT = os.getenv("CATALOG_SNAPSHOT", "")
+# Dispense request ids remembered in memory, repeats of older ones are found in the ledger
+DEDUPE_MAX_REQUESTS = int(os.getenv("DEDUPE_MAX_REQUESTS", 10000))
+DEDUPE_TTL_SECONDS = float(os.getenv("DEDUPE_TTL_SECONDS", 3600))
+# Brew heads of the machine, how they pick the next order (fifo, sjf or priority) and how long a unit takes to brew
+BREW_HEADS = int(os.getenv("BREW_HEADS", 2))
+BREW_POLICY = os.getenv("BREW_POLICY", "fifo")
+BREW_SECONDS_PER_UNIT = float(os.getenv("BREW_SECONDS_PER_UNIT", 10))
+# Reads cached in front of the database, 0 disables the cache. Opt-in: the session already serves the catalog
+# without queries, the cache saves the rest of the reads of a frame
+REPOSITORY_CACHE_ENTRIES = int(os.getenv("REPOSITORY_CACHE_ENTRIES", 0))
+REPOSITORY_CACHE_TTL_SECONDS = float(os.getenv("REPOSITORY_CACHE_TTL_SECONDS", 60))
+# Prometheus metrics served over HTTP at /metrics, 0 disables the server
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+# Rows read at once by the exports, from a server-side cursor where the database has them
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+# Seconds between checks of the catalog for changes, to reload it without restarting. 0 disables the reload.
+# Off by default: every check reads and hashes every catalog row, only machines whose catalog is edited
+# while they serve need it
+CATALOG_POLL_SECONDS = float(os.getenv("CATALOG_POLL_SECONDS", 0))
+# Months of ledger kept in the database besides the current one, older months are archived. 0 keeps every month
+LEDGER_RETENTION_MONTHS = int(os.getenv("LEDGER_RETENTION_MONTHS", 0))
+LEDGER_ARCHIVE_DIR = os.getenv("LEDGER_ARCHIVE_DIR", "ledger_archive")
+# HTTP JSON API, requests are served by a bounded pool of workers with a database connection each
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+API_PORT = int(os.getenv("API_PORT", 8000))
+API_WORKERS = int(os.getenv("API_WORKERS", 8))
+# Prepare the next frame of the text cli while it waits for input, 0 renders every frame from the repository
+PRECOMPUTE_FRAMES = int(os.getenv("PRECOMPUTE_FRAMES", 1))
+# Customizations the API accepts, as name:Ingredient=delta,Ingredient=delta separated by semicolons
+CUSTOMIZATIONS = os.getenv(
+    "CUSTOMIZATIONS", "extra shot:Espresso=1;no sugar:Sugar=-1;no cream:Cream=-1;extra whipped cream:Whipped Cream=1"
+)
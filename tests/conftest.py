@@ -9,6 +9,8 @@ from barista_matic.adapters.orm import (
     metadata,
     start_mappers,
 )
+from barista_matic.domain import events
+from barista_matic.service_layer import recipe_matrix
 
 
 @pytest.fixture
@@ -23,3 +25,19 @@ def in_memory_db():
 @pytest.fixture
 def session(in_memory_db):
     return sessionmaker(in_memory_db)()
+
+
+@pytest.fixture
+def bus(monkeypatch):
+    a_bus = events.EventBus()
+    monkeypatch.setattr(events, "bus", a_bus)
+    return a_bus
+
+
+@pytest.fixture(params=["numpy", "python"])
+def array_backend(request, monkeypatch):
+    if request.param == "numpy" and recipe_matrix.numpy is None:
+        pytest.skip("NumPy is not installed")
+    if request.param == "python":
+        monkeypatch.setattr(recipe_matrix, "numpy", None)
+    return request.param
@@ -5,6 +5,18 @@ from barista_matic.entrypoints.interactive_cli import InteractiveCli
 from barista_matic.service_layer import services
 
 
+class FakeClock:
+    """Clock that only moves when the test advances it"""
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
 def given_an_ingredient(name="an ingredient", quantity=10, unit_cost=1) -> model.Ingredient:
     return model.Ingredient(name, quantity, unit_cost)
 
@@ -0,0 +1,42 @@
+from sqlalchemy.orm import sessionmaker
+
+from barista_matic.adapters.repository import SQLAlchemyRepository
+from barista_matic.service_layer.catalog_reload import CatalogReloader
+from barista_matic.service_layer.services import BaristaMatic
+from barista_matic.service_layer.unit_of_work import SqlAlchemyUnitOfWork
+from tests.integrations.test_cli_orm import given_a_repository_with_examples_drink
+
+
+def get_catalog_key(session_factory):
+    with session_factory() as session:
+        return SQLAlchemyRepository(session).get_catalog_key()
+
+
+def when_another_session_changes_the_unit_cost(session_factory, ingredient_name, unit_cost):
+    with session_factory() as session:
+        ingredients = {ingredient.name: ingredient for ingredient in SQLAlchemyRepository(session).get_ingredients()}
+        ingredients[ingredient_name].unit_cost = unit_cost
+        session.commit()
+
+
+def then_the_drink_costs(barista_matic, drink_name, expected_cost):
+    costs = {drink.name: drink.get_cost() for drink in barista_matic.get_menu().menu_items.values()}
+    assert costs[drink_name] == expected_cost
+
+
+def test_reloader_serves_a_price_changed_by_another_session(in_memory_db):
+    session_factory = sessionmaker(in_memory_db)
+    given_a_repository_with_examples_drink(SQLAlchemyRepository(session_factory()))
+    unit_of_work = SqlAlchemyUnitOfWork(session_factory)
+    barista_matic = BaristaMatic(unit_of_work.repository, unit_of_work=unit_of_work)
+    reloader = CatalogReloader(
+        barista_matic, lambda: get_catalog_key(session_factory), lambda: SqlAlchemyUnitOfWork(session_factory)
+    )
+    then_the_drink_costs(barista_matic, "Coffee", 3.25)
+
+    when_another_session_changes_the_unit_cost(session_factory, "Coffee", 1)
+    then_the_drink_costs(barista_matic, "Coffee", 3.25)
+    assert reloader.check()
+    assert reloader.swap()
+
+    then_the_drink_costs(barista_matic, "Coffee", 4.0)
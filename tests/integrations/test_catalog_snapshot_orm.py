@@ -0,0 +1,87 @@
+from barista_matic.adapters import repository
+from barista_matic.adapters.catalog_snapshot import load_catalog_snapshot
+from barista_matic.domain import model
+from tests import helpers
+
+
+def given_a_sqlalchemy_repository_with_a_drink(session):
+    db_repository = repository.SQLAlchemyRepository(session)
+    an_ingredient = helpers.given_an_ingredient(quantity=2, unit_cost=1.5)
+    db_repository.add_drink(helpers.given_a_drink_with_ingredients(model.DrinkIngredient(an_ingredient, 3)))
+    return db_repository
+
+
+def test_catalog_key_changes_with_the_catalog_but_not_with_the_stock(session):
+    db_repository = given_a_sqlalchemy_repository_with_a_drink(session)
+    key = db_repository.get_catalog_key()
+
+    session.query(model.Ingredient).one().restock_to_quantity(10)
+    session.commit()
+    assert db_repository.get_catalog_key() == key
+
+    session.query(model.Ingredient).one().unit_cost = 2
+    session.commit()
+    assert db_repository.get_catalog_key() != key
+
+
+def test_catalog_key_changes_with_edits_that_keep_the_counts_and_sums(session):
+    db_repository = repository.SQLAlchemyRepository(session)
+    cream = helpers.given_an_ingredient("Cream", unit_cost=0.25)
+    espresso = helpers.given_an_ingredient("Espresso", unit_cost=1.1)
+    db_repository.add_drink(helpers.given_a_drink_with_ingredients(
+        model.DrinkIngredient(cream, 1), model.DrinkIngredient(espresso, 1), name="Cortado"
+    ))
+    keys = [db_repository.get_catalog_key()]
+
+    cream.unit_cost, espresso.unit_cost = espresso.unit_cost, cream.unit_cost
+    session.commit()
+    keys.append(db_repository.get_catalog_key())
+    session.query(model.Drink).one().name = "Cortada"
+    session.commit()
+    keys.append(db_repository.get_catalog_key())
+    first_line, second_line = session.query(model.Drink).one().ingredients
+    first_line.ingredient, second_line.ingredient = second_line.ingredient, first_line.ingredient
+    session.commit()
+    keys.append(db_repository.get_catalog_key())
+
+    assert len(set(keys)) == 4
+
+
+def test_catalog_key_only_changes_with_the_catalog_of_its_machine(session):
+    db_repository = repository.SQLAlchemyRepository(session, machine_id="machine 1")
+    other_repository = repository.SQLAlchemyRepository(session, machine_id="machine 2")
+    db_repository.add_drink(helpers.given_a_drink_with_ingredients(
+        model.DrinkIngredient(helpers.given_an_ingredient(), 1)
+    ))
+    other_repository.add_drink(helpers.given_a_drink_with_ingredients(
+        model.DrinkIngredient(helpers.given_an_ingredient(), 1)
+    ))
+    key = db_repository.get_catalog_key()
+
+    next(iter(other_repository.get_drinks())).ingredients[0].ingredient_quantity = 2
+    session.commit()
+
+    assert db_repository.get_catalog_key() == key
+
+
+def test_snapshot_loads_without_loading_the_catalog(session, tmp_path, capsys):
+    path = str(tmp_path / "catalog.snapshot")
+    load_catalog_snapshot(given_a_sqlalchemy_repository_with_a_drink(session), path)
+    session.close()
+    db_repository = repository.SQLAlchemyRepository(session)
+
+    snapshot = load_catalog_snapshot(db_repository, path)
+    cli = helpers.given_an_interactive_cli_for_barista_service(None)
+    cli.render_snapshot_frame(snapshot, db_repository.get_stock())
+
+    assert not session.identity_map
+    assert capsys.readouterr().out == "Inventory:\nan ingredient,2\nMenu:\n1,a drink,$4.50,false\n"
+
+
+def test_snapshot_that_cant_be_written_is_compiled_from_the_repository(session, tmp_path):
+    db_repository = given_a_sqlalchemy_repository_with_a_drink(session)
+
+    snapshot = load_catalog_snapshot(db_repository, str(tmp_path / "missing directory" / "catalog.snapshot"))
+
+    assert snapshot.key == db_repository.get_catalog_key()
+    assert snapshot.drink_names == ("a drink", )
@@ -0,0 +1,57 @@
+from datetime import (
+    datetime,
+    timedelta,
+)
+
+from barista_matic.adapters.repository import SQLAlchemyRepository
+from barista_matic.domain import model
+from barista_matic.entrypoints import export
+from tests import helpers
+
+
+def given_a_ledger_in_the_db(session, records_count, machine_ids=("default", )):
+    start = datetime(2026, 1, 1)
+    session.add_all(
+        model.DispenseRecord(f"drink {index % 7}", 1.5, start + timedelta(minutes=index), machine_id, None)
+        for index in range(records_count) for machine_id in machine_ids
+    )
+    session.commit()
+    session.expunge_all()
+    return start
+
+
+def test_sqlalchemy_repository_streams_the_ledger_in_batches_without_loading_objects(session):
+    start = given_a_ledger_in_the_db(session, 250, machine_ids=("default", "other"))
+    repository = SQLAlchemyRepository(session, machine_id="default")
+
+    rows = list(repository.stream_ledger(start + timedelta(minutes=10), start + timedelta(minutes=210), batch_size=32))
+
+    assert len(rows) == 200
+    assert rows[0] == ("drink 3", 1.5, start + timedelta(minutes=10), "default", None)
+    assert [row[2] for row in rows] == sorted(row[2] for row in rows)
+    assert len(session.identity_map) == 0
+
+
+def test_sqlalchemy_repository_streams_the_inventory_and_recipes_like_the_catalog(session):
+    milk = helpers.given_an_ingredient("milk", quantity=3)
+    coffee = helpers.given_an_ingredient("coffee", quantity=5)
+    repository = SQLAlchemyRepository(session)
+    repository.add_drink(helpers.given_a_drink_with_ingredients(
+        model.DrinkIngredient(milk, 1), model.DrinkIngredient(coffee, 2), name="latte"
+    ))
+    repository.add_drink(helpers.given_a_drink_with_ingredients(model.DrinkIngredient(coffee, 1), name="espresso"))
+
+    assert list(repository.stream_inventory(batch_size=1)) == [
+        ("coffee", 5, 1, "default"), ("milk", 3, 1, "default")
+    ]
+    assert list(repository.stream_recipes(batch_size=1)) == [
+        ("espresso", "coffee", 1, "default"), ("latte", "coffee", 2, "default"), ("latte", "milk", 1, "default")
+    ]
+
+
+def test_export_of_the_ledger_from_the_db_counts_every_row(session, tmp_path):
+    given_a_ledger_in_the_db(session, 1000)
+
+    exported = export.export_table(SQLAlchemyRepository(session), "ledger", str(tmp_path / "ledger.csv.gz"))
+
+    assert exported == 1000
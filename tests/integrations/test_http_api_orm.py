@@ -0,0 +1,147 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import (
+    clear_mappers,
+    sessionmaker,
+)
+
+from barista_matic.adapters.orm import (
+    metadata,
+    start_mappers,
+)
+from barista_matic.adapters.repository import SQLAlchemyRepository
+from barista_matic.domain import model
+from barista_matic.entrypoints.http_api import (
+    ApiServer,
+    BaristaApi,
+)
+from barista_matic import settings
+from tests.integrations.test_cli_orm import given_a_repository_with_examples_drink
+
+
+@pytest.fixture
+def api_server(tmp_path, bus):
+    # A database file, the in memory database would be a different one for every worker thread
+    engine = create_engine(f"sqlite:///{tmp_path / 'api.db'}", pool_size=4)
+    metadata.create_all(engine)
+    start_mappers()
+    session_factory = sessionmaker(engine)
+    given_a_repository_with_examples_drink(SQLAlchemyRepository(session_factory(), machine_id="default"), stock=6)
+    customizations = model.parse_customizations(settings.CUSTOMIZATIONS)
+    server = ApiServer(
+        BaristaApi(session_factory, machine_id="default", customizations=customizations), ("127.0.0.1", 0), workers=4
+    )
+    yield server.start()
+    server.stop()
+    clear_mappers()
+
+
+def when_the_client_requests(server, method, path, payload=None, headers=None):
+    data = None if payload is None else json.dumps(payload).encode("utf-8")
+    request = urllib.request.Request(server.url + path, data=data, method=method, headers=headers or {})
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, response.headers, json.loads(response.read() or b"null")
+    except urllib.error.HTTPError as error:
+        return error.code, error.headers, json.loads(error.read() or b"null")
+
+
+@pytest.mark.timeout(10.0)
+def test_api_answers_polls_with_not_modified_until_the_stock_changes(api_server):
+    status, headers, inventory = when_the_client_requests(api_server, "GET", "/inventory")
+    etag = headers["ETag"]
+
+    not_modified = when_the_client_requests(api_server, "GET", "/inventory", headers={"If-None-Match": etag})
+    when_the_client_requests(api_server, "POST", "/dispense", {"reference": "5"})
+    modified = when_the_client_requests(api_server, "GET", "/inventory", headers={"If-None-Match": etag})
+
+    assert status == 200
+    assert {"name": "Coffee", "available_quantity": 6} in inventory["inventory"]
+    assert not_modified[0] == 304
+    assert modified[0] == 200
+    assert modified[1]["ETag"] != etag
+    assert {"name": "Coffee", "available_quantity": 3} in modified[2]["inventory"]
+
+
+@pytest.mark.timeout(10.0)
+def test_api_dispenses_the_customizations_of_the_settings(api_server):
+    status, _, result = when_the_client_requests(
+        api_server, "POST", "/dispense", {"reference": "5", "customizations": ["no sugar"]}
+    )
+    _, _, inventory = when_the_client_requests(api_server, "GET", "/inventory")
+
+    assert status == 200
+    assert result == {"result": "dispensed", "drink": "Coffee + no sugar"}
+    assert {"name": "Coffee", "available_quantity": 3} in inventory["inventory"]
+    assert {"name": "Sugar", "available_quantity": 6} in inventory["inventory"]
+
+
+@pytest.mark.timeout(10.0)
+def test_api_dispenses_concurrent_requests_without_losing_stock_changes(api_server):
+    results = []
+
+    def dispense_coffee():
+        results.append(when_the_client_requests(api_server, "POST", "/dispense", {"reference": "5"})[0])
+
+    threads = [threading.Thread(target=dispense_coffee) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    _, _, menu = when_the_client_requests(api_server, "GET", "/menu")
+
+    assert sorted(results) == [200, 200] + [409] * 6
+    assert {"reference": "5", "name": "Coffee", "cost": 3.25, "in_stock": False} in menu["menu"]
+
+
+@pytest.mark.timeout(10.0)
+def test_api_dispenses_a_retried_request_once_and_rejects_invalid_requests(api_server):
+    first = when_the_client_requests(api_server, "POST", "/dispense", {"reference": "5", "request_id": "order-1"})
+    retry = when_the_client_requests(api_server, "POST", "/dispense", {"reference": "5", "request_id": "order-1"})
+    _, _, dispensed_inventory = when_the_client_requests(api_server, "GET", "/inventory")
+    invalid_reference = when_the_client_requests(api_server, "POST", "/dispense", {"reference": "99"})
+    missing_reference = when_the_client_requests(api_server, "POST", "/dispense", {})
+    restock = when_the_client_requests(api_server, "POST", "/restock", {"quantity": 8})
+    _, _, inventory = when_the_client_requests(api_server, "GET", "/inventory")
+
+    assert first[2] == retry[2] == {"result": "dispensed", "drink": "Coffee"}
+    assert {"name": "Coffee", "available_quantity": 3} in dispensed_inventory["inventory"]
+    assert invalid_reference[0] == 404
+    assert missing_reference == (400, missing_reference[1], {"error": "Field reference is required"})
+    assert restock[2] == {"result": "restocked", "quantity": 8}
+    assert {"name": "Coffee", "available_quantity": 8} in inventory["inventory"]
+
+
+@pytest.mark.timeout(10.0)
+def test_api_etags_follow_the_changes_of_other_processes(api_server):
+    # Inventory and menu share the machine revision, a price change is a new inventory etag too
+    _, inventory_headers, _ = when_the_client_requests(api_server, "GET", "/inventory")
+    _, menu_headers, _ = when_the_client_requests(api_server, "GET", "/menu")
+
+    # Another process sharing the database, e.g. the cli: a price change, then a restock
+    with api_server.api.session_factory() as session:
+        coffee = session.query(model.Ingredient).filter_by(name="Coffee").one()
+        coffee.unit_cost += 1
+        session.commit()
+        repriced_inventory = when_the_client_requests(
+            api_server, "GET", "/inventory", headers={"If-None-Match": inventory_headers["ETag"]}
+        )
+        repriced_menu = when_the_client_requests(
+            api_server, "GET", "/menu", headers={"If-None-Match": menu_headers["ETag"]}
+        )
+        coffee.restock_to_quantity(9)
+        session.commit()
+    restocked_inventory = when_the_client_requests(
+        api_server, "GET", "/inventory", headers={"If-None-Match": repriced_inventory[1]["ETag"]}
+    )
+
+    assert repriced_inventory[0] == 200
+    assert repriced_menu[0] == 200
+    assert {"reference": "5", "name": "Coffee", "cost": 6.25, "in_stock": True} in repriced_menu[2]["menu"]
+    assert restocked_inventory[0] == 200
+    assert {"name": "Coffee", "available_quantity": 9} in restocked_inventory[2]["inventory"]
@@ -0,0 +1,32 @@
+from datetime import datetime
+
+from sqlalchemy.orm import sessionmaker
+
+from barista_matic.adapters.repository import SQLAlchemyRepository
+from barista_matic.entrypoints import ledger_retention
+from tests.integrations.test_export_orm import given_a_ledger_in_the_db
+
+
+def test_sqlalchemy_repository_deletes_the_ledger_of_its_machine_in_batches(session):
+    start = given_a_ledger_in_the_db(session, 250, machine_ids=("default", "other"))
+    repository = SQLAlchemyRepository(session, machine_id="default")
+
+    deleted = repository.delete_ledger(datetime(2026, 1, 1, 2), batch_size=32)
+
+    assert deleted == 120
+    assert repository.get_oldest_dispense_time() == datetime(2026, 1, 1, 2)
+    assert SQLAlchemyRepository(session, machine_id="other").get_oldest_dispense_time() == start
+
+
+def test_retention_policy_archives_the_old_months_of_the_machine(in_memory_db, tmp_path):
+    session_factory = sessionmaker(in_memory_db)
+    given_a_ledger_in_the_db(session_factory(), 100, machine_ids=("default", "other"))
+
+    archived_months = ledger_retention.apply_retention_policy(session_factory, 1, str(tmp_path), "default")
+
+    assert [(month.month_start, month.archived, month.deleted) for month in archived_months] == [
+        (datetime(2026, 1, 1), 100, 100)
+    ]
+    with session_factory() as session:
+        assert SQLAlchemyRepository(session, machine_id="default").get_oldest_dispense_time() is None
+        assert len(list(SQLAlchemyRepository(session, machine_id="other").stream_ledger())) == 100
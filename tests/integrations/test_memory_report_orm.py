@@ -0,0 +1,15 @@
+import pytest
+
+from barista_matic.entrypoints.memory_report import (
+    MemoryBudget,
+    build_sqlite_service,
+    measure_memory,
+)
+
+
+@pytest.mark.timeout(20.0)
+def test_sqlite_service_memory_is_within_the_budget(in_memory_db):
+    report = measure_memory(build_sqlite_service, catalog_size=40, ingredient_count=20, session_commands=200)
+
+    assert report.bytes_per_drink > 0
+    MemoryBudget().check(report)
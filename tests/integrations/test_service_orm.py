@@ -1,3 +1,8 @@
+import time
+from datetime import timedelta
+
+from sqlalchemy.orm import sessionmaker
+
 from barista_matic.adapters import repository
 from barista_matic.domain import model
 from tests import helpers
@@ -52,3 +57,167 @@ def test_barista_matic_service_dispense_drink_by_menu_reference(session):
     helpers.when_the_barista_dispense_a_drink_by_reference(barista_matic, "1")
 
     helpers.then_the_ingredient_has_the_expected_stock_in_the_db(session, ingredient_1.name, 9)
+
+
+def test_barista_matic_service_dispense_updates_the_sales_rollups(session):
+    ingredient_1 = helpers.given_an_ingredient("ingredient 1", quantity=10, unit_cost=1.25)
+    drink_1 = helpers.given_a_drink_with_ingredients(
+        model.DrinkIngredient(ingredient_1, 2),
+        name="drink b"
+    )
+    barista_matic = given_a_baristamatic_with_sqlalchemy_repository(session, drinks=[drink_1])
+
+    helpers.when_the_barista_dispense_a_drink_by_reference(barista_matic, "1")
+    helpers.when_the_barista_dispense_a_drink_by_reference(barista_matic, "1")
+
+    assert session.query(model.DispenseRecord).count() == 2
+    for period in model.ROLLUP_PERIODS:
+        sales = barista_matic.get_sales(period)
+        assert [(rollup.drink_name, rollup.quantity, rollup.revenue) for rollup in sales] == [("drink b", 2, 5.0)]
+
+
+def test_repository_rolls_back_when_an_exception_escaped(session):
+    ingredient_1 = helpers.given_an_ingredient("ingredient 1", quantity=10)
+    db_repository = repository.SQLAlchemyRepository(session)
+    db_repository.add_ingredient(ingredient_1)
+
+    try:
+        with db_repository:
+            ingredient_1.deallocate_quantity(3)
+            session.flush()
+            raise RuntimeError("Brew head is broken")
+    except RuntimeError:
+        pass
+
+    helpers.then_the_ingredient_has_the_expected_stock_in_the_db(session, ingredient_1.name, 10)
+
+
+def test_sqlalchemy_repository_menu_page_matches_the_full_menu(session):
+    an_ingredient = helpers.given_an_ingredient(quantity=1)
+    other_ingredient = helpers.given_an_ingredient("other ingredient", quantity=0)
+    drinks = [
+        helpers.given_a_drink_with_ingredients(model.DrinkIngredient(an_ingredient, 1), name="mocha"),
+        helpers.given_a_drink_with_ingredients(model.DrinkIngredient(other_ingredient, 1), name="caffe latte"),
+        helpers.given_a_drink_with_ingredients(model.DrinkIngredient(an_ingredient, 1), name="caffe mocha"),
+        helpers.given_a_drink_with_ingredients(model.DrinkIngredient(an_ingredient, 1), name="espresso"),
+    ]
+    barista_matic = given_a_baristamatic_with_sqlalchemy_repository(session, drinks=drinks)
+
+    first_page = barista_matic.get_menu_page(limit=3)
+    last_page = barista_matic.get_menu_page(first_page.next_cursor, limit=3)
+
+    assert first_page.items + last_page.items == tuple(barista_matic.get_menu())
+    assert last_page.next_cursor is None
+    in_stock_page = barista_matic.get_menu_page(prefix="CAFFE", in_stock_only=True)
+    assert [(reference, drink.name) for reference, drink in in_stock_page.items] == [("2", "caffe mocha")]
+
+
+def test_sqlalchemy_repository_menu_pages_keep_drinks_with_the_same_name_at_the_page_boundary(session):
+    an_ingredient = helpers.given_an_ingredient(quantity=1)
+    drinks = [
+        helpers.given_a_drink_with_ingredients(model.DrinkIngredient(an_ingredient, 1), name=name)
+        for name in ("latte", "mocha", "latte", "espresso", "latte")
+    ]
+    barista_matic = given_a_baristamatic_with_sqlalchemy_repository(session, drinks=drinks)
+
+    pages = [barista_matic.get_menu_page(limit=2)]
+    while pages[-1].next_cursor is not None:
+        pages.append(barista_matic.get_menu_page(pages[-1].next_cursor, limit=2))
+
+    menu_items = [item for page in pages for item in page.items]
+    assert menu_items == list(barista_matic.get_menu())
+    assert [reference for reference, _ in menu_items] == ["1", "2", "3", "4", "5"]
+    assert barista_matic.get_drink_by_reference("3") is menu_items[2][1]
+
+
+def test_sqlalchemy_repository_inventory_page_escapes_the_prefix(session):
+    ingredients = [helpers.given_an_ingredient(name) for name in ("milk", "100% cocoa", "1000 beans", "cream")]
+    barista_matic = given_a_baristamatic_with_sqlalchemy_repository(session, ingredients=ingredients)
+
+    first_page = barista_matic.get_inventory_page(limit=2)
+
+    last_page = barista_matic.get_inventory_page(first_page.next_cursor, limit=2)
+    assert [item.name for item in first_page.items] == ["100% cocoa", "1000 beans"]
+    assert [item.name for item in last_page.items] == ["cream", "milk"]
+    assert [item.name for item in barista_matic.get_inventory_page(prefix="100%").items] == ["100% cocoa"]
+
+
+def test_barista_matic_service_finds_retried_requests_in_the_ledger(session):
+    an_ingredient = helpers.given_an_ingredient(quantity=10)
+    drink = helpers.given_a_drink_with_ingredients(model.DrinkIngredient(an_ingredient, 2))
+    given_a_baristamatic_with_sqlalchemy_repository(session, drinks=[drink]).dispense_drink_by_menu_reference(
+        "1", request_id="request 1"
+    )
+
+    restarted_barista_matic = given_a_baristamatic_with_sqlalchemy_repository(session)
+    retried_drink = restarted_barista_matic.dispense_drink_by_menu_reference("1", request_id="request 1")
+
+    assert retried_drink.name == "a drink"
+    helpers.then_the_ingredient_has_the_expected_stock_in_the_db(session, "an ingredient", 8)
+    assert restarted_barista_matic.repository.get_dispense_by_request_id("request 2") is None
+
+
+def test_barista_matic_service_persists_the_lots_and_consumes_them_after_a_reload(session):
+    now = model.utcnow()
+    an_ingredient = helpers.given_an_ingredient(quantity=0)
+    drink = helpers.given_a_drink_with_ingredients(model.DrinkIngredient(an_ingredient, 3))
+    barista_matic = given_a_baristamatic_with_sqlalchemy_repository(session, drinks=[drink])
+    barista_matic.receive_lot(an_ingredient, 4, now + timedelta(days=2))
+    barista_matic.receive_lot(an_ingredient, 2, now + timedelta(days=1))
+    barista_matic.receive_lot(an_ingredient, 5, now - timedelta(days=1))
+    session.expunge_all()
+
+    restarted_barista_matic = given_a_baristamatic_with_sqlalchemy_repository(session)
+    restarted_barista_matic.dispense_drink_by_menu_reference("1")
+
+    helpers.then_the_ingredient_has_the_expected_stock_in_the_db(session, "an ingredient", 3)
+    assert [(lot.quantity, lot.expires_at) for lot in session.query(model.Lot)] == [(3, now + timedelta(days=2))]
+    assert restarted_barista_matic.discard_expired_lots() == 0
+
+
+def test_sqlalchemy_repository_stock_reads_leave_the_expired_lots_out(session):
+    now = model.utcnow()
+    an_ingredient = helpers.given_an_ingredient(quantity=2)
+    other_ingredient = helpers.given_an_ingredient("other ingredient", quantity=2)
+    drinks = [
+        helpers.given_a_drink_with_ingredients(model.DrinkIngredient(an_ingredient, 3), name="a drink"),
+        helpers.given_a_drink_with_ingredients(model.DrinkIngredient(other_ingredient, 2), name="other drink"),
+    ]
+    barista_matic = given_a_baristamatic_with_sqlalchemy_repository(session, drinks=drinks)
+    barista_matic.receive_lot(an_ingredient, 5, now - timedelta(days=1))
+
+    db_repository = barista_matic.repository
+    in_stock_page = db_repository.get_menu_page(in_stock_only=True)
+
+    assert db_repository.get_stock() == {"an ingredient": 2, "other ingredient": 2}
+    assert [row[:2] for row in db_repository.stream_inventory()] == [("an ingredient", 2), ("other ingredient", 2)]
+    assert [drink.name for _, drink in in_stock_page] == ["other drink"]
+    # The column still counts the expired lot, until it is discarded
+    assert an_ingredient.available_quantity == 7
+
+
+def test_sqlalchemy_repository_revision_follows_every_session_and_the_expired_lots(in_memory_db):
+    sessions = sessionmaker(in_memory_db)
+    machine_repository = repository.SQLAlchemyRepository(sessions(), machine_id="machine 1")
+    an_ingredient = helpers.given_an_ingredient(quantity=2)
+    machine_repository.add_drink(helpers.given_a_drink_with_ingredients(model.DrinkIngredient(an_ingredient, 1)))
+    machine_repository.commit()
+    other_machine_repository = repository.SQLAlchemyRepository(sessions(), machine_id="machine 2")
+    revisions = [machine_repository.get_revision()]
+
+    other_machine_repository.add_ingredient(helpers.given_an_ingredient("other ingredient"))
+    other_machine_repository.commit()
+    revisions.append(machine_repository.get_revision())
+    # A session without repository, e.g. another process
+    with sessions() as session:
+        session.query(model.Ingredient).filter_by(machine_id="machine 1").one().unit_cost += 1
+        session.commit()
+    revisions.append(machine_repository.get_revision())
+    an_ingredient.receive_lot(model.Lot(3, model.utcnow() + timedelta(milliseconds=50)))
+    machine_repository.commit()
+    revisions.append(machine_repository.get_revision())
+    time.sleep(0.1)
+    revisions.append(machine_repository.get_revision())
+
+    assert revisions[0] == revisions[1]
+    assert len(set(revisions)) == 4
@@ -0,0 +1,81 @@
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import clear_mappers
+
+from barista_matic.adapters.orm import (
+    metadata,
+    start_mappers,
+)
+from barista_matic.adapters.sharding import ShardRouter
+from barista_matic.domain import model
+from barista_matic.service_layer.services import BaristaMatic
+from tests import helpers
+
+
+@pytest.fixture
+def shard_engines(tmp_path):
+    engines = [create_engine(f"sqlite:///{tmp_path}/shard_{index}.db") for index in range(2)]
+    for engine in engines:
+        metadata.create_all(engine)
+    start_mappers()
+    yield engines
+    clear_mappers()
+
+
+def given_a_machine_with_a_drink(router, machine_id, stock):
+    an_ingredient = helpers.given_an_ingredient("an ingredient", quantity=stock)
+    a_drink = helpers.given_a_drink_with_ingredients(model.DrinkIngredient(an_ingredient, 1))
+    router.get_repository(machine_id).add_drink(a_drink)
+
+
+def test_router_places_machines_by_stable_hash_or_assignment(shard_engines):
+    router = ShardRouter(shard_engines, assignments={"pinned": 1})
+
+    assert router.get_shard_index("pinned") == 1
+    assert router.get_shard_index("machine 7") == router.get_shard_index("machine 7")
+    assert {router.get_shard_index(f"machine {index}") for index in range(20)} == {0, 1}
+
+
+def test_machine_rows_live_in_a_single_shard(shard_engines):
+    router = ShardRouter(shard_engines, assignments={"machine a": 0, "machine b": 0, "machine c": 1})
+    given_a_machine_with_a_drink(router, "machine a", stock=5)
+    given_a_machine_with_a_drink(router, "machine b", stock=6)
+    given_a_machine_with_a_drink(router, "machine c", stock=7)
+
+    barista_matic = BaristaMatic(router.get_repository("machine b"), machine_id="machine b")
+    barista_matic.dispense_drink_by_menu_reference("1")
+
+    assert [ingredient.get_available_quantity() for ingredient in barista_matic.get_inventory()] == [5]
+    assert len(barista_matic.get_menu().menu_items) == 1
+    assert [rollup.machine_id for rollup in router.get_fleet_sales("day")] == ["machine b"]
+
+
+def test_fleet_inventory_fans_out_to_every_shard(shard_engines):
+    router = ShardRouter(shard_engines, assignments={"machine a": 0, "machine b": 1})
+    given_a_machine_with_a_drink(router, "machine a", stock=5)
+    given_a_machine_with_a_drink(router, "machine b", stock=6)
+
+    inventory = router.get_fleet_inventory()
+
+    assert {
+        machine_id: [(ingredient.name, ingredient.available_quantity) for ingredient in ingredients]
+        for machine_id, ingredients in inventory.items()
+    } == {
+        "machine a": [("an ingredient", 5)],
+        "machine b": [("an ingredient", 6)],
+    }
+
+
+def test_fleet_inventory_reads_the_stock_of_lots_after_the_session_is_closed(shard_engines):
+    router = ShardRouter(shard_engines)
+    given_a_machine_with_a_drink(router, "machine a", stock=0)
+    barista_matic = BaristaMatic(router.get_repository("machine a"), machine_id="machine a")
+    now = model.utcnow()
+    barista_matic.receive_lot(barista_matic.get_inventory()[0], 4, now + timedelta(days=1))
+    barista_matic.receive_lot(barista_matic.get_inventory()[0], 3, now - timedelta(days=1))
+
+    inventory = router.get_fleet_inventory()
+
+    assert [ingredient.get_available_quantity() for ingredient in inventory["machine a"]] == [4]
@@ -0,0 +1,173 @@
+import contextlib
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import (
+    event,
+    inspect,
+)
+from sqlalchemy.orm import sessionmaker
+
+from barista_matic.adapters.caching_repository import CachingRepository
+from barista_matic.adapters.repository import SQLAlchemyRepository
+from barista_matic.domain import model
+from barista_matic.service_layer.services import BaristaMatic
+from barista_matic.service_layer.unit_of_work import (
+    RepositoryUnitOfWork,
+    SqlAlchemyUnitOfWork,
+)
+from tests import helpers
+from tests.integrations.test_cli_orm import given_a_repository_with_examples_drink
+
+
+@pytest.fixture
+def unit_of_work(in_memory_db):
+    given_a_repository_with_examples_drink(SQLAlchemyRepository(sessionmaker(in_memory_db)()))
+    return SqlAlchemyUnitOfWork(sessionmaker(in_memory_db))
+
+
+@contextlib.contextmanager
+def counting_queries(engine):
+    statements = []
+
+    def count_statement(connection, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count_statement)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", count_statement)
+
+
+def given_an_interactive_cli_with_unit_of_work(unit_of_work):
+    barista_matic = BaristaMatic(unit_of_work.repository, unit_of_work=unit_of_work)
+    cli = helpers.given_an_interactive_cli_for_barista_service(barista_matic)
+    cli.render_frame()
+    return cli
+
+
+def when_the_cli_runs_a_command_and_renders_the_frame(cli, user_input):
+    command = cli.get_command_for_user_input(user_input, cli.barista_service.get_menu())
+    cli.run_command(command, user_input)
+    cli.render_frame()
+
+
+def then_the_command_runs_the_expected_queries(cli, in_memory_db, user_input, expected_queries):
+    with counting_queries(in_memory_db) as statements:
+        when_the_cli_runs_a_command_and_renders_the_frame(cli, user_input)
+    assert len(statements) == expected_queries, statements
+
+
+def test_dispense_command_queries_do_not_grow_between_commands(unit_of_work, in_memory_db):
+    cli = given_an_interactive_cli_with_unit_of_work(unit_of_work)
+
+    # Menu lookups by the cli and the service, rollups upsert, ledger insert, stock update, revision bump,
+    # and the frame
+    for _ in range(3):
+        then_the_command_runs_the_expected_queries(cli, in_memory_db, "2", expected_queries=9)
+
+
+def test_command_without_changes_only_reads_the_menu_and_frame(unit_of_work, in_memory_db):
+    cli = given_an_interactive_cli_with_unit_of_work(unit_of_work)
+
+    then_the_command_runs_the_expected_queries(cli, in_memory_db, "x", expected_queries=3)
+
+
+def test_commit_only_expires_the_changed_rows(unit_of_work):
+    ingredients = {ingredient.name: ingredient for ingredient in unit_of_work.repository.get_ingredients()}
+
+    with unit_of_work:
+        ingredients["Espresso"].deallocate_quantity(2)
+
+    assert inspect(ingredients["Espresso"]).expired
+    assert not inspect(ingredients["Cocoa"]).expired
+    assert ingredients["Espresso"].get_available_quantity() == 8
+
+
+def test_unit_of_work_rolls_back_when_an_exception_escaped(unit_of_work, session):
+    ingredients = {ingredient.name: ingredient for ingredient in unit_of_work.repository.get_ingredients()}
+
+    with pytest.raises(RuntimeError):
+        with unit_of_work:
+            ingredients["Espresso"].deallocate_quantity(2)
+            unit_of_work.session.flush()
+            raise RuntimeError("Brew head is broken")
+
+    assert ingredients["Espresso"].get_available_quantity() == 10
+    helpers.then_the_ingredient_has_the_expected_stock_in_the_db(session, "Espresso", 10)
+    assert session.query(model.DispenseRecord).count() == 0
+
+
+def test_caching_repository_saves_the_catalog_queries(unit_of_work, in_memory_db, bus):
+    caching_repository = CachingRepository(unit_of_work.repository, max_entries=256, bus=bus)
+    barista_matic = BaristaMatic(caching_repository, unit_of_work=RepositoryUnitOfWork(caching_repository))
+    cli = helpers.given_an_interactive_cli_for_barista_service(barista_matic)
+    cli.render_frame()
+
+    # Rollups upserts, ledger insert, stock update, revision bump and the refresh of the changed ingredients,
+    # the catalog of the frame comes from the cache, the drink of the reference too once looked up
+    then_the_command_runs_the_expected_queries(cli, in_memory_db, "2", expected_queries=8)
+    then_the_command_runs_the_expected_queries(cli, in_memory_db, "2", expected_queries=7)
+    then_the_command_runs_the_expected_queries(cli, in_memory_db, "x", expected_queries=0)
+
+
+def test_unit_of_work_only_keeps_the_loaded_catalog_rows(unit_of_work):
+    barista_matic = BaristaMatic(unit_of_work.repository, unit_of_work=unit_of_work)
+    barista_matic.dispense_drink_by_menu_reference("2", request_id="request 1")
+    unit_of_work.session.query(model.DispenseRecord).all()
+    drink = next(iter(unit_of_work.repository.get_drinks()))
+
+    with unit_of_work:
+        unit_of_work.session.delete(drink)
+
+    kept_rows = list(unit_of_work._loaded_rows.values())
+    assert all(isinstance(row, (model.Ingredient, model.Drink, model.DrinkIngredient)) for row in kept_rows)
+    assert all(row is not drink for row in kept_rows)
+
+
+def given_a_baristamatic_with_a_drink_backed_by_lots(in_memory_db, *lots):
+    setup_session = sessionmaker(in_memory_db)()
+    an_ingredient = helpers.given_an_ingredient(quantity=0)
+    SQLAlchemyRepository(setup_session).add_drink(
+        helpers.given_a_drink_with_ingredients(model.DrinkIngredient(an_ingredient, 2))
+    )
+    setup_session.commit()
+    unit_of_work = SqlAlchemyUnitOfWork(sessionmaker(in_memory_db))
+    barista_matic = BaristaMatic(unit_of_work.repository, unit_of_work=unit_of_work)
+    an_ingredient = barista_matic.get_inventory()[0]
+    for quantity, expires_at in lots:
+        barista_matic.receive_lot(an_ingredient, quantity, expires_at)
+    return barista_matic, an_ingredient
+
+
+def then_the_lots_have_the_quantities(in_memory_db, expected_quantities):
+    lots = sessionmaker(in_memory_db)().query(model.Lot).order_by(model.Lot.expires_at)
+    assert [lot.quantity for lot in lots] == expected_quantities
+
+
+def test_unit_of_work_drains_several_lots(in_memory_db, bus):
+    barista_matic, an_ingredient = given_a_baristamatic_with_a_drink_backed_by_lots(
+        in_memory_db, *((2, model.utcnow() + timedelta(days=day)) for day in (1, 2, 3))
+    )
+
+    for _ in range(3):
+        barista_matic.dispense_drink_by_menu_reference("1")
+
+    assert an_ingredient.get_available_quantity() == 0
+    then_the_lots_have_the_quantities(in_memory_db, [])
+
+
+def test_unit_of_work_rollback_keeps_consuming_the_lot_that_expires_first(in_memory_db, bus):
+    now = model.utcnow()
+    barista_matic, an_ingredient = given_a_baristamatic_with_a_drink_backed_by_lots(
+        in_memory_db, (2, now + timedelta(days=1)), (5, now + timedelta(days=2))
+    )
+
+    with pytest.raises(RuntimeError):
+        with barista_matic.transaction():
+            an_ingredient.deallocate_quantity(2)
+            raise RuntimeError("Brew failed")
+    barista_matic.dispense_drink_by_menu_reference("1")
+
+    then_the_lots_have_the_quantities(in_memory_db, [0, 5])
@@ -0,0 +1,160 @@
+import threading
+
+import pytest
+
+from barista_matic.adapters.repository import FakeRepository
+from barista_matic.domain import (
+    exceptions,
+    model,
+)
+from barista_matic.service_layer import services
+from barista_matic.service_layer.brewing import BrewWorkerPool
+from tests import helpers
+
+
+def given_a_thread_safe_baristamatic_with_a_drink(an_ingredient, quantity=2, clock=None):
+    repository = FakeRepository()
+    repository.add_drink(
+        helpers.given_a_drink_with_ingredients(model.DrinkIngredient(an_ingredient, quantity))
+    )
+    return services.ThreadSafeBaristaMatic(repository, clock=clock or helpers.FakeClock())
+
+
+def then_the_ingredient_has_the_expected_stock(ingredient, expected_stock, expected_held=0, barista_matic=None):
+    assert ingredient.get_available_quantity() == expected_stock
+    if barista_matic is not None:
+        assert barista_matic.get_holds().get(ingredient.name, 0) == expected_held
+
+
+def test_reserve_holds_the_ingredients_until_confirmed():
+    an_ingredient = helpers.given_an_ingredient(quantity=10)
+    barista_matic = given_a_thread_safe_baristamatic_with_a_drink(an_ingredient)
+
+    reservation = barista_matic.reserve("1")
+
+    then_the_ingredient_has_the_expected_stock(an_ingredient, 10, expected_held=2, barista_matic=barista_matic)
+    assert barista_matic.confirm(reservation) is reservation.drink
+    then_the_ingredient_has_the_expected_stock(an_ingredient, 8, expected_held=0, barista_matic=barista_matic)
+    assert barista_matic.get_active_reservations() == tuple()
+
+
+def test_release_gives_back_the_held_ingredients():
+    an_ingredient = helpers.given_an_ingredient(quantity=10)
+    barista_matic = given_a_thread_safe_baristamatic_with_a_drink(an_ingredient)
+
+    reservation = barista_matic.reserve("1")
+    barista_matic.release(reservation)
+
+    then_the_ingredient_has_the_expected_stock(an_ingredient, 10, expected_held=0, barista_matic=barista_matic)
+    with pytest.raises(exceptions.ReservationNotActive):
+        barista_matic.confirm(reservation)
+
+
+def test_reserve_raises_out_of_stock_while_ingredients_are_held():
+    an_ingredient = helpers.given_an_ingredient(quantity=3)
+    barista_matic = given_a_thread_safe_baristamatic_with_a_drink(an_ingredient)
+
+    barista_matic.reserve("1")
+
+    with pytest.raises(exceptions.OutOfStock):
+        barista_matic.reserve("1")
+
+
+def test_expired_reservations_are_reclaimed():
+    clock = helpers.FakeClock()
+    an_ingredient = helpers.given_an_ingredient(quantity=10)
+    barista_matic = given_a_thread_safe_baristamatic_with_a_drink(an_ingredient, clock=clock)
+
+    expired_reservation = barista_matic.reserve("1", hold_seconds=5)
+    barista_matic.reserve("1", hold_seconds=None)
+    clock.advance(5)
+
+    assert barista_matic.reclaim_expired_reservations() == 1
+    then_the_ingredient_has_the_expected_stock(an_ingredient, 10, expected_held=2, barista_matic=barista_matic)
+    with pytest.raises(exceptions.ReservationNotActive):
+        barista_matic.confirm(expired_reservation)
+
+
+def test_restock_while_ingredients_are_held_never_exceeds_the_restocked_quantity():
+    an_ingredient = helpers.given_an_ingredient(quantity=10)
+    barista_matic = given_a_thread_safe_baristamatic_with_a_drink(an_ingredient, quantity=3)
+
+    reservation = barista_matic.reserve("1")
+    barista_matic.restock_ingredient_to_quantity(an_ingredient, 10)
+    barista_matic.release(reservation)
+
+    then_the_ingredient_has_the_expected_stock(an_ingredient, 10, expected_held=0, barista_matic=barista_matic)
+
+
+def test_restock_keeps_the_held_quantities():
+    an_ingredient = helpers.given_an_ingredient(quantity=10)
+    barista_matic = given_a_thread_safe_baristamatic_with_a_drink(an_ingredient, quantity=3)
+
+    reservation = barista_matic.reserve("1")
+    barista_matic.restock_ingredient_to_quantity(an_ingredient, 0)
+    barista_matic.confirm(reservation)
+
+    then_the_ingredient_has_the_expected_stock(an_ingredient, 0, expected_held=0, barista_matic=barista_matic)
+
+
+def test_extended_reservations_are_not_reclaimed():
+    clock = helpers.FakeClock()
+    an_ingredient = helpers.given_an_ingredient(quantity=10)
+    barista_matic = given_a_thread_safe_baristamatic_with_a_drink(an_ingredient, clock=clock)
+
+    reservation = barista_matic.reserve("1", hold_seconds=5)
+    clock.advance(4)
+    barista_matic.extend(reservation, hold_seconds=None)
+    clock.advance(10)
+
+    assert barista_matic.reclaim_expired_reservations() == 0
+    barista_matic.confirm(reservation)
+    then_the_ingredient_has_the_expected_stock(an_ingredient, 8, expected_held=0, barista_matic=barista_matic)
+
+
+@pytest.mark.timeout(5)
+def test_worker_pool_holds_the_ingredients_of_a_brew_longer_than_the_hold():
+    clock = helpers.FakeClock()
+    an_ingredient = helpers.given_an_ingredient(quantity=10)
+    barista_matic = given_a_thread_safe_baristamatic_with_a_drink(an_ingredient, clock=clock)
+
+    with BrewWorkerPool(barista_matic, brew=lambda drink: clock.advance(60), hold_seconds=5) as pool:
+        order = pool.submit("1")
+
+    assert order.result().name == "a drink"
+    then_the_ingredient_has_the_expected_stock(an_ingredient, 8, expected_held=0, barista_matic=barista_matic)
+
+
+@pytest.mark.timeout(5)
+def test_worker_pool_accepts_orders_while_brewing():
+    brewing_can_finish = threading.Event()
+    an_ingredient = helpers.given_an_ingredient(quantity=10)
+    barista_matic = given_a_thread_safe_baristamatic_with_a_drink(an_ingredient)
+
+    with BrewWorkerPool(barista_matic, brew=lambda drink: brewing_can_finish.wait(), workers=1) as pool:
+        first_order = pool.submit("1")
+        second_order = pool.submit("1")
+
+        assert not first_order.done()
+        then_the_ingredient_has_the_expected_stock(an_ingredient, 10, expected_held=4, barista_matic=barista_matic)
+        brewing_can_finish.set()
+
+    assert first_order.result().name == "a drink"
+    assert second_order.result().name == "a drink"
+    then_the_ingredient_has_the_expected_stock(an_ingredient, 6)
+
+
+@pytest.mark.timeout(5)
+def test_worker_pool_releases_the_ingredients_of_a_failed_brew():
+    def failing_brew(drink):
+        raise RuntimeError("Brew head is broken")
+
+    an_ingredient = helpers.given_an_ingredient(quantity=10)
+    barista_matic = given_a_thread_safe_baristamatic_with_a_drink(an_ingredient)
+
+    with BrewWorkerPool(barista_matic, brew=failing_brew) as pool:
+        order = pool.submit("1")
+
+    with pytest.raises(RuntimeError):
+        order.result()
+    then_the_ingredient_has_the_expected_stock(an_ingredient, 10)
@@ -0,0 +1,82 @@
+from barista_matic.adapters.caching_repository import CachingRepository
+from barista_matic.adapters.repository import FakeRepository
+from barista_matic.domain import model
+from tests import helpers
+
+
+def given_a_caching_repository_with_a_drink(bus, max_entries=10, ttl_seconds=60, clock=None):
+    repository = FakeRepository()
+    repository.add_drink(helpers.given_a_drink_with_ingredients(
+        model.DrinkIngredient(helpers.given_an_ingredient(quantity=3), 2)
+    ))
+    return CachingRepository(
+        repository, max_entries=max_entries, ttl_seconds=ttl_seconds, clock=clock or helpers.FakeClock(), bus=bus
+    )
+
+
+def then_the_cache_counts(caching_repository, hits, misses, evictions=0):
+    stats = caching_repository.get_cache_stats()
+    assert (stats.hits, stats.misses, stats.evictions) == (hits, misses, evictions)
+
+
+def test_caching_repository_serves_repeated_reads_from_the_cache(bus):
+    caching_repository = given_a_caching_repository_with_a_drink(bus)
+
+    for _ in range(3):
+        caching_repository.get_drinks()
+        caching_repository.get_ingredients()
+
+    then_the_cache_counts(caching_repository, hits=4, misses=2)
+    assert caching_repository.get_cache_stats().hit_rate == 4 / 6
+
+
+def test_caching_repository_evicts_the_least_recently_used_and_expired_reads(bus):
+    clock = helpers.FakeClock()
+    caching_repository = given_a_caching_repository_with_a_drink(bus, max_entries=2, ttl_seconds=10, clock=clock)
+
+    caching_repository.get_drinks()
+    caching_repository.get_ingredients()
+    caching_repository.get_stock()
+    caching_repository.get_drinks()
+    clock.advance(10)
+    caching_repository.get_stock()
+
+    then_the_cache_counts(caching_repository, hits=0, misses=5, evictions=4)
+
+
+def test_stock_changes_only_drop_the_reads_computed_from_the_stock(bus):
+    caching_repository = given_a_caching_repository_with_a_drink(bus)
+    drinks = caching_repository.get_drinks()
+    assert caching_repository.get_stock() == {"an ingredient": 3}
+    assert len(caching_repository.get_menu_page(in_stock_only=True)) == 1
+
+    next(iter(drinks)).dispense()
+
+    assert caching_repository.get_drinks() is drinks
+    assert caching_repository.get_stock() == {"an ingredient": 1}
+    assert caching_repository.get_menu_page(in_stock_only=True) == ()
+    then_the_cache_counts(caching_repository, hits=1, misses=5)
+
+
+def test_writes_go_through_and_drop_the_reads_they_change(bus):
+    caching_repository = given_a_caching_repository_with_a_drink(bus)
+    a_drink = next(iter(caching_repository.get_drinks()))
+    assert caching_repository.get_sales("day") == ()
+
+    caching_repository.add_drink(helpers.given_a_drink_with_ingredients(name="other drink"))
+    caching_repository.add_dispense(model.DispenseRecord.for_drink(a_drink, "default", request_id="request 1"))
+
+    assert {drink.name for drink in caching_repository.get_drinks()} == {"a drink", "other drink"}
+    assert [rollup.quantity for rollup in caching_repository.get_sales("day")] == [1]
+    assert caching_repository.get_dispense_by_request_id("request 1").drink_name == "a drink"
+    assert caching_repository.repository.ledger_by_request_id.keys() == {"request 1"}
+
+
+def test_rollback_drops_every_cached_read(bus):
+    caching_repository = given_a_caching_repository_with_a_drink(bus)
+    caching_repository.get_drinks()
+    caching_repository.get_stock()
+
+    caching_repository.rollback()
+
+    assert len(caching_repository.cache) == 0
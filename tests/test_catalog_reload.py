@@ -0,0 +1,117 @@
+import pytest
+
+from barista_matic.adapters.repository import FakeRepository
+from barista_matic.domain import model
+from barista_matic.service_layer.catalog_reload import CatalogReloader
+from barista_matic.service_layer.services import BaristaMatic
+from barista_matic.service_layer.unit_of_work import RepositoryUnitOfWork
+from tests import helpers
+
+
+class ClosingRepository(FakeRepository):
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def given_a_unit_of_work_with_a_drink(name):
+    repository = ClosingRepository()
+    repository.add_drink(helpers.given_a_drink_with_ingredients(
+        model.DrinkIngredient(helpers.given_an_ingredient(quantity=3), 1), name=name
+    ))
+    return RepositoryUnitOfWork(repository)
+
+
+def given_a_reloader_for_a_catalog_that_changes(barista_matic, catalog_keys):
+    return CatalogReloader(
+        barista_matic,
+        get_catalog_key=lambda: catalog_keys[0],
+        build_unit_of_work=lambda: given_a_unit_of_work_with_a_drink("reloaded"),
+        poll_seconds=0,
+    )
+
+
+def then_the_menu_has_the_drinks(barista_matic, *expected_names):
+    assert [drink.name for drink in barista_matic.get_menu().menu_items.values()] == list(expected_names)
+
+
+def test_reloader_swaps_the_catalog_only_after_a_change_and_closes_the_old_one():
+    unit_of_work = given_a_unit_of_work_with_a_drink("initial")
+    barista_matic = BaristaMatic(unit_of_work.repository, unit_of_work=unit_of_work)
+    catalog_keys = ["v1"]
+    reloader = given_a_reloader_for_a_catalog_that_changes(barista_matic, catalog_keys)
+
+    assert not reloader.check()
+    assert not reloader.swap()
+    catalog_keys[0] = "v2"
+    assert reloader.check()
+    assert not reloader.check()
+    then_the_menu_has_the_drinks(barista_matic, "initial")
+    assert reloader.swap()
+
+    then_the_menu_has_the_drinks(barista_matic, "reloaded")
+    assert unit_of_work.repository.closed
+    assert (reloader.catalog_key, reloader.reloads) == ("v2", 1)
+
+
+def test_reloader_waits_for_the_active_reservations_before_swapping():
+    unit_of_work = given_a_unit_of_work_with_a_drink("initial")
+    barista_matic = BaristaMatic(unit_of_work.repository, unit_of_work=unit_of_work)
+    catalog_keys = ["v1"]
+    reloader = given_a_reloader_for_a_catalog_that_changes(barista_matic, catalog_keys)
+    reservation = barista_matic.reserve("1")
+
+    catalog_keys[0] = "v2"
+    reloader.check()
+    assert not reloader.swap()
+    barista_matic.confirm(reservation)
+
+    assert reloader.swap()
+    then_the_menu_has_the_drinks(barista_matic, "reloaded")
+
+
+def test_cli_swaps_the_reloaded_catalog_before_rendering_the_menu(capsys, monkeypatch):
+    unit_of_work = given_a_unit_of_work_with_a_drink("initial")
+    barista_matic = BaristaMatic(unit_of_work.repository, unit_of_work=unit_of_work)
+    catalog_keys = ["v1"]
+    cli = helpers.given_an_interactive_cli_for_barista_service(barista_matic)
+    cli.catalog_reloader = given_a_reloader_for_a_catalog_that_changes(barista_matic, catalog_keys)
+    catalog_keys[0] = "v2"
+    cli.catalog_reloader.check()
+
+    helpers.when_the_interactive_cli_runs_with_user_inputs(cli, ["q"], monkeypatch)
+
+    helpers.then_the_cli_output_has(capsys, "reloaded")
+
+
+def test_reloader_closes_a_catalog_that_failed_to_load():
+    class FailingRepository(ClosingRepository):
+        def get_drinks(self):
+            raise RuntimeError("Database is unavailable")
+
+    unit_of_work = given_a_unit_of_work_with_a_drink("initial")
+    failing_unit_of_work = RepositoryUnitOfWork(FailingRepository())
+    reloader = CatalogReloader(
+        BaristaMatic(unit_of_work.repository, unit_of_work=unit_of_work),
+        get_catalog_key=lambda: "v2",
+        build_unit_of_work=lambda: failing_unit_of_work,
+        poll_seconds=0,
+    )
+    reloader.catalog_key = "v1"
+
+    with pytest.raises(RuntimeError):
+        reloader.check()
+
+    assert failing_unit_of_work.repository.closed
+    assert not reloader.swap()
+
+
+def test_reloader_does_not_poll_when_the_reload_is_disabled():
+    unit_of_work = given_a_unit_of_work_with_a_drink("initial")
+    reloader = given_a_reloader_for_a_catalog_that_changes(
+        BaristaMatic(unit_of_work.repository, unit_of_work=unit_of_work), ["v1"]
+    )
+
+    with pytest.raises(ValueError):
+        reloader.start()
@@ -0,0 +1,54 @@
+from barista_matic.adapters.catalog_snapshot import (
+    CatalogSnapshot,
+    load_catalog_snapshot,
+)
+from barista_matic.adapters.repository import FakeRepository
+from barista_matic.domain import model
+from tests import helpers
+
+
+def given_a_repository_with_drinks(stock=10):
+    an_ingredient = helpers.given_an_ingredient("an ingredient", quantity=stock, unit_cost=1.5)
+    other_ingredient = helpers.given_an_ingredient("other ingredient", quantity=stock, unit_cost=0.25)
+    repository = FakeRepository()
+    repository.add_drink(helpers.given_a_drink_with_ingredients(
+        model.DrinkIngredient(an_ingredient, 2), model.DrinkIngredient(other_ingredient, 1), name="mocha"
+    ))
+    repository.add_drink(helpers.given_a_drink_with_ingredients(model.DrinkIngredient(an_ingredient, 3), name="latte"))
+    return repository
+
+
+def test_catalog_snapshot_survives_a_dump_and_a_load():
+    repository = given_a_repository_with_drinks()
+    snapshot = CatalogSnapshot.from_catalog(
+        repository.get_catalog_key(), repository.get_drinks(), repository.get_ingredients()
+    )
+
+    assert CatalogSnapshot.loads(snapshot.dumps()) == snapshot
+    assert CatalogSnapshot.loads(b"not a snapshot") is None
+
+
+def test_load_catalog_snapshot_rebuilds_a_stale_snapshot(tmp_path):
+    repository = given_a_repository_with_drinks()
+    path = str(tmp_path / "catalog.snapshot")
+    load_catalog_snapshot(repository, path)
+
+    next(iter(repository.get_ingredients())).unit_cost = 5
+    snapshot = load_catalog_snapshot(repository, path)
+
+    assert snapshot.key == repository.get_catalog_key()
+    assert snapshot == CatalogSnapshot.loads((tmp_path / "catalog.snapshot").read_bytes())
+
+
+def test_snapshot_frame_is_the_same_as_the_regular_frame(tmp_path, capsys):
+    repository = given_a_repository_with_drinks(stock=4)
+    cli = helpers.given_an_interactive_cli_for_barista_service(
+        helpers.given_a_baristamatic_service_with_repository(repository)
+    )
+    cli.render_frame()
+    regular_frame = capsys.readouterr().out
+
+    snapshot = load_catalog_snapshot(repository, str(tmp_path / "catalog.snapshot"))
+    cli.render_snapshot_frame(snapshot, repository.get_stock())
+
+    assert capsys.readouterr().out == regular_frame
@@ -0,0 +1,161 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from barista_matic.adapters.repository import FakeRepository
+from barista_matic.domain import (
+    exceptions,
+    model,
+)
+from barista_matic.service_layer import services
+from tests import helpers
+
+BREW_SECONDS = 0.01
+
+
+class SlowIngredient(model.Ingredient):
+    """Ingredient that takes some time to be dispensed, with a non-atomic stock update"""
+    def deallocate_quantity(self, quantity: int) -> None:
+        available_quantity = self.available_quantity
+        time.sleep(BREW_SECONDS)
+        self.available_quantity = available_quantity - quantity
+
+    def __hash__(self):
+        return hash(self.name)
+
+
+def given_a_thread_safe_baristamatic_with_drinks(*drinks) -> services.ThreadSafeBaristaMatic:
+    repository = FakeRepository()
+    for drink in drinks:
+        repository.add_drink(drink)
+    return services.ThreadSafeBaristaMatic(repository)
+
+
+def when_the_workers_dispense_the_references(barista_matic, references, workers):
+    def dispense(reference):
+        try:
+            return barista_matic.dispense_drink_by_menu_reference(reference)
+        except exceptions.OutOfStock:
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return [drink for drink in executor.map(dispense, references) if drink is not None]
+
+
+def when_the_workers_dispense_and_are_timed(barista_matic, references, workers):
+    start = time.perf_counter()
+    when_the_workers_dispense_the_references(barista_matic, references, workers)
+    return time.perf_counter() - start
+
+
+@pytest.mark.timeout(10)
+def test_concurrent_dispenses_never_oversell():
+    an_ingredient = SlowIngredient("an ingredient", 20, 1)
+    other_ingredient = SlowIngredient("other ingredient", 100, 1)
+    drink_1 = helpers.given_a_drink_with_ingredients(
+        model.DrinkIngredient(an_ingredient, 3),
+        model.DrinkIngredient(other_ingredient, 1),
+        name="drink a",
+    )
+    drink_2 = helpers.given_a_drink_with_ingredients(
+        model.DrinkIngredient(other_ingredient, 2),
+        model.DrinkIngredient(an_ingredient, 1),
+        name="drink b",
+    )
+    barista_matic = given_a_thread_safe_baristamatic_with_drinks(drink_1, drink_2)
+
+    dispensed = when_the_workers_dispense_the_references(barista_matic, ["1", "2"] * 20, workers=8)
+
+    used_quantity = sum(3 if drink is drink_1 else 1 for drink in dispensed)
+    assert an_ingredient.get_available_quantity() == 20 - used_quantity
+    assert an_ingredient.get_available_quantity() >= 0
+    assert other_ingredient.get_available_quantity() >= 0
+    assert an_ingredient.get_available_quantity() < 3
+
+
+@pytest.mark.timeout(10)
+def test_drinks_without_shared_ingredients_are_dispensed_in_parallel():
+    drinks = [
+        helpers.given_a_drink_with_ingredients(
+            model.DrinkIngredient(SlowIngredient(f"ingredient {index}", 100, 1), 1),
+            name=f"drink {index}",
+        )
+        for index in range(4)
+    ]
+    references = ["1", "2", "3", "4"] * 5
+
+    one_worker_seconds = when_the_workers_dispense_and_are_timed(
+        given_a_thread_safe_baristamatic_with_drinks(*drinks), references, workers=1
+    )
+    four_workers_seconds = when_the_workers_dispense_and_are_timed(
+        given_a_thread_safe_baristamatic_with_drinks(*drinks), references, workers=4
+    )
+
+    assert four_workers_seconds < one_worker_seconds / 2
+
+
+@pytest.mark.timeout(10)
+def test_drinks_sharing_an_ingredient_are_serialized():
+    shared_ingredient = SlowIngredient("shared", 100, 1)
+    drinks = [
+        helpers.given_a_drink_with_ingredients(model.DrinkIngredient(shared_ingredient, 1), name=f"drink {index}")
+        for index in range(4)
+    ]
+
+    dispensed = when_the_workers_dispense_the_references(
+        given_a_thread_safe_baristamatic_with_drinks(*drinks), ["1", "2", "3", "4"] * 5, workers=4
+    )
+
+    assert len(dispensed) == 20
+    assert shared_ingredient.get_available_quantity() == 80
+
+
+@pytest.mark.timeout(10)
+def test_concurrent_retries_of_a_request_dispense_once():
+    an_ingredient = SlowIngredient("an ingredient", 20, 1)
+    barista_matic = given_a_thread_safe_baristamatic_with_drinks(
+        helpers.given_a_drink_with_ingredients(model.DrinkIngredient(an_ingredient, 1))
+    )
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        drinks = list(executor.map(
+            lambda _: barista_matic.dispense_drink_by_menu_reference("1", request_id="request 1"), range(8)
+        ))
+
+    assert {drink.name for drink in drinks} == {"a drink"}
+    assert an_ingredient.get_available_quantity() == 19
+    assert len(barista_matic.repository.ledger) == 1
+
+
+class SessionBoundRepository(FakeRepository):
+    """Repository whose objects can't be changed by several threads at once, as the rows of a session"""
+    thread_safe_objects = False
+
+
+class CountingIngredient(SlowIngredient):
+    """Slow ingredient that records how many stock changes were in progress at once, on every ingredient"""
+    in_progress = 0
+    max_in_progress = 0
+
+    def deallocate_quantity(self, quantity: int) -> None:
+        CountingIngredient.in_progress += 1
+        CountingIngredient.max_in_progress = max(CountingIngredient.max_in_progress, CountingIngredient.in_progress)
+        super().deallocate_quantity(quantity)
+        CountingIngredient.in_progress -= 1
+
+
+@pytest.mark.timeout(10)
+def test_stock_changes_of_session_bound_objects_are_serialized():
+    repository = SessionBoundRepository()
+    for index in range(4):
+        repository.add_drink(helpers.given_a_drink_with_ingredients(
+            model.DrinkIngredient(CountingIngredient(f"ingredient {index}", 100, 1), 1),
+            name=f"drink {index}",
+        ))
+    barista_matic = services.ThreadSafeBaristaMatic(repository)
+
+    dispensed = when_the_workers_dispense_the_references(barista_matic, ["1", "2", "3", "4"] * 3, workers=4)
+
+    assert len(dispensed) == 12
+    assert CountingIngredient.max_in_progress == 1
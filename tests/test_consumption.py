@@ -0,0 +1,76 @@
+import pytest
+
+from barista_matic.adapters.repository import FakeRepository
+from barista_matic.domain import model
+from barista_matic.service_layer import services
+from barista_matic.service_layer.consumption import ConsumptionTracker
+from tests import helpers
+
+HALF_LIFE_SECONDS = 3600
+
+
+def given_a_tracker(clock):
+    return ConsumptionTracker(half_life_seconds=HALF_LIFE_SECONDS, clock=clock)
+
+
+def when_the_ingredient_is_used_every_second(tracker, clock, ingredient_name, quantity, seconds):
+    for _ in range(seconds):
+        clock.advance(1)
+        tracker.record(ingredient_name, quantity)
+
+
+def test_tracker_estimates_a_steady_consumption_rate():
+    clock = helpers.FakeClock()
+    tracker = given_a_tracker(clock)
+
+    when_the_ingredient_is_used_every_second(tracker, clock, "coffee", 2, seconds=600)
+
+    assert tracker.get_rate("coffee") == pytest.approx(2, rel=0.01)
+    assert tracker.get_rate("sugar") == 0
+
+
+def test_tracker_rate_decays_when_the_ingredient_is_not_used():
+    clock = helpers.FakeClock()
+    tracker = given_a_tracker(clock)
+    when_the_ingredient_is_used_every_second(tracker, clock, "coffee", 2, seconds=600)
+    rate = tracker.get_rate("coffee")
+
+    clock.advance(HALF_LIFE_SECONDS)
+
+    assert tracker.get_rate("coffee") < rate / 2
+
+
+def test_tracker_estimates_time_to_stockout_and_restock_soon_list():
+    clock = helpers.FakeClock()
+    tracker = given_a_tracker(clock)
+    coffee = helpers.given_an_ingredient("coffee", quantity=100)
+    sugar = helpers.given_an_ingredient("sugar", quantity=100)
+    cocoa = helpers.given_an_ingredient("cocoa", quantity=100)
+    for _ in range(100):
+        clock.advance(1)
+        tracker.record("coffee", 1)
+        tracker.record("sugar", 0.01)
+
+    estimates = tracker.get_time_to_stockout([coffee, sugar, cocoa])
+
+    assert estimates["coffee"] == pytest.approx(100, rel=0.05)
+    assert estimates["sugar"] == pytest.approx(10000, rel=0.05)
+    assert estimates["cocoa"] is None
+    assert tracker.get_restock_soon([coffee, sugar, cocoa], horizon_seconds=1800) == ("coffee", )
+
+
+def test_barista_matic_feeds_the_tracker_on_every_dispense():
+    clock = helpers.FakeClock()
+    tracker = given_a_tracker(clock)
+    an_ingredient = helpers.given_an_ingredient("coffee", quantity=10)
+    repository = FakeRepository()
+    repository.add_drink(helpers.given_a_drink_with_ingredients(model.DrinkIngredient(an_ingredient, 2)))
+    barista_matic = services.BaristaMatic(repository, clock=clock, consumption_tracker=tracker)
+
+    clock.advance(10)
+    barista_matic.dispense_drink_by_menu_reference("1")
+    clock.advance(10)
+    barista_matic.dispense_drink_by_menu_reference("1")
+
+    assert tracker.get_rate("coffee") > 0
+    assert barista_matic.get_restock_soon(horizon_seconds=1800) == ("coffee", )
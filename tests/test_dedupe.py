@@ -0,0 +1,31 @@
+from barista_matic.service_layer.dedupe import DedupeCache
+from tests import helpers
+
+
+def test_dedupe_cache_evicts_the_least_recently_used_request():
+    cache = DedupeCache(max_entries=2)
+    cache.put("request 1", "a drink")
+    cache.put("request 2", "other drink")
+
+    cache.get("request 1")
+    cache.put("request 3", "a drink")
+
+    assert cache.get("request 1") == "a drink"
+    assert cache.get("request 2") is None
+    assert len(cache) == 2
+
+
+def test_dedupe_cache_forgets_requests_after_the_ttl():
+    clock = helpers.FakeClock()
+    cache = DedupeCache(ttl_seconds=10, clock=clock)
+    cache.put("request 1", "a drink")
+
+    clock.advance(5)
+    cache.put("request 2", "a drink")
+    assert cache.get("request 1") == "a drink"
+
+    clock.advance(5)
+    assert cache.get("request 1") is None
+    clock.advance(5)
+    cache.put("request 3", "a drink")
+    assert len(cache) == 1
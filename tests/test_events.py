@@ -0,0 +1,145 @@
+import threading
+
+import pytest
+
+from barista_matic.adapters.repository import FakeRepository
+from barista_matic.domain import (
+    events,
+    model,
+)
+from barista_matic.service_layer import services
+from tests import helpers
+
+
+def given_a_subscriber(bus, event_type):
+    received = []
+    bus.subscribe(event_type, received.append)
+    return received
+
+
+def test_dispensing_a_drink_publishes_stock_changes_and_the_dispense(bus):
+    stock_changes = given_a_subscriber(bus, events.IngredientStockChanged)
+    dispenses = given_a_subscriber(bus, events.DrinkDispensed)
+    an_ingredient = helpers.given_an_ingredient(quantity=10)
+    a_drink = helpers.given_a_drink_with_ingredients(model.DrinkIngredient(an_ingredient, 2))
+
+    a_drink.dispense()
+    an_ingredient.restock_to_quantity(10)
+
+    assert stock_changes == [
+        events.IngredientStockChanged("an ingredient", "default", 10, 8),
+        events.IngredientStockChanged("an ingredient", "default", 8, 10),
+    ]
+    assert dispenses == [events.DrinkDispensed("a drink", "default")]
+
+
+def given_a_baristamatic_with_a_drink(an_ingredient, quantity=2):
+    repository = FakeRepository()
+    repository.add_drink(helpers.given_a_drink_with_ingredients(model.DrinkIngredient(an_ingredient, quantity)))
+    return services.BaristaMatic(repository)
+
+
+def test_events_of_a_transaction_are_published_once_committed(bus):
+    stock_changes = given_a_subscriber(bus, events.IngredientStockChanged)
+    an_ingredient = helpers.given_an_ingredient(quantity=10)
+    barista_matic = given_a_baristamatic_with_a_drink(an_ingredient)
+
+    with barista_matic.transaction():
+        an_ingredient.deallocate_quantity(2)
+        assert stock_changes == []
+
+    assert stock_changes == [events.IngredientStockChanged("an ingredient", "default", 10, 8)]
+
+
+def test_events_of_a_rolled_back_transaction_are_dropped(bus):
+    stock_changes = given_a_subscriber(bus, events.IngredientStockChanged)
+    dispenses = given_a_subscriber(bus, events.DrinkDispensed)
+    barista_matic = given_a_baristamatic_with_a_drink(helpers.given_an_ingredient(quantity=10))
+
+    def failing_add_to_ledger(*args):
+        raise RuntimeError("Ledger is unavailable")
+
+    barista_matic.add_to_ledger = failing_add_to_ledger
+
+    with pytest.raises(RuntimeError):
+        barista_matic.dispense_drink_by_menu_reference("1")
+
+    assert stock_changes == []
+    assert dispenses == []
+
+
+def test_reservations_publish_the_dispense_when_confirmed(bus):
+    dispenses = given_a_subscriber(bus, events.DrinkDispensed)
+    barista_matic = given_a_baristamatic_with_a_drink(helpers.given_an_ingredient(quantity=10))
+
+    reservation = barista_matic.reserve("1")
+    barista_matic.release(barista_matic.reserve("1"))
+    assert dispenses == []
+
+    barista_matic.confirm(reservation)
+    assert dispenses == [events.DrinkDispensed("a drink", "default")]
+
+
+def test_unsubscribed_handler_does_not_get_events(bus):
+    received = []
+    subscription = bus.subscribe(events.IngredientStockChanged, received.append)
+
+    bus.unsubscribe(subscription)
+    helpers.given_an_ingredient().deallocate_quantity(1)
+
+    assert received == []
+
+
+def test_failing_handler_does_not_stop_the_domain(bus):
+    def failing_handler(event):
+        raise RuntimeError("Display is disconnected")
+
+    bus.subscribe(events.IngredientStockChanged, failing_handler)
+    received = given_a_subscriber(bus, events.IngredientStockChanged)
+    an_ingredient = helpers.given_an_ingredient(quantity=10)
+
+    an_ingredient.deallocate_quantity(1)
+
+    assert an_ingredient.get_available_quantity() == 9
+    assert len(received) == 1
+
+
+def test_coalescing_subscriber_gets_one_merged_event_per_ingredient_and_window(bus):
+    received = []
+    subscription = bus.subscribe(events.IngredientStockChanged, received.append, coalesce_seconds=60)
+    an_ingredient = helpers.given_an_ingredient("an ingredient", quantity=10)
+    other_ingredient = helpers.given_an_ingredient("other ingredient", quantity=10)
+
+    for _ in range(3):
+        an_ingredient.deallocate_quantity(1)
+    other_ingredient.deallocate_quantity(1)
+
+    assert received == [
+        events.IngredientStockChanged("an ingredient", "default", 10, 9),
+        events.IngredientStockChanged("other ingredient", "default", 10, 9),
+    ]
+
+    subscription.flush()
+
+    assert received[2:] == [events.IngredientStockChanged("an ingredient", "default", 9, 7)]
+
+
+@pytest.mark.timeout(2)
+def test_coalesced_events_are_delivered_when_the_window_is_over(bus):
+    delivered = threading.Event()
+    received = []
+
+    def handler(event):
+        received.append(event)
+        if len(received) == 2:
+            delivered.set()
+
+    bus.subscribe(events.IngredientStockChanged, handler, coalesce_seconds=0.05)
+    an_ingredient = helpers.given_an_ingredient(quantity=10)
+
+    an_ingredient.deallocate_quantity(1)
+    an_ingredient.deallocate_quantity(1)
+    an_ingredient.deallocate_quantity(1)
+
+    assert delivered.wait(1)
+    assert received[1] == events.IngredientStockChanged("an ingredient", "default", 9, 7)
@@ -0,0 +1,55 @@
+import csv
+import gzip
+import json
+from datetime import datetime
+
+from barista_matic.adapters.repository import FakeRepository
+from barista_matic.domain import model
+from barista_matic.entrypoints import export
+from tests import helpers
+
+
+def given_a_repository_with_a_dispensed_drink():
+    repository = FakeRepository()
+    repository.add_drink(helpers.given_a_drink_with_ingredients(
+        model.DrinkIngredient(helpers.given_an_ingredient("milk", quantity=3), 1),
+        model.DrinkIngredient(helpers.given_an_ingredient("coffee", quantity=5), 2),
+        name="latte",
+    ))
+    repository.add_dispense(model.DispenseRecord("latte", 2.5, datetime(2026, 1, 2, 3, 4, 5), "default", "request 1"))
+    return repository
+
+
+def test_export_writes_the_recipes_as_csv(tmp_path):
+    path = str(tmp_path / "recipes.csv")
+
+    exported = export.export_table(given_a_repository_with_a_dispensed_drink(), "recipes", path)
+
+    with open(path, newline="") as exported_file:
+        assert list(csv.reader(exported_file)) == [
+            ["drink_name", "ingredient_name", "ingredient_quantity", "machine_id"],
+            ["latte", "coffee", "2", "default"],
+            ["latte", "milk", "1", "default"],
+        ]
+    assert exported == 2
+
+
+def test_export_writes_the_ledger_as_compressed_json_lines(tmp_path):
+    path = str(tmp_path / "ledger.jsonl.gz")
+
+    export.export_table(given_a_repository_with_a_dispensed_drink(), "ledger", path)
+
+    with gzip.open(path, "rt") as exported_file:
+        assert [json.loads(line) for line in exported_file] == [{
+            "drink_name": "latte",
+            "price": 2.5,
+            "dispensed_at": "2026-01-02T03:04:05",
+            "machine_id": "default",
+            "request_id": "request 1",
+        }]
+
+
+def test_export_format_comes_from_the_extension_unless_given():
+    assert export.get_format("inventory.jsonl.gz") == "jsonl"
+    assert export.get_format("inventory.txt") == "csv"
+    assert export.get_format("-", "jsonl") == "jsonl"
@@ -0,0 +1,28 @@
+from barista_matic.adapters.repository import FakeRepository
+from barista_matic.domain import model
+from barista_matic.entrypoints.http_api import (
+    etag_matches,
+    get_read_etag,
+)
+from tests import helpers
+
+
+def test_read_etag_follows_the_stock_and_the_catalog():
+    an_ingredient = helpers.given_an_ingredient(quantity=3)
+    repository = FakeRepository()
+    repository.add_drink(helpers.given_a_drink_with_ingredients(model.DrinkIngredient(an_ingredient, 1)))
+    etags = [get_read_etag(repository), get_read_etag(repository)]
+
+    an_ingredient.unit_cost += 1
+    etags.append(get_read_etag(repository))
+    an_ingredient.restock_to_quantity(10)
+    etags.append(get_read_etag(repository))
+
+    assert etags[0] == etags[1]
+    assert len(set(etags)) == 3
+
+
+def test_etag_matches_lists_weak_etags_and_any():
+    assert etag_matches('"a-1", W/"a-2"', '"a-2"')
+    assert etag_matches("*", '"a-2"')
+    assert not etag_matches('"a-1"', '"a-2"')
@@ -0,0 +1,54 @@
+import gzip
+import json
+from datetime import datetime
+
+from barista_matic.adapters.repository import FakeRepository
+from barista_matic.domain import model
+from barista_matic.entrypoints import ledger_retention
+
+
+def given_a_repository_with_dispenses_on(*dispense_times):
+    repository = FakeRepository()
+    for index, dispensed_at in enumerate(dispense_times):
+        repository.add_dispense(model.DispenseRecord("latte", 2.5, dispensed_at, "default", f"request {index}"))
+    return repository
+
+
+def then_the_archive_has_the_requests(path, *expected_request_ids):
+    with gzip.open(path, "rt", encoding="utf-8") as archive:
+        assert [json.loads(line)["request_id"] for line in archive] == list(expected_request_ids)
+
+
+def test_retention_cutoff_keeps_the_current_month_and_the_retention_months():
+    now = datetime(2026, 2, 15, 10)
+
+    assert ledger_retention.get_retention_cutoff(now, 1) == datetime(2026, 1, 1)
+    assert ledger_retention.get_retention_cutoff(now, 3) == datetime(2025, 11, 1)
+
+
+def test_compact_ledger_archives_the_old_months_and_keeps_the_sales(tmp_path):
+    repository = given_a_repository_with_dispenses_on(
+        datetime(2025, 11, 30, 23), datetime(2026, 1, 1), datetime(2025, 11, 2), datetime(2026, 2, 3)
+    )
+    sales = repository.get_sales("day")
+
+    archived_months = ledger_retention.compact_ledger(repository, tmp_path, datetime(2026, 2, 1), "default")
+
+    assert [(month.month_start, month.archived, month.deleted) for month in archived_months] == [
+        (datetime(2025, 11, 1), 2, 2), (datetime(2026, 1, 1), 1, 1)
+    ]
+    then_the_archive_has_the_requests(tmp_path / "ledger-default-2025-11.jsonl.gz", "request 2", "request 0")
+    then_the_archive_has_the_requests(tmp_path / "ledger-default-2026-01.jsonl.gz", "request 1")
+    assert [row[4] for row in repository.stream_ledger()] == ["request 3"]
+    assert repository.get_sales("day") == sales
+
+
+def test_compact_ledger_only_deletes_a_month_archived_by_an_interrupted_run(tmp_path):
+    repository = given_a_repository_with_dispenses_on(datetime(2026, 1, 5), datetime(2026, 1, 6))
+    ledger_retention.archive_month(repository, datetime(2026, 1, 1), tmp_path / "ledger-default-2026-01.jsonl.gz")
+
+    archived_months = ledger_retention.compact_ledger(repository, tmp_path, datetime(2026, 2, 1), "default")
+
+    assert [(month.archived, month.deleted) for month in archived_months] == [(None, 2)]
+    assert repository.get_oldest_dispense_time() is None
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["ledger-default-2026-01.jsonl.gz"]
@@ -0,0 +1,39 @@
+import pytest
+
+from barista_matic.entrypoints.memory_report import (
+    MemoryBudget,
+    MemoryBudgetExceeded,
+    MemoryReport,
+    build_fake_service,
+    measure_memory,
+)
+
+
+def given_a_memory_report(bytes_per_drink=1000, session_growth_bytes=0):
+    return MemoryReport(
+        catalog_size=10,
+        ingredient_count=5,
+        bytes_per_drink=bytes_per_drink,
+        bytes_per_ingredient=500,
+        menu_render_peak_bytes=1000,
+        session_commands=100,
+        session_growth_bytes=session_growth_bytes,
+    )
+
+
+def test_memory_budget_reports_every_exceeded_measure():
+    budget = MemoryBudget(bytes_per_drink=2000, session_growth_bytes_per_command=10)
+
+    budget.check(given_a_memory_report())
+    with pytest.raises(MemoryBudgetExceeded) as err:
+        budget.check(given_a_memory_report(bytes_per_drink=3000, session_growth_bytes=2000))
+
+    assert err.value.exceeded == ["bytes_per_drink 3000 > 2000", "session_growth_bytes_per_command 20 > 10"]
+
+
+@pytest.mark.timeout(10.0)
+def test_fake_service_memory_is_within_the_budget():
+    report = measure_memory(build_fake_service, catalog_size=40, ingredient_count=10, session_commands=200)
+
+    assert report.bytes_per_drink > 0
+    MemoryBudget().check(report)
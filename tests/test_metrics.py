@@ -0,0 +1,131 @@
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from barista_matic.adapters.repository import FakeRepository
+from barista_matic.domain import (
+    exceptions,
+    model,
+)
+from barista_matic.entrypoints.metrics_http import start_metrics_server
+from barista_matic.service_layer.metrics import (
+    BaristaMetrics,
+    Counter,
+    Histogram,
+)
+from barista_matic.service_layer.services import BaristaMatic
+from tests import helpers
+
+
+def given_a_baristamatic_with_metrics(bus, stock=3):
+    repository = FakeRepository()
+    repository.add_drink(helpers.given_a_drink_with_ingredients(
+        model.DrinkIngredient(helpers.given_an_ingredient("coffee", quantity=stock), 2), name="espresso"
+    ))
+    return BaristaMatic(repository, metrics=BaristaMetrics(bus=bus))
+
+
+def then_the_metrics_have_lines(metrics, *expected_lines):
+    lines = metrics.render().splitlines()
+    for expected_line in expected_lines:
+        assert expected_line in lines
+
+
+def test_counter_merges_the_shards_of_every_thread():
+    counter = Counter("a_total", "A counter.", ("kind", ))
+
+    def increment():
+        for _ in range(1000):
+            counter.inc("a")
+
+    threads = [threading.Thread(target=increment) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    counter.inc("b", amount=2)
+
+    assert counter.get_values() == {("a", ): 4000, ("b", ): 2}
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("latency_seconds", "A histogram.", buckets=(0.1, 1))
+
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.observe(value)
+
+    assert histogram.render().splitlines() == [
+        "# HELP latency_seconds A histogram.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{le="0.1"} 2',
+        'latency_seconds_bucket{le="1"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        "latency_seconds_sum 3.65",
+        "latency_seconds_count 4",
+    ]
+
+
+def test_metrics_count_dispenses_out_of_stock_and_follow_the_stock(bus):
+    barista_matic = given_a_baristamatic_with_metrics(bus)
+
+    barista_matic.dispense_drink_by_menu_reference("1")
+    with pytest.raises(exceptions.OutOfStock):
+        barista_matic.dispense_drink_by_menu_reference("1")
+
+    then_the_metrics_have_lines(
+        barista_matic.metrics,
+        'baristamatic_dispenses_total{drink="espresso"} 1',
+        'baristamatic_out_of_stock_total{ingredient="coffee"} 1',
+        'baristamatic_ingredient_stock{ingredient="coffee"} 1',
+    )
+
+
+def test_metrics_count_only_the_committed_dispenses(bus):
+    barista_matic = given_a_baristamatic_with_metrics(bus, stock=10)
+
+    def failing_add_to_ledger(*args):
+        raise RuntimeError("Ledger is unavailable")
+
+    reservation = barista_matic.reserve("1")
+    barista_matic.release(barista_matic.reserve("1"))
+    assert barista_matic.metrics.dispenses.get_values() == {}
+    barista_matic.confirm(reservation)
+    barista_matic.add_to_ledger = failing_add_to_ledger
+    with pytest.raises(RuntimeError):
+        barista_matic.dispense_drink_by_menu_reference("1")
+
+    assert barista_matic.metrics.dispenses.get_values() == {("espresso", ): 1}
+
+
+def test_cli_records_command_latency_and_invalid_selections(bus, monkeypatch):
+    barista_matic = given_a_baristamatic_with_metrics(bus)
+    cli = helpers.given_an_interactive_cli_for_barista_service(barista_matic)
+
+    helpers.when_the_interactive_cli_runs_with_user_inputs(cli, ["1", "x", "q"], monkeypatch)
+
+    then_the_metrics_have_lines(
+        barista_matic.metrics,
+        "baristamatic_invalid_selections_total 1",
+        'baristamatic_command_seconds_count{command="Dispense"} 1',
+        'baristamatic_command_seconds_count{command="InvalidCommand"} 1',
+    )
+
+
+@pytest.mark.timeout(5.0)
+def test_metrics_server_serves_the_prometheus_text(bus):
+    metrics = BaristaMetrics(bus=bus)
+    metrics.set_stock({"coffee": 7})
+    server = start_metrics_server(metrics, "127.0.0.1", 0)
+    try:
+        with urllib.request.urlopen(server.url) as response:
+            content_type = response.headers["Content-Type"]
+            body = response.read().decode("utf-8")
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(server.url.replace("/metrics", "/other"))
+    finally:
+        server.stop()
+
+    assert content_type.startswith("text/plain; version=0.0.4")
+    assert 'baristamatic_ingredient_stock{ingredient="coffee"} 7' in body.splitlines()
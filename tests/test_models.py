@@ -1,6 +1,10 @@
+import tracemalloc
+from datetime import timedelta
+
 import pytest
 
 from barista_matic.domain import (
+    events,
     exceptions,
     model,
 )
@@ -95,3 +99,210 @@ def test_ingredients_restock():
     an_ingredient.restock_to_quantity(20)
 
     then_the_ingredient_has_the_expected_quantity(an_ingredient, 20)
+
+
+def test_release_a_dispensed_drink_gives_back_the_ingredients():
+    an_ingredient = helpers.given_an_ingredient(quantity=10)
+    a_drink = helpers.given_a_drink_with_ingredients(
+        model.DrinkIngredient(an_ingredient, 2)
+    )
+
+    when_the_drink_is_dispensed(a_drink)
+    a_drink.release()
+
+    then_the_ingredient_has_the_expected_quantity(an_ingredient, 10)
+
+
+EXTRA_SHOT = model.Customization("extra shot", (("coffee", 1), ))
+NO_SUGAR = model.Customization("no sugar", (("sugar", -1), ))
+
+
+def given_a_coffee_with_sugar():
+    coffee = model.Ingredient("coffee", 10, 0.75)
+    sugar = model.Ingredient("sugar", 10, 0.25)
+    return helpers.given_a_drink_with_ingredients(
+        model.DrinkIngredient(coffee, 2), model.DrinkIngredient(sugar, 1), name="coffee"
+    )
+
+
+def test_customized_drink_cost_and_dispense_use_the_base_recipe_with_the_deltas():
+    a_drink = given_a_coffee_with_sugar()
+    coffee, sugar = (line.ingredient for line in a_drink.ingredients)
+
+    customized_drink = model.CustomizedDrink(a_drink, (EXTRA_SHOT, NO_SUGAR))
+    when_the_drink_is_dispensed(customized_drink)
+
+    assert customized_drink.name == "coffee + extra shot + no sugar"
+    then_the_drink_has_the_expected_cost(customized_drink, 0.75 * 3)
+    then_the_ingredient_has_the_expected_quantity(coffee, 7)
+    then_the_ingredient_has_the_expected_quantity(sugar, 10)
+    assert [(line.ingredient.name, line.ingredient_quantity) for line in a_drink.ingredients] == [
+        ("coffee", 2), ("sugar", 1)
+    ]
+
+
+def test_customized_drink_checks_the_stock_of_the_customized_quantities():
+    a_drink = given_a_coffee_with_sugar()
+    a_drink.ingredients[0].ingredient.restock_to_quantity(2)
+
+    assert a_drink.can_be_dispensed()
+    assert not model.CustomizedDrink(a_drink, (EXTRA_SHOT, )).can_be_dispensed()
+    with pytest.raises(exceptions.OutOfStock):
+        when_the_drink_is_dispensed(model.CustomizedDrink(a_drink, (EXTRA_SHOT, )))
+
+
+def test_customized_drink_adds_ingredients_from_the_inventory():
+    a_drink = given_a_coffee_with_sugar()
+    milk = model.Ingredient("milk", 10, 0.5)
+    with_milk = model.Customization("with milk", (("milk", 2), ))
+
+    customized_drink = model.CustomizedDrink(a_drink, (with_milk, ), {"milk": milk})
+
+    then_the_drink_has_the_expected_cost(customized_drink, 0.75 * 2 + 0.25 + 0.5 * 2)
+    with pytest.raises(exceptions.InvalidCustomization):
+        model.CustomizedDrink(a_drink, (with_milk, )).get_cost()
+
+
+def test_parse_customizations_reads_the_deltas_of_every_customization():
+    customizations = model.parse_customizations(" extra shot: Espresso=1, Sugar=+2 ; no cream:Cream=-1;")
+
+    assert customizations == (
+        model.Customization("extra shot", (("Espresso", 1), ("Sugar", 2))),
+        model.Customization("no cream", (("Cream", -1), )),
+    )
+    assert model.parse_customizations("") == ()
+
+
+@pytest.mark.parametrize("spec", ["extra shot", ":Espresso=1", "extra shot:", "extra shot:Espresso", "shot:Espresso=a"])
+def test_parse_customizations_refuses_malformed_customizations(spec):
+    with pytest.raises(ValueError):
+        model.parse_customizations(spec)
+
+
+def test_customized_drinks_share_the_base_recipe():
+    a_drink = given_a_coffee_with_sugar()
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        variants = [model.CustomizedDrink(a_drink, (EXTRA_SHOT, NO_SUGAR)) for _ in range(1000)]
+        bytes_per_variant = (tracemalloc.get_traced_memory()[0] - before) / len(variants)
+    finally:
+        tracemalloc.stop()
+
+    assert bytes_per_variant < 256
+    assert all(variant.base is a_drink for variant in variants)
+
+
+def test_customized_drink_computes_its_lines_once():
+    customized_drink = model.CustomizedDrink(given_a_coffee_with_sugar(), (EXTRA_SHOT, NO_SUGAR))
+
+    customized_drink.check_can_be_dispensed()
+
+    assert customized_drink.ingredients is customized_drink.ingredients
+
+
+def given_an_ingredient_with_lots(*lots):
+    an_ingredient = helpers.given_an_ingredient(quantity=0)
+    for lot in lots:
+        an_ingredient.receive_lot(lot)
+    return an_ingredient
+
+
+def test_ingredient_with_lots_consumes_the_lot_that_expires_first():
+    now = model.utcnow()
+    later_lot = model.Lot(5, now + timedelta(days=3))
+    sooner_lot = model.Lot(5, now + timedelta(days=1))
+    undated_lot = model.Lot(5)
+    an_ingredient = given_an_ingredient_with_lots(later_lot, undated_lot, sooner_lot)
+
+    an_ingredient.deallocate_quantity(7)
+
+    then_the_ingredient_has_the_expected_quantity(an_ingredient, 8)
+    assert [lot.quantity for lot in (sooner_lot, later_lot, undated_lot)] == [0, 3, 5]
+    assert [lot for lot in an_ingredient.lots if lot.quantity] == [later_lot, undated_lot]
+
+
+def test_ingredient_with_lots_ignores_the_expired_lots():
+    now = model.utcnow()
+    an_ingredient = given_an_ingredient_with_lots(model.Lot(4, now - timedelta(minutes=1)), model.Lot(3))
+
+    assert not an_ingredient.can_deallocate_quantity(4)
+    then_the_ingredient_has_the_expected_quantity(an_ingredient, 3)
+
+
+def test_ingredient_with_lots_reads_the_stock_without_discarding_the_expired_lots():
+    now = model.utcnow()
+    expired_lot = model.Lot(4, now - timedelta(minutes=1))
+    an_ingredient = given_an_ingredient_with_lots(model.Lot(2, now + timedelta(days=1)), expired_lot, model.Lot(3))
+
+    with events.holding_events() as held_events:
+        available_quantity = an_ingredient.get_available_quantity()
+
+    assert available_quantity == 5
+    assert (an_ingredient.available_quantity, expired_lot.quantity, held_events) == (9, 4, [])
+    assert an_ingredient.discard_expired_lots() == 4
+    assert an_ingredient.available_quantity == 5
+
+
+def test_ingredient_with_lots_gives_back_a_released_quantity_to_the_lots_it_was_taken_from():
+    now = model.utcnow()
+    sooner_lot = model.Lot(2, now + timedelta(days=1))
+    later_lot = model.Lot(5, now + timedelta(days=2))
+    an_ingredient = given_an_ingredient_with_lots(sooner_lot, later_lot)
+
+    taken_from_lots = an_ingredient.deallocate_quantity(4)
+    an_ingredient.allocate_quantity(4, taken_from_lots)
+
+    then_the_ingredient_has_the_expected_quantity(an_ingredient, 7)
+    assert taken_from_lots == ((sooner_lot, 2), (later_lot, 2))
+    assert sorted(
+        (lot.expires_at, lot.quantity) for lot in an_ingredient.lots if lot.quantity
+    ) == [(sooner_lot.expires_at, 2), (later_lot.expires_at, 5)]
+
+
+def test_release_a_drink_with_lots_gives_back_every_lot_what_it_gave():
+    now = model.utcnow()
+    sooner_lot = model.Lot(1, now + timedelta(days=1))
+    later_lot = model.Lot(5, now + timedelta(days=2))
+    an_ingredient = given_an_ingredient_with_lots(sooner_lot, later_lot)
+    a_drink = helpers.given_a_drink_with_ingredients(model.DrinkIngredient(an_ingredient, 3))
+
+    a_drink.release(a_drink.dispense())
+
+    then_the_ingredient_has_the_expected_quantity(an_ingredient, 6)
+    assert sorted(
+        (lot.expires_at, lot.quantity) for lot in an_ingredient.lots if lot.quantity
+    ) == [(sooner_lot.expires_at, 1), (later_lot.expires_at, 5)]
+
+
+def test_ingredient_keeps_its_plain_stock_as_a_lot_when_it_receives_a_first_lot():
+    an_ingredient = helpers.given_an_ingredient(quantity=10)
+
+    an_ingredient.receive_lot(model.Lot(5, model.utcnow() - timedelta(minutes=1)))
+
+    then_the_ingredient_has_the_expected_quantity(an_ingredient, 10)
+    assert an_ingredient.available_quantity == sum(lot.quantity for lot in an_ingredient.lots) == 15
+    assert an_ingredient.discard_expired_lots() == 5
+    assert an_ingredient.available_quantity == sum(lot.quantity for lot in an_ingredient.lots) == 10
+
+
+def test_ingredient_with_lots_removes_the_emptied_lots_in_batches():
+    an_ingredient = given_an_ingredient_with_lots(*(model.Lot(1) for _ in range(8)))
+
+    an_ingredient.deallocate_quantity(4)
+    lots_with_four_empty = len(an_ingredient.lots)
+    an_ingredient.deallocate_quantity(1)
+
+    then_the_ingredient_has_the_expected_quantity(an_ingredient, 3)
+    assert lots_with_four_empty == 8
+    assert len(an_ingredient.lots) == 3
+
+
+def test_ingredient_with_lots_restocks_with_a_lot_without_expiry():
+    an_ingredient = given_an_ingredient_with_lots(model.Lot(4, model.utcnow() + timedelta(days=1)))
+
+    an_ingredient.restock_to_quantity(10)
+
+    then_the_ingredient_has_the_expected_quantity(an_ingredient, 10)
+    assert [(lot.quantity, lot.expires_at) for lot in an_ingredient.lots][1:] == [(6, None)]
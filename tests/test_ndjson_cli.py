@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+from barista_matic.adapters.repository import FakeRepository
+from barista_matic.domain import model
+from barista_matic.entrypoints.ndjson_cli import (
+    NdjsonCli,
+    diff_fields,
+)
+from tests import helpers
+
+
+def given_an_ndjson_cli_with_a_drink(stock=10):
+    an_ingredient = helpers.given_an_ingredient("an ingredient", quantity=stock, unit_cost=1.5)
+    other_ingredient = helpers.given_an_ingredient("other ingredient", quantity=stock, unit_cost=1)
+    repository = FakeRepository()
+    repository.add_drink(helpers.given_a_drink_with_ingredients(model.DrinkIngredient(an_ingredient, 3)))
+    repository.add_ingredient(other_ingredient)
+    return NdjsonCli(helpers.given_a_baristamatic_service_with_repository(repository))
+
+
+def then_the_cli_output_has_the_frames(capsys, expected_frames):
+    frames = [
+        json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith("{")
+    ]
+    assert frames == expected_frames
+
+
+def test_diff_fields_keeps_only_changed_and_removed_fields():
+    previous = {"1": {"name": "a drink", "in_stock": True}, "2": {"name": "other drink", "in_stock": True}}
+    current = {"1": {"name": "a drink", "in_stock": False}, "3": {"name": "new drink", "in_stock": True}}
+
+    assert diff_fields(previous, current) == {
+        "1": {"in_stock": False},
+        "2": None,
+        "3": {"name": "new drink", "in_stock": True},
+    }
+
+
+@pytest.mark.timeout(1.0)
+def test_ndjson_cli_prints_the_full_first_frame_and_then_only_changes(monkeypatch, capsys):
+    cli = given_an_ndjson_cli_with_a_drink(stock=4)
+
+    helpers.when_the_interactive_cli_runs_with_user_inputs(cli, ["1", "1", "x", "r", "q"], monkeypatch)
+
+    then_the_cli_output_has_the_frames(capsys, [
+        {
+            "inventory": {"an ingredient": 4, "other ingredient": 4},
+            "menu": {"1": {"name": "a drink", "cost": 4.5, "in_stock": True}},
+        },
+        {
+            "result": "dispensed",
+            "subject": "a drink",
+            "inventory": {"an ingredient": 1},
+            "menu": {"1": {"in_stock": False}},
+        },
+        {"result": "out_of_stock", "subject": "a drink"},
+        {"result": "invalid", "subject": "x"},
+        {
+            "result": "restocked",
+            "inventory": {"an ingredient": 10, "other ingredient": 10},
+            "menu": {"1": {"in_stock": True}},
+        },
+    ])
+
+
+@pytest.mark.timeout(1.0)
+def test_ndjson_cli_frames_are_single_compact_lines(monkeypatch, capsys):
+    cli = given_an_ndjson_cli_with_a_drink()
+
+    helpers.when_the_interactive_cli_runs_with_user_inputs(cli, ["q"], monkeypatch)
+
+    output = capsys.readouterr().out
+    assert output.splitlines()[0] == '{"inventory":{"an ingredient":10,"other ingredient":10},' \
+        '"menu":{"1":{"name":"a drink","cost":4.5,"in_stock":true}}}'
@@ -0,0 +1,73 @@
+import pytest
+
+from barista_matic.adapters.repository import FakeRepository
+from barista_matic.domain import model
+from barista_matic.entrypoints.paginated_cli import PaginatedInteractiveCli
+from tests import helpers
+
+
+def given_a_paginated_cli_with_drinks(*drink_names, page_size=2):
+    an_ingredient = helpers.given_an_ingredient(quantity=1)
+    other_ingredient = helpers.given_an_ingredient("other ingredient", quantity=0)
+    repository = FakeRepository()
+    repository.add_ingredient(an_ingredient)
+    repository.add_ingredient(other_ingredient)
+    for drink_name in drink_names:
+        ingredient = other_ingredient if drink_name.startswith("iced") else an_ingredient
+        drink = helpers.given_a_drink_with_ingredients(model.DrinkIngredient(ingredient, 1), name=drink_name)
+        repository.add_drink(drink)
+    barista_matic = helpers.given_a_baristamatic_service_with_repository(repository)
+    return PaginatedInteractiveCli(barista_matic, page_size=page_size)
+
+
+def then_the_menu_frames_show_the_drinks(capsys, expected_frames):
+    frames = capsys.readouterr().out.split("Inventory:")[1:]
+    menus = [
+        [line.split(",")[1] for line in frame.split("Menu:")[1].splitlines() if line.count(",") == 3]
+        for frame in frames
+    ]
+    assert menus == expected_frames
+
+
+@pytest.mark.timeout(1.0)
+def test_paginated_cli_moves_through_the_menu_pages(monkeypatch, capsys):
+    cli = given_a_paginated_cli_with_drinks("americano", "cappuccino", "espresso", "latte", "mocha")
+
+    helpers.when_the_interactive_cli_runs_with_user_inputs(cli, [">", ">", ">", "<", "q"], monkeypatch)
+
+    then_the_menu_frames_show_the_drinks(capsys, [
+        ["americano", "cappuccino"],
+        ["espresso", "latte"],
+        ["mocha"],
+        ["mocha"],
+        ["espresso", "latte"],
+    ])
+
+
+@pytest.mark.timeout(1.0)
+def test_paginated_cli_filters_the_menu(monkeypatch, capsys):
+    cli = given_a_paginated_cli_with_drinks("americano", "iced latte", "iced mocha", "latte")
+
+    helpers.when_the_interactive_cli_runs_with_user_inputs(cli, ["/iced", "+", "+", "/", "q"], monkeypatch)
+
+    then_the_menu_frames_show_the_drinks(capsys, [
+        ["americano", "iced latte"],
+        ["iced latte", "iced mocha"],
+        [],
+        ["iced latte", "iced mocha"],
+        ["americano", "iced latte"],
+    ])
+
+
+@pytest.mark.timeout(1.0)
+def test_paginated_cli_dispenses_drinks_out_of_the_current_page(monkeypatch, capsys):
+    cli = given_a_paginated_cli_with_drinks("americano", "cappuccino", "espresso")
+
+    monkeypatch.setattr(cli.barista_service, "get_menu", lambda: pytest.fail("The whole menu was loaded"))
+
+    helpers.when_the_interactive_cli_runs_with_user_inputs(cli, ["3", "9", "q"], monkeypatch)
+
+    cli_output = capsys.readouterr().out
+    assert "Dispensing: espresso" in cli_output
+    assert "Invalid selection: 9" in cli_output
+    assert "an ingredient,0" in cli_output
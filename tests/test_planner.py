@@ -0,0 +1,104 @@
+import random
+import time
+
+import pytest
+
+from barista_matic.adapters.repository import FakeRepository
+from barista_matic.domain import model
+from barista_matic.service_layer import planner
+from barista_matic.service_layer.recipe_matrix import RecipeMatrix
+from tests import helpers
+
+
+def given_a_random_catalog(drinks_count, ingredients_count, seed=1):
+    randomizer = random.Random(seed)
+    ingredients = [
+        helpers.given_an_ingredient(f"ingredient {index}", quantity=randomizer.randint(0, 200), unit_cost=1)
+        for index in range(ingredients_count)
+    ]
+    drinks = [
+        helpers.given_a_drink_with_ingredients(
+            *(
+                model.DrinkIngredient(ingredient, randomizer.randint(1, 4))
+                for ingredient in randomizer.sample(ingredients, randomizer.randint(1, 5))
+            ),
+            name=f"drink {index}",
+        )
+        for index in range(drinks_count)
+    ]
+    return drinks, ingredients
+
+
+def then_the_plan_fits_the_stock(plan, drinks, ingredients):
+    used = {ingredient.name: 0 for ingredient in ingredients}
+    drinks_by_name = {drink.name: drink for drink in drinks}
+    for name, servings in plan.servings.items():
+        for ingredient_line in drinks_by_name[name].ingredients:
+            used[ingredient_line.ingredient.name] += ingredient_line.ingredient_quantity * servings
+    for ingredient in ingredients:
+        assert used[ingredient.name] <= ingredient.get_available_quantity()
+
+
+def test_recipe_matrix_computes_drink_prices(array_backend):
+    an_ingredient = helpers.given_an_ingredient("an ingredient", unit_cost=1.5)
+    other_ingredient = helpers.given_an_ingredient("other ingredient", unit_cost=0.25)
+    a_drink = helpers.given_a_drink_with_ingredients(
+        model.DrinkIngredient(an_ingredient, 2),
+        model.DrinkIngredient(other_ingredient, 1),
+    )
+
+    matrix = RecipeMatrix.from_catalog([a_drink], [other_ingredient])
+
+    assert matrix.ingredient_names == ("other ingredient", "an ingredient")
+    assert matrix.rows == (((0, 1), (1, 2)), )
+    assert matrix.get_prices() == (3.25, )
+
+
+def test_plan_prefers_the_drink_with_more_revenue_per_scarce_ingredient(array_backend):
+    espresso = helpers.given_an_ingredient("espresso", quantity=6, unit_cost=1)
+    milk = helpers.given_an_ingredient("milk", quantity=10, unit_cost=2)
+    americano = helpers.given_a_drink_with_ingredients(model.DrinkIngredient(espresso, 3), name="americano")
+    latte = helpers.given_a_drink_with_ingredients(
+        model.DrinkIngredient(espresso, 1), model.DrinkIngredient(milk, 1), name="latte"
+    )
+
+    plan = planner.plan_sales(RecipeMatrix.from_catalog([americano, latte], [espresso, milk]))
+
+    assert plan.servings == {"latte": 6}
+    assert plan.revenue == 18
+    assert plan.revenue <= plan.upper_bound
+
+
+def test_plan_of_a_catalog_without_stock_is_empty(array_backend):
+    an_ingredient = helpers.given_an_ingredient(quantity=0)
+    a_drink = helpers.given_a_drink_with_ingredients(model.DrinkIngredient(an_ingredient, 1))
+
+    plan = planner.plan_sales(RecipeMatrix.from_catalog([a_drink], [an_ingredient]))
+
+    assert plan == planner.SalesPlan(servings={}, revenue=0, upper_bound=0)
+
+
+@pytest.mark.timeout(5)
+def test_plan_of_hundreds_of_drinks_is_fast_feasible_and_bounded(array_backend):
+    drinks, ingredients = given_a_random_catalog(drinks_count=300, ingredients_count=40)
+    matrix = RecipeMatrix.from_catalog(drinks, ingredients)
+
+    start = time.perf_counter()
+    plan = planner.plan_sales(matrix)
+    elapsed = time.perf_counter() - start
+
+    then_the_plan_fits_the_stock(plan, drinks, ingredients)
+    assert 0 < plan.revenue <= plan.upper_bound
+    assert elapsed < 0.5
+
+
+def test_barista_matic_plans_sales_over_the_menu_and_inventory():
+    an_ingredient = helpers.given_an_ingredient(quantity=10, unit_cost=1)
+    repository = FakeRepository()
+    repository.add_drink(helpers.given_a_drink_with_ingredients(model.DrinkIngredient(an_ingredient, 3)))
+    barista_matic = helpers.given_a_baristamatic_service_with_repository(repository)
+
+    plan = barista_matic.get_sales_plan()
+
+    assert plan.servings == {"a drink": 3}
+    assert plan.revenue == 9
@@ -0,0 +1,89 @@
+import pytest
+
+from barista_matic.adapters.repository import FakeRepository
+from barista_matic.domain import (
+    exceptions,
+    model,
+)
+from barista_matic.service_layer.scheduler import (
+    BrewScheduler,
+    SimulationClock,
+    simulate,
+)
+from tests import helpers
+
+BREW_SECONDS = {"espresso": 30, "latte": 90, "mocha": 150}
+
+
+def given_a_scheduler(heads=1, policy="fifo", stock=100):
+    an_ingredient = helpers.given_an_ingredient(quantity=stock)
+    repository = FakeRepository()
+    for name in BREW_SECONDS:
+        repository.add_drink(helpers.given_a_drink_with_ingredients(model.DrinkIngredient(an_ingredient, 1), name=name))
+    clock = SimulationClock()
+    barista_matic = helpers.given_a_baristamatic_service_with_repository(repository)
+    barista_matic.clock = clock
+    return BrewScheduler(
+        barista_matic, clock, heads=heads, policy=policy, brew_seconds=lambda drink: BREW_SECONDS[drink.name]
+    )
+
+
+def given_a_rush_of_orders(orders=30):
+    # References: 1 espresso, 2 latte, 3 mocha
+    return [(index * 20.0, str(index % 3 + 1)) for index in range(orders)]
+
+
+def test_simulation_clock_runs_the_events_in_time_order():
+    clock = SimulationClock()
+    events = []
+    clock.schedule(10, lambda: events.append(("b", clock())))
+    clock.schedule(5, lambda: clock.schedule(10, lambda: events.append(("c", clock()))))
+    clock.schedule(5, lambda: events.append(("a", clock())))
+
+    clock.run(until=7)
+    assert events == [("a", 5)]
+    assert clock() == 7
+
+    clock.run()
+    assert events == [("a", 5), ("b", 10), ("c", 10)]
+
+
+def test_orders_reserve_their_stock_when_enqueued_and_are_recorded_when_brewed():
+    scheduler = given_a_scheduler(stock=2)
+    scheduler.submit("2")
+    scheduler.submit("3")
+
+    with pytest.raises(exceptions.OutOfStock):
+        scheduler.submit("1")
+    assert scheduler.get_queue_length() == 1
+    assert scheduler.barista_service.repository.ledger == []
+
+    scheduler.clock.run()
+
+    assert [record.drink_name for record in scheduler.barista_service.repository.ledger] == ["latte", "mocha"]
+    assert scheduler.get_stats().rejected == 1
+
+
+def test_shortest_job_first_reduces_the_wait():
+    fifo_stats = simulate(given_a_scheduler(policy="fifo"), given_a_rush_of_orders())
+    sjf_stats = simulate(given_a_scheduler(policy="sjf"), given_a_rush_of_orders())
+
+    assert fifo_stats.finished == sjf_stats.finished == 30
+    assert sjf_stats.mean_wait_seconds < fifo_stats.mean_wait_seconds
+
+
+def test_more_heads_increase_the_throughput():
+    one_head_stats = simulate(given_a_scheduler(heads=1), given_a_rush_of_orders())
+    three_heads_stats = simulate(given_a_scheduler(heads=3), given_a_rush_of_orders())
+
+    assert three_heads_stats.throughput_per_hour > 2 * one_head_stats.throughput_per_hour
+    assert three_heads_stats.p95_wait_seconds < one_head_stats.p95_wait_seconds
+    assert one_head_stats.head_utilization[0] == pytest.approx(1.0, abs=0.05)
+
+
+def test_priority_policy_brews_lower_priority_numbers_first():
+    scheduler = given_a_scheduler(policy="priority")
+
+    simulate(scheduler, [(0, "1", 5), (1, "2", 5), (1, "3", 1)])
+
+    assert [order.drink.name for order in scheduler.finished] == ["espresso", "mocha", "latte"]
@@ -5,6 +5,8 @@ from barista_matic.domain import (
     exceptions,
     model,
 )
+from barista_matic.service_layer import services
+from barista_matic.service_layer.dedupe import DedupeCache
 from tests import helpers
 
 
@@ -134,3 +136,143 @@ def test_barista_matic_restock_all_ingredients():
     then_the_ingredient_has_the_expected_stock(ingredient_1, NEW_STOCK)
     then_the_ingredient_has_the_expected_stock(ingredient_2, NEW_STOCK)
     then_the_ingredient_has_the_expected_stock(ingredient_3, NEW_STOCK)
+
+
+def test_barista_matic_records_the_dispensed_drink_in_the_ledger_and_rollups():
+    an_ingredient = helpers.given_an_ingredient(quantity=10, unit_cost=1.5)
+    a_drink = helpers.given_a_drink_with_ingredients(
+        model.DrinkIngredient(an_ingredient, 2)
+    )
+    barista_matic = given_a_baristamatic_with_fake_repository(drinks=[a_drink])
+
+    helpers.when_the_barista_dispense_a_drink_by_reference(barista_matic, "1")
+    helpers.when_the_barista_dispense_a_drink_by_reference(barista_matic, "1")
+
+    assert [(record.drink_name, record.price) for record in barista_matic.repository.ledger] == [
+        ("a drink", 3.0), ("a drink", 3.0)
+    ]
+    for period in model.ROLLUP_PERIODS:
+        sales = barista_matic.get_sales(period)
+        assert [(rollup.drink_name, rollup.quantity, rollup.revenue) for rollup in sales] == [("a drink", 2, 6.0)]
+
+
+def test_barista_matic_does_not_record_a_drink_out_of_stock_in_the_ledger():
+    an_ingredient = helpers.given_an_ingredient(quantity=1)
+    a_drink = helpers.given_a_drink_with_ingredients(
+        model.DrinkIngredient(an_ingredient, 2)
+    )
+    barista_matic = given_a_baristamatic_with_fake_repository(drinks=[a_drink])
+
+    with pytest.raises(exceptions.OutOfStock):
+        helpers.when_the_barista_dispense_a_drink_by_reference(barista_matic, "1")
+
+    assert barista_matic.repository.ledger == []
+    assert barista_matic.get_sales() == tuple()
+
+
+def given_a_baristamatic_with_drinks(*drink_names, stock=10):
+    an_ingredient = helpers.given_an_ingredient(quantity=stock)
+    repository = FakeRepository()
+    for drink_name in drink_names:
+        drink = helpers.given_a_drink_with_ingredients(model.DrinkIngredient(an_ingredient, 1), name=drink_name)
+        repository.add_drink(drink)
+    return helpers.given_a_baristamatic_service_with_repository(repository)
+
+
+def test_barista_matic_get_menu_page_follows_the_cursor_with_the_full_menu_references():
+    barista_matic = given_a_baristamatic_with_drinks("mocha", "latte", "espresso", "americano", "cappuccino")
+
+    first_page = barista_matic.get_menu_page(limit=2)
+    second_page = barista_matic.get_menu_page(first_page.next_cursor, limit=2)
+    last_page = barista_matic.get_menu_page(second_page.next_cursor, limit=2)
+
+    assert [(ref, drink.name) for ref, drink in first_page.items] == [("1", "americano"), ("2", "cappuccino")]
+    assert [(ref, drink.name) for ref, drink in second_page.items] == [("3", "espresso"), ("4", "latte")]
+    assert [(ref, drink.name) for ref, drink in last_page.items] == [("5", "mocha")]
+    assert last_page.next_cursor is None
+
+
+def test_barista_matic_get_menu_page_filters_by_prefix_and_stock():
+    barista_matic = given_a_baristamatic_with_drinks("caffe latte", "Caffe mocha", "espresso", stock=0)
+
+    assert [reference for reference, _ in barista_matic.get_menu_page(prefix="caffe").items] == ["1", "2"]
+    assert barista_matic.get_menu_page(in_stock_only=True).items == ()
+
+
+def test_barista_matic_retries_of_a_dispense_request_return_the_original_drink():
+    barista_matic = given_a_baristamatic_with_drinks("a drink", "other drink")
+
+    first_drink = barista_matic.dispense_drink_by_menu_reference("1", request_id="request 1")
+    retried_drink = barista_matic.dispense_drink_by_menu_reference("2", request_id="request 1")
+    other_drink = barista_matic.dispense_drink_by_menu_reference("1", request_id="request 2")
+
+    assert first_drink.name == retried_drink.name == other_drink.name == "a drink"
+    assert barista_matic.get_inventory()[0].get_available_quantity() == 8
+    assert [record.request_id for record in barista_matic.repository.ledger] == ["request 1", "request 2"]
+
+
+def test_barista_matic_finds_retries_of_forgotten_requests_in_the_ledger():
+    barista_matic = given_a_baristamatic_with_drinks("a drink")
+    barista_matic.dispense_requests = DedupeCache(max_entries=1)
+
+    barista_matic.dispense_drink_by_menu_reference("1", request_id="request 1")
+    barista_matic.dispense_drink_by_menu_reference("1", request_id="request 2")
+    retried_drink = barista_matic.dispense_drink_by_menu_reference("1", request_id="request 1")
+
+    assert retried_drink.name == "a drink"
+    assert len(barista_matic.repository.ledger) == 2
+
+
+def given_a_baristamatic_with_customizations(*customizations):
+    coffee = model.Ingredient("coffee", 10, 0.75)
+    milk = model.Ingredient("milk", 10, 0.5)
+    a_drink = helpers.given_a_drink_with_ingredients(model.DrinkIngredient(coffee, 2), name="coffee")
+    repository = FakeRepository()
+    repository.add_ingredient(coffee)
+    repository.add_ingredient(milk)
+    repository.add_drink(a_drink)
+    return services.BaristaMatic(repository, customizations=customizations)
+
+
+def test_barista_matic_dispenses_a_customized_drink_and_records_its_name():
+    barista_matic = given_a_baristamatic_with_customizations(
+        model.Customization("extra shot", (("coffee", 1), )), model.Customization("with milk", (("milk", 1), ))
+    )
+
+    dispensed_drink = barista_matic.dispense_drink_by_menu_reference("1", customizations=["extra shot", "with milk"])
+
+    assert dispensed_drink.name == "coffee + extra shot + with milk"
+    assert [ingredient.get_available_quantity() for ingredient in barista_matic.get_inventory()] == [7, 9]
+    assert [record.drink_name for record in barista_matic.repository.ledger] == ["coffee + extra shot + with milk"]
+    assert barista_matic.get_menu().get_drink_by_reference("1").get_cost() == 1.5
+
+
+def test_barista_matic_rejects_unknown_customizations_without_dispensing():
+    barista_matic = given_a_baristamatic_with_customizations()
+
+    with pytest.raises(exceptions.InvalidCustomization):
+        barista_matic.dispense_drink_by_menu_reference("1", customizations=["extra shot"])
+
+    assert barista_matic.repository.ledger == []
+
+
+def test_barista_matic_rejects_customized_names_too_long_for_the_ledger():
+    long_customization = model.Customization("x" * 200, (("coffee", 1), ))
+    barista_matic = given_a_baristamatic_with_customizations(long_customization)
+
+    with pytest.raises(exceptions.InvalidCustomization):
+        barista_matic.dispense_drink_by_menu_reference("1", customizations=[long_customization.name] * 2)
+
+    assert barista_matic.repository.ledger == []
+
+
+def test_barista_matic_finds_retries_of_forgotten_customized_requests_in_the_ledger():
+    barista_matic = given_a_baristamatic_with_customizations(model.Customization("extra shot", (("coffee", 1), )))
+    barista_matic.dispense_requests = DedupeCache(max_entries=1)
+
+    barista_matic.dispense_drink_by_menu_reference("1", request_id="request 1", customizations=["extra shot"])
+    barista_matic.dispense_drink_by_menu_reference("1", request_id="request 2")
+    retried_drink = barista_matic.dispense_drink_by_menu_reference("1", request_id="request 1")
+
+    assert retried_drink.name == "coffee + extra shot"
+    assert len(barista_matic.repository.ledger) == 2
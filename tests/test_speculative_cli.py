@@ -0,0 +1,118 @@
+import pytest
+
+from barista_matic.adapters.repository import FakeRepository
+from barista_matic.domain import model
+from barista_matic.entrypoints.interactive_cli import (
+    Dispense,
+    InteractiveCli,
+)
+from barista_matic.entrypoints.speculative_cli import SpeculativeInteractiveCli
+from barista_matic.service_layer.services import BaristaMatic
+from tests import helpers
+
+
+class CountingRepository(FakeRepository):
+    catalog_reads = 0
+    stock_reads = 0
+
+    def get_drinks(self):
+        self.catalog_reads += 1
+        return super().get_drinks()
+
+    def get_ingredients(self):
+        self.catalog_reads += 1
+        return super().get_ingredients()
+
+    def get_stock(self):
+        # A narrow stock read in a database, not a catalog read
+        self.stock_reads += 1
+        return {ingredient.name: ingredient.get_available_quantity() for ingredient in super().get_ingredients()}
+
+
+def given_a_repository_with_two_drinks(stock=4):
+    repository = CountingRepository()
+    coffee = helpers.given_an_ingredient("coffee", quantity=stock)
+    milk = helpers.given_an_ingredient("milk", quantity=stock, unit_cost=0.5)
+    repository.add_drink(helpers.given_a_drink_with_ingredients(model.DrinkIngredient(coffee, 3), name="espresso"))
+    repository.add_drink(helpers.given_a_drink_with_ingredients(
+        model.DrinkIngredient(coffee, 1), model.DrinkIngredient(milk, 2), name="latte"
+    ))
+    return repository
+
+
+def when_the_cli_runs(cli_class, user_inputs, monkeypatch, capsys):
+    repository = given_a_repository_with_two_drinks()
+    cli = cli_class(BaristaMatic(repository))
+    helpers.when_the_interactive_cli_runs_with_user_inputs(cli, user_inputs, monkeypatch)
+    return capsys.readouterr().out, repository
+
+
+@pytest.mark.timeout(2.0)
+def test_speculative_cli_prints_the_same_frames_as_the_interactive_cli(bus, monkeypatch, capsys):
+    user_inputs = ["1", "x", "2", "1", "r", "2", "3", "q"]
+
+    expected_output, _ = when_the_cli_runs(InteractiveCli, user_inputs, monkeypatch, capsys)
+    output, _ = when_the_cli_runs(SpeculativeInteractiveCli, user_inputs, monkeypatch, capsys)
+
+    assert output == expected_output
+
+
+@pytest.mark.timeout(2.0)
+def test_speculative_cli_reads_the_catalog_only_for_the_first_frame_when_nothing_changes(bus, monkeypatch, capsys):
+    _, first_frame_repository = when_the_cli_runs(SpeculativeInteractiveCli, ["q"], monkeypatch, capsys)
+    _, repository = when_the_cli_runs(SpeculativeInteractiveCli, ["x", "y", "z", "q"], monkeypatch, capsys)
+
+    assert repository.catalog_reads == first_frame_repository.catalog_reads
+
+
+@pytest.mark.timeout(2.0)
+def test_speculative_cli_builds_the_frame_again_after_a_catalog_swap(bus, monkeypatch, capsys):
+    repository = given_a_repository_with_two_drinks()
+    cli = SpeculativeInteractiveCli(BaristaMatic(repository))
+    cli.render_frame()
+    repository.add_drink(helpers.given_a_drink_with_ingredients(
+        model.DrinkIngredient(helpers.given_an_ingredient("cocoa", quantity=1), 1), name="mocha"
+    ))
+
+    cli.catalog_swapped()
+    cli.render_frame()
+
+    helpers.then_the_cli_output_has(capsys, "cocoa,1\ncoffee,4\nmilk,4\nMenu:\n1,espresso,$3.00,true\n2,latte")
+    assert isinstance(cli.get_command("3"), Dispense)
+    assert not isinstance(cli.get_command("4"), Dispense)
+
+
+@pytest.mark.timeout(2.0)
+def test_speculative_cli_prints_the_stock_changed_by_another_process(bus, monkeypatch, capsys):
+    repository = given_a_repository_with_two_drinks()
+    cli = SpeculativeInteractiveCli(BaristaMatic(repository))
+    cli.render_frame()
+    # Another process sharing the database changes the stock, no event of this process says so
+    coffee = next(ingredient for ingredient in repository.get_ingredients() if ingredient.name == "coffee")
+    coffee.available_quantity = 2
+    capsys.readouterr()
+
+    cli.render_frame()
+    cli.close()
+
+    helpers.then_the_cli_output_has(capsys, "coffee,2\nmilk,4\nMenu:\n1,espresso,$3.00,false\n2,latte,$2.00,true")
+    assert repository.stock_reads == 1
+
+
+@pytest.mark.timeout(2.0)
+def test_speculative_cli_dispenses_nothing_when_the_reference_points_to_another_drink(bus, capsys):
+    repository = given_a_repository_with_two_drinks()
+    cli = SpeculativeInteractiveCli(BaristaMatic(repository))
+    cli.render_frame()
+    # Another process adds a drink that comes first in the menu, with ingredients the frame already shows
+    coffee = next(ingredient for ingredient in repository.get_ingredients() if ingredient.name == "coffee")
+    repository.add_drink(helpers.given_a_drink_with_ingredients(model.DrinkIngredient(coffee, 1), name="americano"))
+    capsys.readouterr()
+
+    cli.run_command(cli.get_command("1"), "1")
+    cli.render_frame()
+    cli.close()
+
+    helpers.then_the_cli_output_has(
+        capsys, "Menu changed, select again: 1\nInventory:\ncoffee,4\nmilk,4\nMenu:\n1,americano,$1.00,true\n"
+    )
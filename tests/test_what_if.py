@@ -0,0 +1,84 @@
+import random
+
+import pytest
+
+from barista_matic.adapters.repository import FakeRepository
+from barista_matic.domain import (
+    exceptions,
+    model,
+)
+from barista_matic.service_layer import what_if
+from barista_matic.service_layer.recipe_matrix import RecipeMatrix
+from tests import helpers
+from tests.test_planner import given_a_random_catalog
+
+
+def given_a_random_order_stream(drinks, orders_count, seed=2):
+    randomizer = random.Random(seed)
+    return [randomizer.randrange(len(drinks)) for _ in range(orders_count)]
+
+
+def when_the_orders_are_dispensed_one_by_one(drinks, drink_indexes):
+    for order, drink_index in enumerate(drink_indexes):
+        try:
+            drinks[drink_index].dispense()
+        except exceptions.OutOfStock:
+            return order
+    return None
+
+
+def test_simulation_finds_the_first_order_out_of_stock_as_dispensing_them(array_backend, bus):
+    drinks, ingredients = given_a_random_catalog(20, 8)
+    drink_indexes = given_a_random_order_stream(drinks, 500)
+    matrix = RecipeMatrix.from_catalog(drinks, ingredients)
+
+    result = what_if.simulate_orders(matrix, drink_indexes)
+
+    assert [ingredient.get_available_quantity() for ingredient in ingredients] == list(matrix.stock)
+    assert result.first_failure == when_the_orders_are_dispensed_one_by_one(drinks, drink_indexes)
+    failing_drink = drinks[drink_indexes[result.first_failure]]
+    assert result.failing_ingredients == tuple(sorted(
+        line.ingredient.name for line in failing_drink.ingredients if not line.can_be_dispensed()
+    ))
+
+
+def test_simulation_reports_the_depletion_point_of_every_ingredient(array_backend, monkeypatch):
+    monkeypatch.setattr(what_if, "CHUNK_ORDERS", 2)
+    milk = helpers.given_an_ingredient("milk", quantity=3)
+    coffee = helpers.given_an_ingredient("coffee", quantity=5)
+    sugar = helpers.given_an_ingredient("sugar", quantity=10)
+    latte = helpers.given_a_drink_with_ingredients(
+        model.DrinkIngredient(coffee, 1), model.DrinkIngredient(milk, 1), name="latte"
+    )
+    espresso = helpers.given_a_drink_with_ingredients(model.DrinkIngredient(coffee, 2), name="espresso")
+    matrix = RecipeMatrix.from_catalog([latte, espresso], [milk, coffee, sugar])
+
+    result = what_if.simulate_orders(matrix, what_if.get_drink_indexes(
+        matrix, ["latte", "espresso", "espresso", "latte", "latte", "latte"]
+    ))
+
+    assert result.depletion_points == {"coffee": 3, "milk": 5}
+    assert (result.first_failure, result.failing_ingredients, result.served) == (3, ("coffee", ), 3)
+
+
+def test_simulation_serves_a_stream_within_the_stock(array_backend):
+    drinks, ingredients = given_a_random_catalog(5, 8)
+    matrix = RecipeMatrix.from_catalog(drinks, [helpers.given_an_ingredient(i.name, 10**6) for i in ingredients])
+
+    result = what_if.simulate_orders(matrix, given_a_random_order_stream(drinks, 1000))
+
+    assert (result.first_failure, result.depletion_points, result.served) == (None, {}, 1000)
+
+
+def test_barista_matic_simulates_orders_by_drink_name_without_dispensing():
+    an_ingredient = helpers.given_an_ingredient(quantity=5)
+    repository = FakeRepository()
+    repository.add_drink(helpers.given_a_drink_with_ingredients(model.DrinkIngredient(an_ingredient, 2)))
+    barista_matic = helpers.given_a_baristamatic_service_with_repository(repository)
+
+    result = barista_matic.simulate_orders(["a drink"] * 4)
+
+    assert (result.first_failure, result.depletion_points) == (2, {"an ingredient": 2})
+    assert an_ingredient.get_available_quantity() == 5
+    with pytest.raises(exceptions.DrinkNotExist):
+        barista_matic.simulate_orders(["other drink"])
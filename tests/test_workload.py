@@ -0,0 +1,79 @@
+import io
+from collections import Counter
+
+import pytest
+
+from barista_matic.adapters.repository import FakeRepository
+from barista_matic.entrypoints.workload import (
+    WorkloadConfig,
+    generate_catalog,
+    generate_commands,
+    generate_workload,
+    read_workload,
+    write_workload,
+)
+from tests import helpers
+
+
+def test_workload_is_reproducible_with_the_seed():
+    config = WorkloadConfig(commands=200, seed=7)
+
+    assert list(generate_workload(config)) == list(generate_workload(config))
+    assert list(generate_workload(config)) != list(generate_workload(WorkloadConfig(commands=200, seed=8)))
+
+
+def test_workload_follows_the_popularity_restock_and_invalid_settings():
+    config = WorkloadConfig(commands=5000, catalog_size=5, zipf_exponent=1.5, restock_every=100, invalid_ratio=0.1)
+
+    commands = list(generate_commands(config))
+    counts = Counter(commands)
+
+    assert commands[-1] == "q"
+    assert counts["r"] == 50
+    assert counts["1"] > counts["2"] > counts["3"] > counts["5"]
+    invalid_commands = len(commands) - 1 - counts["r"] - sum(counts[str(reference)] for reference in range(1, 6))
+    assert 400 < invalid_commands < 600
+
+
+def given_the_short_gaps_between_arrivals(config):
+    arrivals = [command.at for command in generate_workload(config)]
+    assert arrivals == sorted(arrivals)
+    return sum(later - earlier < 0.5 for earlier, later in zip(arrivals, arrivals[1:]))
+
+
+def test_workload_arrivals_are_bursty():
+    steady_short_gaps = given_the_short_gaps_between_arrivals(WorkloadConfig(commands=2000, burst_probability=0))
+    bursty_short_gaps = given_the_short_gaps_between_arrivals(WorkloadConfig(commands=2000, burst_probability=0.1))
+
+    assert bursty_short_gaps > 3 * steady_short_gaps
+
+
+def test_workload_survives_a_write_and_a_read():
+    commands = list(generate_workload(WorkloadConfig(commands=50)))
+    timed_file, untimed_file = io.StringIO(), io.StringIO()
+
+    write_workload(commands, timed_file, timed=True)
+    write_workload(commands, untimed_file)
+
+    assert list(read_workload(io.StringIO(timed_file.getvalue()))) == commands
+    assert [command.user_input for command in read_workload(io.StringIO(untimed_file.getvalue()))] == [
+        command.user_input for command in commands
+    ]
+
+
+@pytest.mark.timeout(5.0)
+def test_workload_runs_in_process_against_a_generated_catalog(monkeypatch, capsys):
+    repository = FakeRepository()
+    for drink in generate_catalog(catalog_size=20):
+        repository.add_drink(drink)
+    cli = helpers.given_an_interactive_cli_for_barista_service(
+        helpers.given_a_baristamatic_service_with_repository(repository)
+    )
+
+    commands = list(generate_commands(WorkloadConfig(commands=300, catalog_size=20, invalid_ratio=0.05)))
+    helpers.when_the_interactive_cli_runs_with_user_inputs(cli, commands, monkeypatch)
+
+    cli_output = capsys.readouterr().out
+    assert "20,drink 20," in cli_output
+    assert "Dispensing: drink 01" in cli_output
+    assert "Invalid selection: " in cli_output